@@ -1,29 +1,43 @@
 """
 FastAPI application for Halloween Voting System
 """
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pathlib import Path
+import asyncio
+import csv
+import io
+import json
 import os
-import uuid
-from PIL import Image
 from io import BytesIO
 
 from config import (
     UPLOAD_DIR,
     MAX_FILE_SIZE,
     ALLOWED_EXTENSIONS,
+    DUPLICATE_MAX_DISTANCE,
     ALLOWED_ORIGINS,
+    CORS_MAX_AGE,
+    JANITOR_ENABLED,
+    SLOW_REQUEST_MS,
+    SERVE_FRONTEND,
+    FRONTEND_DIR,
     RESULTS_PASSWORD,
-    ADMIN_PASSWORD,
     FOOTER_TEXT,
     HEADER_TEXT,
     HEADER_SUBTEXT,
+    CATEGORIES,
+    MULTIPLE_CHOICE_QUESTIONS,
+    RANKED_MAX_CHOICES,
 )
 from models import (
     Entry,
+    EntryCreated,
+    EntrySearchResult,
+    EntrySearchResponse,
+    SimilarEntry,
     VoteCreate,
     Vote,
     ResultsResponse,
@@ -33,16 +47,81 @@ from models import (
     MCQuestion,
     MCOption,
     MCVoteCreate,
+    BallotCreate,
+    VoterBallot,
     MCResultsResponse,
     MCOptionResult,
     AdminAuthRequest,
+    AdminResetRequest,
+    AdminProfileRequest,
+    EventCreateRequest,
+    CatalogCategoryCreate,
+    CatalogCategoryUpdate,
+    CatalogMCQuestionCreate,
+    CatalogMCQuestionUpdate,
+    CatalogMCOptionUpdate,
+    CatalogOrder,
+    EventMCOption,
     AdminEntry,
     AdminVote,
     AdminMCVote,
+    AdminDuplicatePair,
 )
 import database
+import auth
+import storage
+import phash
+import placeholders
+import backup
+import events
+import idempotency
+import janitor
+import profiling
+import static_site
 
 app = FastAPI(title="Halloween Voting API", version="1.0.0")
+# Routes note themselves in the slow-request log's timing breakdown
+app.router.route_class = profiling.TimedRoute
+
+
+class EventScopeMiddleware:
+    """Route /api/events/{event_id}/... to the regular /api/... handlers
+
+    The request is scoped to that event (its database, uploads, passwords and
+    caches) for its whole lifetime, so every endpoint is event-aware without
+    being declared twice.
+    """
+
+    PREFIX = "/api/events/"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        event_id, _, rest = scope["path"][len(self.PREFIX):].partition("/")
+        event = await events.get_event(event_id) if rest else None
+        if not event:
+            response = JSONResponse({"detail": "Event not found"}, status_code=404)
+            await response(scope, receive, send)
+            return
+
+        path = f"/api/{rest}"
+        scope = dict(scope, path=path, raw_path=path.encode())
+        token = events.use(event)
+        try:
+            await database.ensure_initialized()
+            await self.app(scope, receive, send)
+        finally:
+            events.reset(token)
+
+
+# Runs inside the event scope, so each event remembers its own keys
+app.add_middleware(idempotency.IdempotencyMiddleware)
+app.add_middleware(EventScopeMiddleware)
 
 # Configure CORS
 app.add_middleware(
@@ -51,29 +130,64 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=CORS_MAX_AGE,  # Every API call carries a custom header, so each needs a preflight
 )
 
+# Times whole requests, including the CORS and event handling above
+app.add_middleware(profiling.RequestTimingMiddleware)
+
+# Outermost, so every request (preflights and static files too) keeps the janitor waiting
+app.add_middleware(janitor.ActivityMiddleware)
+
+# Same-origin mode: pages, scripts and styles come from this server too
+site = static_site.StaticSite(FRONTEND_DIR) if SERVE_FRONTEND else None
+
 # Create upload directory
 Path(UPLOAD_DIR).mkdir(exist_ok=True)
 
 
+def _photo_url(filename: str) -> str:
+    """Public URL of an uploaded photo in the current event"""
+    return f"{events.current().api_prefix}/uploads/{filename}"
+
+
+def _require_default_event():
+    """Event management is only reachable through the default event's API"""
+    if not events.current().is_default:
+        raise HTTPException(status_code=404, detail="Not found")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
-    await database.init_db()
+    await events.init_registry()
+    await database.ensure_initialized()
     print("✅ Database initialized")
     print(f"📁 Upload directory: {Path(UPLOAD_DIR).absolute()}")
     print(f"🔒 Results password: {RESULTS_PASSWORD}")
+    if JANITOR_ENABLED:
+        janitor.start()
+        print("🧹 Janitor runs while the server is idle")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the janitor and write votes held in memory (VOTE_ENGINE=memory) to the database"""
+    janitor.stop()
+    await database.close_engines()
 
 
 @app.get("/")
-async def root():
-    """Root endpoint"""
+async def root(request: Request):
+    """Root endpoint (the home page in same-origin mode)"""
+    if site:
+        return site.response("index.html", request.headers)
     return {
         "message": "Halloween Voting System API",
         "endpoints": {
             "entries": "/api/entries",
             "votes": "/api/votes",
+            "ballots": "/api/ballots",
             "results": "/api/results",
             "categories": "/api/categories",
         },
@@ -100,12 +214,18 @@ async def get_categories():
     """Get all voting categories"""
     categories = await database.get_categories()
     return [
-        Category(id=cat["id"], name=cat["name"], order=cat["display_order"])
+        Category(
+            id=cat["id"],
+            name=cat["name"],
+            order=cat["display_order"],
+            mode=cat["voting_mode"],
+            max_choices=1 if cat["voting_mode"] == "single" else RANKED_MAX_CHOICES,
+        )
         for cat in categories
     ]
 
 
-@app.post("/api/entries", response_model=Entry)
+@app.post("/api/entries", response_model=EntryCreated)
 async def create_entry(
     name: str = Form(...),
     costume_name: str = Form(...),
@@ -131,23 +251,59 @@ async def create_entry(
             detail=f"File too large. Max size: {MAX_FILE_SIZE / 1024 / 1024}MB",
         )
 
-    # Validate it's actually an image
-    try:
-        img = Image.open(BytesIO(contents))
-        img.verify()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid image file")
-
-    # Generate unique filename
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = Path(UPLOAD_DIR) / unique_filename
-
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    # Identical photos (e.g. a double-tapped submit) are stored only once
+    upload_dir = events.current().upload_dir
+    photo_hash = storage.content_hash(contents)
+    blob = await database.get_blob(photo_hash)
+
+    if blob and (Path(upload_dir) / blob["filename"]).is_file():
+        # Already validated and on disk: skip decoding and writing it again
+        photo_filename = blob["filename"]
+        photo_phash = blob["phash"]
+        photo_placeholder = blob["placeholder"]
+    else:
+        with profiling.phase("image"):
+            # Validate it's actually an image (Pillow is only loaded once someone uploads)
+            from PIL import Image
+
+            try:
+                img = Image.open(BytesIO(contents))
+                img.verify()
+            except Exception:
+                raise HTTPException(status_code=400, detail="Invalid image file")
+
+            # Save file under its content hash
+            photo_filename = storage.blob_filename(photo_hash, file_ext)
+            storage.write_blob(upload_dir, photo_filename, contents)
+        photo_phash = None
+        photo_placeholder = None
+
+    # Perceptual hash for spotting re-taken photos of the same costume
+    if photo_phash is None:
+        try:
+            with profiling.phase("image"):
+                photo_phash = await asyncio.to_thread(phash.dhash, contents)
+        except Exception:
+            photo_phash = None
+
+    # Tiny blurred preview shown while the photo loads
+    if photo_placeholder is None:
+        try:
+            with profiling.phase("image"):
+                photo_placeholder = await asyncio.to_thread(placeholders.make_placeholder, contents)
+        except Exception:
+            photo_placeholder = None
 
     # Create database entry
-    entry_id = await database.create_entry(name, costume_name, unique_filename)
+    entry_id = await database.create_entry(
+        name,
+        costume_name,
+        photo_filename,
+        photo_hash=photo_hash,
+        photo_size=len(contents),
+        photo_phash=photo_phash,
+        photo_placeholder=photo_placeholder,
+    )
 
     # Get the created entry
     entries = await database.get_all_entries()
@@ -156,12 +312,30 @@ async def create_entry(
     if not entry:
         raise HTTPException(status_code=500, detail="Failed to create entry")
 
-    return Entry(
+    # Warn the submitter if this looks like an entry that already exists
+    similar = []
+    if photo_phash is not None:
+        similar = await database.find_similar_entries(
+            photo_phash, DUPLICATE_MAX_DISTANCE, exclude_id=entry_id
+        )
+
+    return EntryCreated(
         id=entry["id"],
         name=entry["name"],
         costume_name=entry["costume_name"],
-        photo_url=f"/api/uploads/{entry['photo_filename']}",
+        photo_url=_photo_url(entry["photo_filename"]),
+        placeholder=entry["placeholder"],
         created_at=entry["created_at"],
+        possible_duplicates=[
+            SimilarEntry(
+                id=match["id"],
+                name=match["name"],
+                costume_name=match["costume_name"],
+                photo_url=_photo_url(match["photo_filename"]),
+                distance=match["distance"],
+            )
+            for match in similar
+        ],
     )
 
 
@@ -169,28 +343,58 @@ async def create_entry(
 async def get_entries():
     """Get all costume entries"""
     entries = await database.get_all_entries()
+    if any(entry["placeholder"] is None for entry in entries):
+        database.backfill_placeholders_soon()
+
     return [
         Entry(
             id=entry["id"],
             name=entry["name"],
             costume_name=entry["costume_name"],
-            photo_url=f"/api/uploads/{entry['photo_filename']}",
+            photo_url=_photo_url(entry["photo_filename"]),
+            placeholder=entry["placeholder"],
             created_at=entry["created_at"],
         )
         for entry in entries
     ]
 
 
+@app.get("/api/entries/search", response_model=EntrySearchResponse)
+async def search_entries(
+    q: str = Query(..., min_length=1, max_length=100),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Find entries by name or costume name (prefixes and small typos match)"""
+    total, entries = await database.search_entries(q, offset, limit)
+    return EntrySearchResponse(
+        query=q,
+        total=total,
+        offset=offset,
+        limit=limit,
+        results=[
+            EntrySearchResult(
+                id=entry["id"],
+                name=entry["name"],
+                costume_name=entry["costume_name"],
+                photo_url=_photo_url(entry["photo_filename"]),
+                score=entry["score"],
+            )
+            for entry in entries
+        ],
+    )
+
+
 @app.post("/api/votes")
 async def create_vote(vote: VoteCreate):
-    """Submit a vote for an entry in a category"""
+    """Submit a vote for an entry in a category (changing the voter's earlier one, if any)"""
     try:
-        vote_id = await database.create_vote(
+        result = await database.create_vote(
             category=vote.category,
             entry_id=vote.entry_id,
             voter_id=vote.voter_id,
         )
-        return {"success": True, "vote_id": vote_id}
+        return {"success": True, **result}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -217,48 +421,86 @@ async def get_mc_questions():
 
 @app.post("/api/mc-votes")
 async def create_mc_vote(vote: MCVoteCreate):
-    """Submit a vote for a multiple choice question"""
+    """Submit a vote for a multiple choice question (changing the voter's earlier one, if any)"""
     try:
-        vote_id = await database.create_mc_vote(
+        result = await database.create_mc_vote(
             question_id=vote.question_id,
             option_id=vote.option_id,
             voter_id=vote.voter_id,
         )
-        return {"success": True, "vote_id": vote_id}
+        return {"success": True, **result}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to create vote")
 
 
-@app.post("/api/results")
-async def get_results(request: ResultsRequest):
-    """Get voting results (password protected)"""
-    if request.password != RESULTS_PASSWORD:
+@app.post("/api/ballots")
+async def submit_ballot(ballot: BallotCreate):
+    """Submit a voter's choices at once (safe to retry with the same ballot_id)
+
+    Categories and questions left out of the ballot keep their earlier vote.
+    """
+    try:
+        result = await database.submit_ballot(
+            ballot_id=ballot.ballot_id,
+            voter_id=ballot.voter_id,
+            votes=ballot.votes,
+            mc_votes=ballot.mc_votes,
+            rankings=ballot.rankings,
+        )
+        return {"success": True, **result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"⚠️  Ballot {ballot.ballot_id} failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to submit ballot")
+
+
+@app.get("/api/voters/{voter_id}/ballot", response_model=VoterBallot)
+async def get_voter_ballot(voter_id: str):
+    """Get the choices a voter has already submitted, to pre-fill their ballot"""
+    ballot = await database.get_voter_ballot(voter_id)
+    return VoterBallot(voter_id=voter_id, **ballot)
+
+
+@app.post("/api/results/auth")
+async def results_auth(request: ResultsRequest):
+    """Exchange the results password for a signed session token"""
+    if not await asyncio.to_thread(auth.check_password, request.password, auth.ROLE_RESULTS):
         raise HTTPException(status_code=403, detail="Invalid password")
 
+    token, expires_at = auth.issue_token(auth.ROLE_RESULTS, events.current().id)
+    return {"success": True, "token": token, "expires_at": expires_at}
+
+
+@app.get("/api/results", dependencies=[Depends(auth.require_results_viewer)])
+async def get_results():
+    """Get voting results (results or admin session required)"""
     # Get costume category results
     results = await database.get_results()
 
+    category_names = {cat["id"]: cat["name"] for cat in await database.get_categories()}
+
     category_results = []
-    for category_id, entries in results.items():
-        category_name = next(
-            (cat["name"] for cat in await database.get_categories() if cat["id"] == category_id),
-            category_id
-        )
+    for category_id, result in results.items():
+        category_name = category_names.get(category_id, category_id)
 
         category_results.append({
             "category": category_name,
+            "mode": result["mode"],
             "results": [
                 {
                     "entry_id": entry["entry_id"],
                     "name": entry["name"],
                     "costume_name": entry["costume_name"],
-                    "photo_url": f"/api/uploads/{entry['photo_filename']}",
+                    "photo_url": _photo_url(entry["photo_filename"]),
                     "vote_count": entry["vote_count"],
+                    **({"points": entry["points"]} if "points" in entry else {}),
                 }
-                for entry in entries
-            ]
+                for entry in result["results"]
+            ],
+            "rounds": result["rounds"],
         })
 
     # Get multiple choice results
@@ -286,44 +528,52 @@ async def get_results(request: ResultsRequest):
     }
 
 
-@app.get("/api/uploads/{filename}")
+@app.get("/api/uploads/{filename:path}")
 async def get_upload(filename: str):
     """Serve uploaded images"""
-    file_path = Path(UPLOAD_DIR) / filename
+    upload_dir = Path(events.current().upload_dir)
+    file_path = upload_dir / filename
 
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
 
     # Security: ensure file is in upload directory
-    if not file_path.resolve().is_relative_to(Path(UPLOAD_DIR).resolve()):
+    if not file_path.resolve().is_relative_to(upload_dir.resolve()):
         raise HTTPException(status_code=403, detail="Access denied")
 
-    return FileResponse(file_path)
+    # Stored names never change content, so browsers can cache them for good
+    return FileResponse(file_path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
 
 
-# Admin endpoints
+# Admin endpoints (all but /auth require an admin session token)
+
+admin = APIRouter(
+    prefix="/api/admin",
+    dependencies=[Depends(auth.require_admin)],
+    route_class=profiling.TimedRoute,
+)
+
 
 @app.post("/api/admin/auth")
 async def admin_auth(request: AdminAuthRequest):
-    """Authenticate admin with password"""
-    if request.password != ADMIN_PASSWORD:
+    """Exchange the admin password for a signed session token"""
+    if not await asyncio.to_thread(auth.check_password, request.password, auth.ROLE_ADMIN):
         raise HTTPException(status_code=403, detail="Invalid admin password")
-    return {"success": True, "message": "Authenticated"}
 
+    token, expires_at = auth.issue_token(auth.ROLE_ADMIN, events.current().id)
+    return {"success": True, "message": "Authenticated", "token": token, "expires_at": expires_at}
 
-@app.get("/api/admin/entries", response_model=list[AdminEntry])
-async def get_admin_entries(password: str):
-    """Get all entries including deleted (admin only)"""
-    if password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
 
+@admin.get("/entries", response_model=list[AdminEntry])
+async def get_admin_entries():
+    """Get all entries including deleted (admin only)"""
     entries = await database.get_all_entries_admin()
     return [
         AdminEntry(
             id=entry["id"],
             name=entry["name"],
             costume_name=entry["costume_name"],
-            photo_url=f"/api/uploads/{entry['photo_filename']}",
+            photo_url=_photo_url(entry["photo_filename"]),
             deleted=bool(entry["deleted"]),
             created_at=entry["created_at"],
         )
@@ -331,12 +581,9 @@ async def get_admin_entries(password: str):
     ]
 
 
-@app.get("/api/admin/votes", response_model=list[AdminVote])
-async def get_admin_votes(password: str):
+@admin.get("/votes", response_model=list[AdminVote])
+async def get_admin_votes():
     """Get all votes including deleted (admin only)"""
-    if password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     votes = await database.get_all_votes_admin()
     return [
         AdminVote(
@@ -353,12 +600,9 @@ async def get_admin_votes(password: str):
     ]
 
 
-@app.get("/api/admin/mc-votes", response_model=list[AdminMCVote])
-async def get_admin_mc_votes(password: str):
+@admin.get("/mc-votes", response_model=list[AdminMCVote])
+async def get_admin_mc_votes():
     """Get all MC votes including deleted (admin only)"""
-    if password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     votes = await database.get_all_mc_votes_admin()
     return [
         AdminMCVote(
@@ -375,128 +619,452 @@ async def get_admin_mc_votes(password: str):
     ]
 
 
-@app.post("/api/admin/entries/{entry_id}/delete")
-async def delete_entry(entry_id: str, request: AdminAuthRequest):
+@admin.post("/entries/{entry_id}/delete")
+async def delete_entry(entry_id: str):
     """Soft delete an entry (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     await database.soft_delete_entry(entry_id)
     return {"success": True, "message": "Entry deleted"}
 
 
-@app.post("/api/admin/entries/{entry_id}/restore")
-async def restore_entry(entry_id: str, request: AdminAuthRequest):
+@admin.post("/entries/{entry_id}/restore")
+async def restore_entry(entry_id: str):
     """Restore a deleted entry (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     await database.restore_entry(entry_id)
     return {"success": True, "message": "Entry restored"}
 
 
-@app.post("/api/admin/votes/{vote_id}/delete")
-async def delete_vote(vote_id: str, request: AdminAuthRequest):
+@admin.post("/votes/{vote_id}/delete")
+async def delete_vote(vote_id: str):
     """Soft delete a vote (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     await database.soft_delete_vote(vote_id)
     return {"success": True, "message": "Vote deleted"}
 
 
-@app.post("/api/admin/votes/{vote_id}/restore")
-async def restore_vote(vote_id: str, request: AdminAuthRequest):
+@admin.post("/votes/{vote_id}/restore")
+async def restore_vote(vote_id: str):
     """Restore a deleted vote (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     await database.restore_vote(vote_id)
     return {"success": True, "message": "Vote restored"}
 
 
-@app.post("/api/admin/mc-votes/{vote_id}/delete")
-async def delete_mc_vote(vote_id: str, request: AdminAuthRequest):
+@admin.post("/mc-votes/{vote_id}/delete")
+async def delete_mc_vote(vote_id: str):
     """Soft delete an MC vote (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     await database.soft_delete_mc_vote(vote_id)
     return {"success": True, "message": "MC vote deleted"}
 
 
-@app.post("/api/admin/mc-votes/{vote_id}/restore")
-async def restore_mc_vote(vote_id: str, request: AdminAuthRequest):
+@admin.post("/mc-votes/{vote_id}/restore")
+async def restore_mc_vote(vote_id: str):
     """Restore a deleted MC vote (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     await database.restore_mc_vote(vote_id)
     return {"success": True, "message": "MC vote restored"}
 
 
-# Admin endpoints for grouped votes
+@admin.get("/duplicates", response_model=list[AdminDuplicatePair])
+async def get_admin_duplicates():
+    """Get pairs of active entries whose photos look alike (admin only)"""
+    pairs = await database.get_duplicate_pairs(DUPLICATE_MAX_DISTANCE)
+    return [
+        AdminDuplicatePair(
+            entry=SimilarEntry(
+                id=pair["entry"]["id"],
+                name=pair["entry"]["name"],
+                costume_name=pair["entry"]["costume_name"],
+                photo_url=_photo_url(pair["entry"]["photo_filename"]),
+                distance=0,
+            ),
+            duplicate=SimilarEntry(
+                id=pair["duplicate"]["id"],
+                name=pair["duplicate"]["name"],
+                costume_name=pair["duplicate"]["costume_name"],
+                photo_url=_photo_url(pair["duplicate"]["photo_filename"]),
+                distance=pair["distance"],
+            ),
+            distance=pair["distance"],
+        )
+        for pair in pairs
+    ]
 
-@app.get("/api/admin/votes-grouped")
-async def get_admin_votes_grouped(password: str):
-    """Get votes grouped by voter (admin only)"""
-    if password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
 
-    votes = await database.get_votes_grouped_by_voter_admin()
-    return votes
+# Admin endpoints for grouped votes
 
+@admin.get("/votes-grouped")
+async def get_admin_votes_grouped(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Get votes grouped by voter, one page at a time, most recently active voters first (admin only)"""
+    return await database.get_votes_grouped_by_voter_admin(offset, limit)
 
-@app.get("/api/admin/mc-votes-grouped")
-async def get_admin_mc_votes_grouped(password: str):
-    """Get MC votes grouped by voter (admin only)"""
-    if password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
 
-    votes = await database.get_mc_votes_grouped_by_voter_admin()
-    return votes
+@admin.get("/mc-votes-grouped")
+async def get_admin_mc_votes_grouped(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Get MC votes grouped by voter, one page at a time, most recently active voters first (admin only)"""
+    return await database.get_mc_votes_grouped_by_voter_admin(offset, limit)
 
 
-@app.post("/api/admin/votes/voter/{voter_id}/delete")
-async def delete_all_votes_by_voter(voter_id: str, request: AdminAuthRequest):
+@admin.post("/votes/voter/{voter_id}/delete")
+async def delete_all_votes_by_voter(voter_id: str):
     """Soft delete all votes from a voter (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     count = await database.soft_delete_all_votes_by_voter(voter_id)
     return {"success": True, "message": f"Deleted {count} votes"}
 
 
-@app.post("/api/admin/votes/voter/{voter_id}/restore")
-async def restore_all_votes_by_voter(voter_id: str, request: AdminAuthRequest):
+@admin.post("/votes/voter/{voter_id}/restore")
+async def restore_all_votes_by_voter(voter_id: str):
     """Restore all votes from a voter (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     count = await database.restore_all_votes_by_voter(voter_id)
     return {"success": True, "message": f"Restored {count} votes"}
 
 
-@app.post("/api/admin/mc-votes/voter/{voter_id}/delete")
-async def delete_all_mc_votes_by_voter(voter_id: str, request: AdminAuthRequest):
+@admin.post("/mc-votes/voter/{voter_id}/delete")
+async def delete_all_mc_votes_by_voter(voter_id: str):
     """Soft delete all MC votes from a voter (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     count = await database.soft_delete_all_mc_votes_by_voter(voter_id)
     return {"success": True, "message": f"Deleted {count} MC votes"}
 
 
-@app.post("/api/admin/mc-votes/voter/{voter_id}/restore")
-async def restore_all_mc_votes_by_voter(voter_id: str, request: AdminAuthRequest):
+@admin.post("/mc-votes/voter/{voter_id}/restore")
+async def restore_all_mc_votes_by_voter(voter_id: str):
     """Restore all MC votes from a voter (admin only)"""
-    if request.password != ADMIN_PASSWORD:
-        raise HTTPException(status_code=403, detail="Invalid admin password")
-
     count = await database.restore_all_mc_votes_by_voter(voter_id)
     return {"success": True, "message": f"Restored {count} MC votes"}
 
 
+# Voting catalog management (takes effect immediately, no restart needed)
+
+@admin.get("/catalog")
+async def get_admin_catalog():
+    """Get all categories and questions, including retired ones (admin only)"""
+    return await database.get_catalog_admin()
+
+
+@admin.post("/categories")
+async def add_category(request: CatalogCategoryCreate):
+    """Add a voting category (admin only)"""
+    try:
+        await database.add_category(request.id, request.name, request.display_order, request.voting_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "message": "Category added"}
+
+
+@admin.put("/categories/order")
+async def reorder_categories(request: CatalogOrder):
+    """Reorder voting categories (admin only)"""
+    try:
+        await database.reorder_categories(request.ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "message": "Categories reordered"}
+
+
+@admin.patch("/categories/{category_id}")
+async def update_category(category_id: str, request: CatalogCategoryUpdate):
+    """Rename, move, retire, reinstate or change the voting mode of a category (admin only)"""
+    try:
+        updated = await database.update_category(
+            category_id, request.name, request.display_order, request.retired, request.voting_mode
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not updated:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return {"success": True, "message": "Category updated"}
+
+
+@admin.post("/mc-questions")
+async def add_mc_question(request: CatalogMCQuestionCreate):
+    """Add a multiple choice question with its options (admin only)"""
+    try:
+        await database.add_mc_question(
+            request.id,
+            request.question,
+            [option.model_dump() for option in request.options],
+            request.display_order,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "message": "Question added"}
+
+
+@admin.put("/mc-questions/order")
+async def reorder_mc_questions(request: CatalogOrder):
+    """Reorder multiple choice questions (admin only)"""
+    try:
+        await database.reorder_mc_questions(request.ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "message": "Questions reordered"}
+
+
+@admin.patch("/mc-questions/{question_id}")
+async def update_mc_question(question_id: str, request: CatalogMCQuestionUpdate):
+    """Reword, move, retire or reinstate a multiple choice question (admin only)"""
+    if not await database.update_mc_question(question_id, request.question, request.display_order, request.retired):
+        raise HTTPException(status_code=404, detail="Question not found")
+    return {"success": True, "message": "Question updated"}
+
+
+@admin.post("/mc-questions/{question_id}/options")
+async def add_mc_option(question_id: str, request: EventMCOption):
+    """Add an option to a multiple choice question (admin only)"""
+    try:
+        added = await database.add_mc_option(question_id, request.id, request.text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not added:
+        raise HTTPException(status_code=404, detail="Question not found")
+    return {"success": True, "message": "Option added"}
+
+
+@admin.patch("/mc-questions/{question_id}/options/{option_id}")
+async def update_mc_option(question_id: str, option_id: str, request: CatalogMCOptionUpdate):
+    """Reword, retire or reinstate a multiple choice option (admin only)"""
+    if not await database.update_mc_option(question_id, option_id, request.text, request.retired):
+        raise HTTPException(status_code=404, detail="Option not found")
+    return {"success": True, "message": "Option updated"}
+
+
+# Event management (default event's admins only)
+
+@admin.get("/events")
+async def get_events():
+    """List all events besides the default one (admin only)"""
+    _require_default_event()
+    return [
+        {**event, "api_prefix": f"/api/events/{event['id']}"}
+        for event in await events.list_events()
+    ]
+
+
+@admin.post("/events")
+async def create_event(request: EventCreateRequest):
+    """Create a new event with its own database, categories and passwords (admin only)"""
+    _require_default_event()
+    try:
+        event = await events.create_event(
+            request.id,
+            request.name,
+            request.results_password,
+            request.admin_password,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    categories = [cat.model_dump() for cat in request.categories] if request.categories is not None else CATEGORIES
+    questions = (
+        [q.model_dump() for q in request.mc_questions]
+        if request.mc_questions is not None
+        else MULTIPLE_CHOICE_QUESTIONS
+    )
+
+    token = events.use(event)
+    try:
+        await database.ensure_initialized()
+        await database.seed_catalog(categories, questions)
+    finally:
+        events.reset(token)
+
+    return {"success": True, "id": event.id, "name": event.name, "api_prefix": event.api_prefix}
+
+
+# Admin data export
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+async def _stream_csv(chunks):
+    """Render export chunks as CSV, one header row per dataset"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    async for dataset, columns, rows in chunks:
+        if rows:
+            writer.writerows(rows)
+        else:
+            writer.writerow(columns)
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+async def _stream_ndjson(chunks, tag_dataset: bool):
+    """Render export chunks as newline-delimited JSON objects"""
+    async for dataset, columns, rows in chunks:
+        lines = []
+        for row in rows:
+            record = dict(zip(columns, row))
+            if tag_dataset:
+                record = {"dataset": dataset, **record}
+            lines.append(json.dumps(record, default=str))
+
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+
+@admin.get("/export/{dataset}")
+async def export_data(dataset: str, format: str = "csv"):
+    """Stream entries, votes, MC votes or tallies as CSV or NDJSON (admin only)
+
+    Use dataset "all" (NDJSON only) to export everything from one snapshot.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown format. Allowed: {', '.join(EXPORT_FORMATS)}",
+        )
+
+    if dataset == "all":
+        if format != "ndjson":
+            raise HTTPException(status_code=400, detail="Exporting all datasets requires format=ndjson")
+        datasets = list(database.EXPORT_QUERIES)
+    elif dataset in database.EXPORT_QUERIES:
+        datasets = [dataset]
+    else:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown dataset. Available: all, {', '.join(database.EXPORT_QUERIES)}",
+        )
+
+    chunks = database.iter_export(datasets)
+    if format == "csv":
+        body = _stream_csv(chunks)
+    else:
+        body = _stream_ndjson(chunks, tag_dataset=len(datasets) > 1)
+
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="halloween-{dataset}.{format}"'},
+    )
+
+
+@admin.get("/audit-log")
+async def export_audit_log(after: int = 0):
+    """Stream the audit log as compact NDJSON, oldest first (admin only)
+
+    Pass the last seq already fetched as `after` to download only newer events.
+    Feed the file to audit.py to replay and verify it.
+    """
+    async def body():
+        async for records in database.iter_audit_log(after):
+            yield "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS["ndjson"],
+        headers={"Content-Disposition": 'attachment; filename="halloween-audit-log.ndjson"'},
+    )
+
+
+# Admin online backup and reset
+
+@admin.post("/backup")
+async def start_backup():
+    """Start an online backup of the database (admin only)"""
+    return backup.start_backup()
+
+
+@admin.get("/backup")
+async def list_backups():
+    """List recent backup jobs with their progress (admin only)"""
+    return backup.list_backups()
+
+
+@admin.get("/backup/{job_id}")
+async def get_backup_status(job_id: str):
+    """Get progress and duration of a backup job (admin only)"""
+    status = backup.get_backup_status(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Backup job not found")
+    return status
+
+
+@admin.get("/backup/{job_id}/download")
+async def download_backup(job_id: str):
+    """Download a finished backup file (admin only)"""
+    path = backup.get_backup_path(job_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Backup not ready")
+    return FileResponse(path, filename=path.name, media_type="application/vnd.sqlite3")
+
+
+@admin.post("/reset")
+async def reset_data(request: AdminResetRequest):
+    """Clear all entries and votes without restarting the server (admin only)"""
+    result = await backup.reset_all(archive_uploads=request.archive_uploads)
+    return {"success": True, **result}
+
+
+@admin.get("/janitor")
+async def get_janitor_status():
+    """What the background janitor has done for this event (admin only)"""
+    return {"enabled": JANITOR_ENABLED, **janitor.get_status(events.current().id)}
+
+
+# Profiling (default event's admins only: covers the whole server)
+
+@admin.get("/profiling")
+async def get_profiling():
+    """Slow requests, newest first, and the sampling profiles recorded (admin only)"""
+    _require_default_event()
+    return {
+        "slow_request_ms": SLOW_REQUEST_MS,
+        "slow_requests": profiling.get_slow_requests(),
+        **profiling.get_profiles(),
+    }
+
+
+@admin.delete("/profiling/slow-requests")
+async def clear_slow_requests():
+    """Empty the slow-request log (admin only)"""
+    _require_default_event()
+    return {"success": True, "cleared": profiling.clear_slow_requests()}
+
+
+@admin.post("/profiling/profiles")
+async def start_profile(request: AdminProfileRequest):
+    """Sample every thread's stack for a number of seconds (admin only)"""
+    _require_default_event()
+    try:
+        return profiling.start_profile(request.seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@admin.post("/profiling/profiles/stop")
+async def stop_profile():
+    """Stop the profile being recorded early (admin only)"""
+    _require_default_event()
+    status = profiling.stop_profile()
+    if not status:
+        raise HTTPException(status_code=404, detail="No profile is being recorded")
+    return status
+
+
+@admin.get("/profiling/profiles/{profile_id}/collapsed")
+async def download_profile(profile_id: str):
+    """Download a finished profile as collapsed stacks, for flamegraph.pl or speedscope (admin only)"""
+    _require_default_event()
+    stacks = profiling.collapsed_stacks(profile_id)
+    if stacks is None:
+        raise HTTPException(status_code=404, detail="Profile not found or still running")
+    return PlainTextResponse(
+        stacks,
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.collapsed"'},
+    )
+
+
+app.include_router(admin)
+
+if site:
+    # Last, so API routes and /docs take precedence
+    app.mount("/", site)
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,359 @@
+"""
+Replay the audit log to rebuild entries, votes and tallies, and verify them
+
+Reads the log either from the database itself or from an NDJSON file
+downloaded from GET /api/admin/audit-log, replays it from the first event,
+and compares the result with the database's current rows and vote counts.
+Optionally writes the replayed state to a fresh database file (see rebuild()
+for what the log cannot restore on its own).
+
+Usage (from backend/):
+    python audit.py halloween.db
+    python audit.py halloween.db --log halloween-audit-log.ndjson
+    python audit.py halloween.db --rebuild rebuilt.db
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from database import SCHEMA, SCHEMA_COLUMNS, VOTE_TABLES, AUDIT_SUBJECTS, audit_record
+
+# Tables copied as they are from the source database into a rebuilt one (not
+# in the log): the catalog, and the ballots that guard against replayed submissions
+COPIED_TABLES = ["categories", "mc_questions", "mc_options", "ballots"]
+
+ENTRY_FIELDS = ("name", "costume_name", "photo_filename", "photo_hash")
+
+# Fields of an export record that are not part of the event's data
+RECORD_FIELDS = {"seq", "at", "type", "id"}
+
+
+class ReplayError(Exception):
+    """The log does not describe a consistent history"""
+
+
+class State:
+    """Entries and votes as of some point in the log, keyed by ID"""
+
+    def __init__(self):
+        self.entries: Dict[str, Dict] = {}
+        self.votes: Dict[str, Dict[str, Dict]] = {table: {} for table in VOTE_TABLES}
+        self.last_seq = 0
+
+    def tallies(self, table: str) -> Counter:
+        """Active votes per (key, choice), like the live tallies in database.py"""
+        key_column, choice_column = VOTE_TABLES[table]
+        return Counter(
+            (vote[key_column], vote[choice_column])
+            for vote in self.votes[table].values()
+            if not vote["deleted"]
+        )
+
+
+def read_log_file(path: str) -> Iterator[Dict]:
+    """Records from an NDJSON audit log export"""
+    with open(path, encoding="utf-8") as log:
+        for line in log:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_log_db(conn: sqlite3.Connection) -> Iterator[Dict]:
+    """Records straight from a database's audit_log table"""
+    yield from (audit_record(*row) for row in conn.execute("""
+        SELECT seq, at, type, subject_id, data FROM audit_log ORDER BY seq
+    """))
+
+
+def _apply_vote(state: State, table: str, action: str, record: Dict) -> None:
+    key_column, choice_column = VOTE_TABLES[table]
+    votes = state.votes[table]
+    vote_id = record["id"]
+
+    if action == "cast":
+        votes[vote_id] = {
+            "voter_id": record["voter_id"],
+            key_column: record[key_column],
+            choice_column: record[choice_column],
+            "deleted": False,
+            "created_at": record["at"],
+            "updated_at": record["at"],  # Set on insert, like the live tables
+            "change_count": 0,
+        }
+        return
+
+    if vote_id not in votes:
+        raise ReplayError(f"seq {record['seq']}: {record['type']} for unknown vote {vote_id}")
+    vote = votes[vote_id]
+    if action == "changed":
+        vote[choice_column] = record[choice_column]
+        vote["updated_at"] = record["at"]
+        vote["change_count"] += 1
+    elif action in ("deleted", "restored"):
+        vote["deleted"] = action == "deleted"
+    else:
+        raise ReplayError(f"seq {record['seq']}: unknown event type {record['type']}")
+
+
+def replay(records: Iterable[Dict]) -> State:
+    """Apply every event in order, starting from an empty database"""
+    state = State()
+    tables_by_subject = {subject: table for table, subject in AUDIT_SUBJECTS.items()}
+
+    for record in records:
+        if record["seq"] <= state.last_seq:
+            raise ReplayError(f"seq {record['seq']} is out of order (after {state.last_seq})")
+        state.last_seq = record["seq"]
+        event_type = record["type"]
+        subject_id = record["id"]
+
+        if event_type == "data_reset":
+            state.entries.clear()
+            for votes in state.votes.values():
+                votes.clear()
+        elif event_type == "entry_created":
+            state.entries[subject_id] = {
+                **{field: record.get(field) for field in ENTRY_FIELDS},
+                "deleted": False,
+                "deleted_at": None,
+                "created_at": record["at"],
+            }
+        elif event_type.startswith("entry_"):
+            entry = state.entries.get(subject_id)
+            if entry is None:
+                raise ReplayError(f"seq {record['seq']}: {event_type} for unknown entry {subject_id}")
+            if event_type == "entry_purged":
+                del state.entries[subject_id]  # Its votes stay
+            elif event_type == "entry_photo_moved":
+                entry["photo_filename"] = record["photo_filename"]
+                entry["photo_hash"] = record["photo_hash"]
+            elif event_type in ("entry_deleted", "entry_restored"):
+                entry["deleted"] = event_type == "entry_deleted"
+                entry["deleted_at"] = record["at"] if entry["deleted"] else None
+            else:
+                raise ReplayError(f"seq {record['seq']}: unknown event type {event_type}")
+        else:
+            subject, _, action = event_type.rpartition("_")
+            if subject not in tables_by_subject:
+                raise ReplayError(f"seq {record['seq']}: unknown event type {event_type}")
+            _apply_vote(state, tables_by_subject[subject], action, record)
+
+    return state
+
+
+def _compare(label: str, expected: Dict[str, Dict], actual: Dict[str, Dict], fields: List[str]) -> List[str]:
+    """Differences between replayed rows and the database's rows"""
+    problems = []
+    for row_id in sorted(expected.keys() - actual.keys()):
+        problems.append(f"{label} {row_id}: in the log but not in the database")
+    for row_id in sorted(actual.keys() - expected.keys()):
+        problems.append(f"{label} {row_id}: in the database but not in the log")
+    for row_id in sorted(expected.keys() & actual.keys()):
+        for field in fields:
+            if expected[row_id][field] != actual[row_id][field]:
+                problems.append(
+                    f"{label} {row_id}: {field} is {actual[row_id][field]!r}, "
+                    f"log says {expected[row_id][field]!r}"
+                )
+    return problems
+
+
+def verify(state: State, conn: sqlite3.Connection) -> List[str]:
+    """Compare the replayed state with the database's current rows and counts"""
+    conn.row_factory = sqlite3.Row
+    entries = {
+        row["id"]: {**dict(row), "deleted": bool(row["deleted"])}
+        for row in conn.execute(f"SELECT id, {', '.join(ENTRY_FIELDS)}, deleted FROM entries")
+    }
+    problems = _compare("entry", state.entries, entries, [*ENTRY_FIELDS, "deleted"])
+
+    for table, (key_column, choice_column) in VOTE_TABLES.items():
+        votes = {
+            row["id"]: {**dict(row), "deleted": bool(row["deleted"])}
+            for row in conn.execute(f"""
+                SELECT id, voter_id, {key_column}, {choice_column}, deleted FROM {table}
+            """)
+        }
+        problems += _compare(AUDIT_SUBJECTS[table], state.votes[table], votes,
+                             ["voter_id", key_column, choice_column, "deleted"])
+
+        counted = Counter({
+            (row[0], row[1]): row[2]
+            for row in conn.execute(f"""
+                SELECT {key_column}, {choice_column}, COUNT(*)
+                FROM {table}
+                WHERE deleted = 0
+                GROUP BY {key_column}, {choice_column}
+            """)
+        })
+        tallies = state.tallies(table)
+        for key, choice in sorted(tallies.keys() | counted.keys()):
+            replayed = tallies[(key, choice)]
+            if replayed != counted[(key, choice)]:
+                problems.append(
+                    f"{table} tally {key}/{choice}: database counts {counted[(key, choice)]}, log says {replayed}"
+                )
+
+    conn.row_factory = None
+    return problems
+
+
+def _record_data(record: Dict):
+    """The audit_log data column for an export record"""
+    data = {key: value for key, value in record.items() if key not in RECORD_FIELDS}
+    return json.dumps(data, separators=(",", ":")) if data else None
+
+
+def _copy_table(source: sqlite3.Connection, target: sqlite3.Connection, table: str) -> Optional[str]:
+    """Copy a table's rows as they are, returning a gap if the source cannot provide them"""
+    try:
+        rows = source.execute(f"SELECT * FROM {table}")
+        columns = [description[0] for description in rows.description]
+        target.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows,
+        )
+    except sqlite3.Error as err:
+        return f"{table}: could not be copied from the source database ({err})"
+    return None
+
+
+def _rebuild_blobs(state: State, source: sqlite3.Connection, target: sqlite3.Connection) -> List[str]:
+    """Recreate the blob rows of the replayed entries' photos, returning any gaps
+
+    References are counted from the replayed entries (deleted ones keep theirs
+    until purged); size, perceptual hash and placeholder are not in the log,
+    so they come from the source database's blob rows.
+    """
+    references = Counter(entry["photo_hash"] for entry in state.entries.values() if entry["photo_hash"])
+    filenames = {entry["photo_hash"]: entry["photo_filename"] for entry in state.entries.values()}
+    try:
+        stored = {
+            row[0]: row[1:]
+            for row in source.execute("SELECT hash, size, phash, placeholder, created_at FROM blobs")
+        }
+    except sqlite3.Error as err:
+        return [f"blobs: could not be read from the source database ({err})"]
+
+    target.executemany("""
+        INSERT INTO blobs (hash, filename, size, ref_count, phash, placeholder, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (photo_hash, filenames[photo_hash], size, count, stored_phash, placeholder, created_at)
+        for photo_hash, count in references.items()
+        if photo_hash in stored
+        for size, stored_phash, placeholder, created_at in [stored[photo_hash]]
+    ])
+    return [
+        f"blob {photo_hash}: missing from the source database ({references[photo_hash]} entries use it)"
+        for photo_hash in sorted(references.keys() - stored.keys())
+    ]
+
+
+def rebuild(state: State, records: List[Dict], source: sqlite3.Connection, target_path: str) -> List[str]:
+    """Write the replayed state (and the log itself) to a new database file
+
+    Entries (with deleted_at), votes and their tallies come from the log.
+    The log does not record the catalog, the ballots that guard against
+    replayed submissions or the photos' blob metadata, so those are taken
+    from the source database: COPIED_TABLES as they are, and the blob rows
+    of the replayed entries' photos with their references recounted.
+    Returns what could not be rebuilt that way (empty if nothing is missing).
+    """
+    gaps = []
+    target = sqlite3.connect(target_path)
+    try:
+        with target:
+            for statement in SCHEMA:
+                target.execute(statement)
+            for table, column, definition in SCHEMA_COLUMNS:
+                columns = {row[1] for row in target.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    target.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+            for table in COPIED_TABLES:
+                gap = _copy_table(source, target, table)
+                if gap:
+                    gaps.append(gap)
+
+            target.executemany("""
+                INSERT INTO entries (id, name, costume_name, photo_filename, photo_hash, deleted, deleted_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (entry_id, *(entry[field] for field in ENTRY_FIELDS), int(entry["deleted"]),
+                 entry["deleted_at"], entry["created_at"])
+                for entry_id, entry in state.entries.items()
+            ])
+            gaps += _rebuild_blobs(state, source, target)
+
+            for table, (key_column, choice_column) in VOTE_TABLES.items():
+                target.executemany(f"""
+                    INSERT INTO {table}
+                        (id, voter_id, {key_column}, {choice_column}, deleted, created_at, updated_at, change_count)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, [
+                    (vote_id, vote["voter_id"], vote[key_column], vote[choice_column], int(vote["deleted"]),
+                     vote["created_at"], vote["updated_at"], vote["change_count"])
+                    for vote_id, vote in state.votes[table].items()
+                ])
+
+            target.executemany("""
+                INSERT INTO audit_log (seq, at, type, subject_id, data) VALUES (?, ?, ?, ?, ?)
+            """, [
+                (record["seq"], record["at"], record["type"], record["id"], _record_data(record))
+                for record in records
+            ])
+    finally:
+        target.close()
+    return gaps
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("database", help="database to verify against (e.g. halloween.db)")
+    parser.add_argument("--log", help="NDJSON audit log export (default: the database's own log)")
+    parser.add_argument("--rebuild", metavar="PATH", help="also write the replayed state to a new database")
+    args = parser.parse_args()
+
+    source = sqlite3.connect(f"file:{args.database}?mode=ro", uri=True)
+    try:
+        records = list(read_log_file(args.log) if args.log else read_log_db(source))
+        try:
+            state = replay(records)
+        except ReplayError as err:
+            print(f"Replay failed: {err}")
+            return 1
+
+        print(f"Replayed {len(records)} events (last seq {state.last_seq}): "
+              f"{len(state.entries)} entries, "
+              + ", ".join(f"{len(votes)} {table}" for table, votes in state.votes.items()))
+
+        gaps = []
+        if args.rebuild:
+            gaps = rebuild(state, records, source, args.rebuild)
+            print(f"Rebuilt database written to {args.rebuild}")
+            for gap in gaps:
+                print(f"  not rebuilt: {gap}")
+
+        problems = verify(state, source)
+    finally:
+        source.close()
+
+    for problem in problems:
+        print(f"  {problem}")
+    if problems:
+        print(f"Mismatch: {len(problems)} difference(s) between the log and {args.database}")
+        return 1
+
+    print(f"OK: {args.database} matches the log")
+    if gaps:
+        print(f"Incomplete: {len(gaps)} gap(s) in {args.rebuild}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Signed, expiring session tokens for admins and results viewers
+
+A password is exchanged once for a token of the form
+"<role>.<event_id>.<expires>.<signature>", where the signature is an
+HMAC-SHA256 of the rest. Verifying a token needs no database or session
+store: recompute the HMAC, compare in constant time, check the expiry.
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from typing import Optional, Tuple
+
+from fastapi import Header, HTTPException
+
+from config import SESSION_SECRET, SESSION_TTL_SECONDS, RESULTS_PASSWORD, ADMIN_PASSWORD
+import events
+import passwords
+
+ROLE_ADMIN = "admin"
+ROLE_RESULTS = "results"
+
+# Without a configured secret, tokens only survive until the next restart
+_secret = SESSION_SECRET.encode() if SESSION_SECRET else secrets.token_bytes(32)
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_secret, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def check_password(password: str, role: str) -> bool:
+    """Check a password against the current event's password for a role, in constant time
+
+    The default event's passwords are the configured ones; other events keep
+    only hashes, which are slow to check on purpose (run this in a thread).
+    """
+    event = events.current()
+    if event.is_default:
+        expected = ADMIN_PASSWORD if role == ROLE_ADMIN else RESULTS_PASSWORD
+        return hmac.compare_digest(password.encode(), expected.encode())
+
+    password_hash = event.admin_password_hash if role == ROLE_ADMIN else event.results_password_hash
+    return passwords.verify_password(password, password_hash)
+
+
+def issue_token(role: str, event_id: str, ttl: int = SESSION_TTL_SECONDS) -> Tuple[str, int]:
+    """Create a token for a role in an event, returning (token, expires_at)"""
+    expires_at = int(time.time()) + ttl
+    payload = f"{role}.{event_id}.{expires_at}"
+    return f"{payload}.{_sign(payload)}", expires_at
+
+
+def verify_token(token: str) -> Optional[Tuple[str, str]]:
+    """Get (role, event_id) from a valid, unexpired token, or None"""
+    payload, _, signature = token.rpartition(".")
+    if not payload or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+
+    role, _, rest = payload.partition(".")
+    event_id, _, expires_at = rest.rpartition(".")
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return None
+
+    return role, event_id
+
+
+def _claims(authorization: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Verified claims from an "Authorization: Bearer <token>" header"""
+    if not authorization:
+        return None
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+
+    claims = verify_token(token.strip())
+    if not claims or claims[1] != events.current().id:
+        return None
+    return claims
+
+
+async def require_admin(authorization: Optional[str] = Header(None)):
+    """FastAPI dependency: the request carries an admin token for this event"""
+    claims = _claims(authorization)
+    if not claims or claims[0] != ROLE_ADMIN:
+        raise HTTPException(
+            status_code=401,
+            detail="Admin session missing or expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+async def require_results_viewer(authorization: Optional[str] = Header(None)):
+    """FastAPI dependency: the request carries a results (or admin) token for this event"""
+    claims = _claims(authorization)
+    if not claims or claims[0] not in (ROLE_RESULTS, ROLE_ADMIN):
+        raise HTTPException(
+            status_code=401,
+            detail="Results session missing or expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
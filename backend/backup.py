@@ -0,0 +1,166 @@
+"""
+Online backups and in-place resets that run without stopping the server
+"""
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import database
+import events
+from config import (
+    BACKUP_DIR,
+    ARCHIVE_DIR,
+    BACKUP_PAGES_PER_STEP,
+    BACKUP_STEP_SLEEP,
+)
+
+# Most recent backup jobs, oldest first
+MAX_TRACKED_JOBS = 20
+_jobs: "OrderedDict[str, Dict]" = OrderedDict()
+
+
+def _job_status(job: Dict) -> Dict:
+    """Public view of a backup job"""
+    total = job["total_pages"]
+    copied = total - job["remaining_pages"] if total else 0
+    finished_at = job["finished_at"] or time.perf_counter()
+
+    return {
+        "job_id": job["job_id"],
+        "state": job["state"],
+        "filename": job["filename"],
+        "total_pages": total,
+        "copied_pages": copied,
+        "progress": round(copied / total, 4) if total else (1.0 if job["state"] == "done" else 0.0),
+        "duration_seconds": round(finished_at - job["started_at"], 3),
+        "size_bytes": job["size_bytes"],
+        "error": job["error"],
+    }
+
+
+async def _run_backup(job: Dict, partial_path: Path, final_path: Path) -> None:
+    """Copy the database in small steps, then publish the finished file"""
+
+    def progress(status, remaining, total):
+        # Called on the database worker thread after every step
+        job["remaining_pages"] = remaining
+        job["total_pages"] = total
+
+    try:
+        await database.backup_database(
+            str(partial_path),
+            pages=BACKUP_PAGES_PER_STEP,
+            sleep=BACKUP_STEP_SLEEP,
+            progress=progress,
+        )
+        os.replace(partial_path, final_path)
+        job["size_bytes"] = final_path.stat().st_size
+        job["remaining_pages"] = 0
+        job["state"] = "done"
+    except Exception as e:
+        partial_path.unlink(missing_ok=True)
+        job["state"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = time.perf_counter()
+
+
+def start_backup() -> Dict:
+    """Start an online backup in the background and return its initial status"""
+    Path(BACKUP_DIR).mkdir(exist_ok=True)
+
+    event_id = events.current().id
+    job_id = str(uuid.uuid4())
+    filename = f"halloween-{event_id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{job_id[:8]}.db"
+    final_path = Path(BACKUP_DIR) / filename
+    partial_path = final_path.with_suffix(".db.partial")
+
+    job = {
+        "job_id": job_id,
+        "event_id": event_id,
+        "state": "running",
+        "filename": filename,
+        "path": final_path,
+        "total_pages": 0,
+        "remaining_pages": 0,
+        "size_bytes": None,
+        "error": None,
+        "started_at": time.perf_counter(),
+        "finished_at": None,
+    }
+    _jobs[job_id] = job
+    while len(_jobs) > MAX_TRACKED_JOBS:
+        _jobs.popitem(last=False)
+
+    job["task"] = asyncio.create_task(_run_backup(job, partial_path, final_path))
+    return _job_status(job)
+
+
+def _get_job(job_id: str) -> Optional[Dict]:
+    """Get a backup job belonging to the current event"""
+    job = _jobs.get(job_id)
+    if not job or job["event_id"] != events.current().id:
+        return None
+    return job
+
+
+def get_backup_status(job_id: str) -> Optional[Dict]:
+    """Get the status of a backup job, or None if unknown"""
+    job = _get_job(job_id)
+    return _job_status(job) if job else None
+
+
+def get_backup_path(job_id: str) -> Optional[Path]:
+    """Get the file of a finished backup job, or None if not available"""
+    job = _get_job(job_id)
+    if not job or job["state"] != "done":
+        return None
+    return job["path"]
+
+
+def list_backups() -> list:
+    """Status of the current event's tracked backup jobs, newest first"""
+    event_id = events.current().id
+    return [_job_status(job) for job in reversed(_jobs.values()) if job["event_id"] == event_id]
+
+
+def _archive_uploads(upload_dir: Path, event_id: str) -> Optional[str]:
+    """Move an uploads directory aside and recreate it empty"""
+    if not upload_dir.exists() or not any(upload_dir.iterdir()):
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        return None
+
+    Path(ARCHIVE_DIR).mkdir(exist_ok=True)
+    archive_path = Path(ARCHIVE_DIR) / f"{event_id}-uploads-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+
+    # A rename is instant on the same filesystem; fall back to a copy otherwise
+    shutil.move(str(upload_dir), str(archive_path))
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    return str(archive_path)
+
+
+async def reset_all(archive_uploads: bool = True) -> Dict:
+    """Clear all entries and votes in place, archive uploads and drop caches"""
+    started = time.perf_counter()
+
+    deleted = await database.reset_data()
+
+    event = events.current()
+    archived_to = None
+    if archive_uploads:
+        archived_to = await asyncio.to_thread(_archive_uploads, Path(event.upload_dir), event.id)
+
+    caches = database.invalidate_caches()
+
+    return {
+        "deleted": deleted,
+        "uploads_archived_to": archived_to,
+        "caches_invalidated": caches,
+        "duration_seconds": round(time.perf_counter() - started, 3),
+    }
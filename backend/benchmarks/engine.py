@@ -0,0 +1,108 @@
+"""
+Vote engine benchmark: SQLite per call versus memory-resident votes with a journal
+
+Runs the same workload through database.py with VOTE_ENGINE "sqlite" and
+"memory", each in a scratch directory: ballots submitted one after another,
+then bursts of concurrent ballots (everyone pressing Submit at once), a
+returning voter's ballot lookup and the results page. For the memory engine
+the final checkpoint (copying everything into SQLite) is timed as well.
+
+Usage (from backend/):
+    python benchmarks/engine.py [--entries 60] [--voters 1000] [--burst 50]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import database  # noqa: E402
+import events  # noqa: E402
+
+
+def summary(samples) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000
+    return f"p50 {p50:7.3f} ms  p99 {p99:7.3f} ms"
+
+
+async def timed(action):
+    started = time.perf_counter()
+    await action
+    return time.perf_counter() - started
+
+
+async def run(engine: str, args) -> None:
+    database.VOTE_ENGINE = engine
+    event = events.default_event()
+    event.initialized = False
+    event.caches.clear()
+
+    await database.ensure_initialized()
+    entry_ids = [
+        await database.create_entry(f"Guest {i}", f"Costume {i}", f"ab/{uuid.uuid4().hex}.jpg")
+        for i in range(args.entries)
+    ]
+    categories = [category["id"] for category in await database.get_categories()]
+    questions = await database.get_mc_questions()
+
+    rng = random.Random(31)
+
+    def ballot(voter_id: str):
+        return database.submit_ballot(
+            ballot_id=uuid.uuid4().hex,
+            voter_id=voter_id,
+            votes={category: rng.choice(entry_ids) for category in categories},
+            mc_votes={question["id"]: rng.choice(question["options"])["id"] for question in questions},
+        )
+
+    voters = [f"voter-{i}" for i in range(args.voters)]
+    sequential = [await timed(ballot(voter_id)) for voter_id in voters]
+
+    # Everyone changes their mind at once, in bursts
+    bursts = []
+    for start in range(0, len(voters), args.burst):
+        group = voters[start:start + args.burst]
+        started = time.perf_counter()
+        await asyncio.gather(*(ballot(voter_id) for voter_id in group))
+        bursts.append((time.perf_counter() - started) / len(group))
+
+    lookups = [await timed(database.get_voter_ballot(rng.choice(voters))) for _ in range(500)]
+    results = [await timed(database.get_results()) for _ in range(50)]
+
+    print(f"\n{engine}")
+    print(f"  ballot, one at a time    {summary(sequential)}  ({len(sequential) / sum(sequential):,.0f}/s)")
+    print(f"  ballot, bursts of {args.burst:<6} {summary(bursts)}  (per ballot)")
+    print(f"  returning voter lookup   {summary(lookups)}")
+    print(f"  results                  {summary(results)}")
+
+    if engine == "memory":
+        journal_bytes = sum(path.stat().st_size for _, path in database.votestore.journal_files(event.db_path))
+        checkpoint = await timed(database._checkpoint(await database._get_engine()))
+        print(f"  checkpoint of everything {checkpoint * 1000:7.1f} ms  (journal was {journal_bytes / 1024:,.0f} KiB)")
+        await database.close_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=60)
+    parser.add_argument("--voters", type=int, default=1000)
+    parser.add_argument("--burst", type=int, default=50, help="Ballots submitted concurrently")
+    args = parser.parse_args()
+
+    for engine in ("sqlite", "memory"):
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            asyncio.run(run(engine, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Ranked results benchmark: instant runoff over grouped rankings versus per ballot
+
+Draws ballots that rank a few of the entries (popular entries more often),
+then times counting them one ballot at a time against counting them grouped
+by identical ranking, the way get_results() feeds ranked.instant_runoff()
+from the live tallies. The two counts must agree.
+
+Usage (from backend/):
+    python benchmarks/ranked.py [--ballots 20000] [--entries 30] [--choices 3]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ranked  # noqa: E402
+
+
+def summary(samples) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000
+    return f"p50 {p50:8.3f} ms  p99 {p99:8.3f} ms"
+
+
+def timed(action, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = action()
+        samples.append(time.perf_counter() - started)
+    return result, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ballots", type=int, default=20000)
+    parser.add_argument("--entries", type=int, default=30)
+    parser.add_argument("--choices", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    entries = [f"entry-{i}" for i in range(args.entries)]
+    weights = [1 / (i + 1) for i in range(args.entries)]  # A few favourites, a long tail
+
+    def ranking():
+        picked = []
+        while len(picked) < args.choices:
+            entry = rng.choices(entries, weights)[0]
+            if entry not in picked:
+                picked.append(entry)
+        return tuple(picked)
+
+    ballots = [ranking() for _ in range(args.ballots)]
+    per_ballot = dict(enumerate(ballots))
+    groups = Counter(ballots)
+
+    def count_per_ballot():
+        # Every ballot as its own group of one (the leading index is no candidate, so it is skipped)
+        return ranked.instant_runoff({(index, *ballot): 1 for index, ballot in per_ballot.items()}, entries)
+
+    slow, slow_times = timed(count_per_ballot, 10)
+    fast, fast_times = timed(lambda: ranked.instant_runoff(groups, entries), 50)
+    assert slow["winner"] == fast["winner"] and slow["finish"] == fast["finish"], "counts disagree"
+
+    print(f"\n{args.ballots:,} ballots ranking {args.choices} of {args.entries} entries, "
+          f"{len(groups):,} distinct rankings, {len(fast['rounds'])} rounds")
+    print(f"  instant runoff, per ballot     {summary(slow_times)}")
+    print(f"  instant runoff, grouped        {summary(fast_times)}")
+    _, borda_times = timed(lambda: ranked.borda(groups, entries, args.choices), 50)
+    print(f"  Borda count, grouped           {summary(borda_times)}")
+
+
+if __name__ == "__main__":
+    main()
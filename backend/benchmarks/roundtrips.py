@@ -0,0 +1,235 @@
+"""
+Round-trip benchmark: requests through the tunnel per ballot, with and without preflights
+
+Replays two visits of one voter against a real server (first visit, then a
+return half an hour later to change a vote): page load, API calls, a few
+photos and the ballot POST. A small simulated browser sends the CORS
+preflights a real one would (every API call carries the custom ngrok header,
+so none of them is a "simple" request) and caches their answers per URL for
+Access-Control-Max-Age, capped the way browsers do.
+
+Scenarios:
+    cross-origin, max-age 600   pages on GitHub Pages, Starlette's old default
+    cross-origin, max-age 7200  pages on GitHub Pages, CORS_MAX_AGE default
+    same-origin                 SERVE_FRONTEND=1, pages served by the API
+
+Usage (from backend/):
+    python benchmarks/roundtrips.py [--photos 8] [--rtt-ms 150]
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+TIMEOUT_SECONDS = 30
+ORIGIN = "https://example.github.io"
+
+# Longest preflight cache lifetime each browser honours, in seconds
+BROWSER_CAPS = {"Chrome": 7200, "Safari": 600}
+NO_MAX_AGE = 5  # Lifetime when the header is missing
+
+THINK_SECONDS = 90  # From page load to pressing Submit
+RETURN_SECONDS = 30 * 60  # Until the voter comes back to change a vote
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir: str, **env_vars) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR), **env_vars)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < TIMEOUT_SECONDS:
+        try:
+            with urllib.request.urlopen(f"{base}/api/categories", timeout=1):
+                return server, base
+        except OSError:
+            time.sleep(0.01)
+    server.terminate()
+    raise RuntimeError("Server did not answer in time")
+
+
+def _send(request: urllib.request.Request) -> Tuple[int, dict, bytes]:
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers, error.read()
+
+
+def seed_entries(base: str, count: int) -> None:
+    """Upload count entries with small generated photos"""
+    from PIL import Image
+
+    for i in range(count):
+        photo = io.BytesIO()
+        Image.new("RGB", (64, 64), (i * 30 % 256, 80, 160)).save(photo, "PNG")
+        boundary = uuid.uuid4().hex
+        parts = [
+            f'--{boundary}\r\nContent-Disposition: form-data; name="name"\r\n\r\nGuest {i}\r\n'.encode(),
+            f'--{boundary}\r\nContent-Disposition: form-data; name="costume_name"\r\n\r\nGhost {i}\r\n'.encode(),
+            f'--{boundary}\r\nContent-Disposition: form-data; name="photo"; filename="p{i}.png"\r\n'
+            f"Content-Type: image/png\r\n\r\n".encode() + photo.getvalue() + b"\r\n",
+            f"--{boundary}--\r\n".encode(),
+        ]
+        _send(urllib.request.Request(
+            f"{base}/api/entries",
+            data=b"".join(parts),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        ))
+
+
+class Browser:
+    """Counts the requests a browser makes, preflights and HTTP cache included"""
+
+    def __init__(self, base: str, cross_origin: bool, cap: int):
+        self.base = base
+        self.cross_origin = cross_origin
+        self.cap = cap
+        self.clock = 0.0
+        self.preflights = {}  # (method, url) -> expiry
+        self.etags = {}  # url -> ETag
+        self.immutable = set()  # urls cached for good
+        self.counts = {"preflight": 0, "api": 0, "static": 0}
+
+    def _preflight(self, method: str, url: str) -> None:
+        if self.preflights.get((method, url), -1) > self.clock:
+            return
+        self.counts["preflight"] += 1
+        _, headers, _ = _send(urllib.request.Request(url, method="OPTIONS", headers={
+            "Origin": ORIGIN,
+            "Access-Control-Request-Method": method,
+            "Access-Control-Request-Headers": "content-type,ngrok-skip-browser-warning",
+        }))
+        max_age = int(headers.get("Access-Control-Max-Age") or NO_MAX_AGE)
+        self.preflights[(method, url)] = self.clock + min(max_age, self.cap)
+
+    def api(self, path: str, method: str = "GET", body: bytes = None) -> None:
+        url = self.base + path
+        headers = {"ngrok-skip-browser-warning": "true", "Content-Type": "application/json"}
+        if self.cross_origin:
+            self._preflight(method, url)
+            headers["Origin"] = ORIGIN
+        self.counts["api"] += 1
+        _send(urllib.request.Request(url, method=method, data=body, headers=headers))
+
+    def page(self, name: str) -> None:
+        """Load a page and, in same-origin mode, the scripts and styles it references"""
+        if self.cross_origin:
+            return  # Served by GitHub Pages, not through the tunnel
+        html = self.static(name)
+        for asset in re.findall(r'(?:src|href)="((?:js|css)/[^"]+)"', html):
+            self.static(asset)
+        self.static("sw.js")  # The browser re-checks the service worker script on every navigation
+
+    def static(self, name: str) -> str:
+        url = f"{self.base}/{name}"
+        if url in self.immutable:
+            return ""
+        headers = {"Accept-Encoding": "gzip"}
+        if url in self.etags:
+            headers["If-None-Match"] = self.etags[url]
+        self.counts["static"] += 1
+        status, response_headers, body = _send(urllib.request.Request(url, headers=headers))
+        if "immutable" in response_headers.get("Cache-Control", ""):
+            self.immutable.add(url)
+        elif response_headers.get("ETag"):
+            self.etags[url] = response_headers["ETag"]
+        if status != 200:
+            return ""
+        if response_headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body.decode("utf-8")
+
+
+def visit(browser: Browser, voter_id: str, photo_urls) -> None:
+    """One vote page visit ending with a submitted ballot"""
+    browser.page("vote.html")
+    browser.api(f"/api/voters/{voter_id}/ballot")
+    browser.api("/api/categories")
+    browser.api("/api/entries")
+    browser.api("/api/mc-questions")
+    for url in photo_urls:
+        browser.api(url)
+    browser.clock += THINK_SECONDS
+    ballot = f'{{"ballot_id": "{uuid.uuid4().hex}", "voter_id": "{voter_id}", "votes": {{}}}}'
+    browser.api("/api/ballots", method="POST", body=ballot.encode())
+
+
+def run_scenario(base: str, cross_origin: bool, cap: int, photo_urls):
+    browser = Browser(base, cross_origin, cap)
+    voter_id = uuid.uuid4().hex
+    per_visit = []
+    for _ in range(2):
+        before = dict(browser.counts)
+        visit(browser, voter_id, photo_urls)
+        per_visit.append({kind: browser.counts[kind] - before[kind] for kind in before})
+        browser.clock += RETURN_SECONDS
+    return per_visit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photos", type=int, default=8, help="Photos scrolled into view per visit")
+    parser.add_argument("--rtt-ms", type=float, default=150, help="Tunnel round-trip time for the estimate")
+    args = parser.parse_args()
+
+    scenarios = [
+        ("cross-origin, max-age 600", {"CORS_MAX_AGE": "600"}, True),
+        ("cross-origin, max-age 7200", {"CORS_MAX_AGE": "7200"}, True),
+        ("same-origin", {"SERVE_FRONTEND": "1"}, False),
+    ]
+
+    print(f"{'scenario':<28} {'browser':<8} {'visit':<7} {'preflight':>9} {'api':>5} {'static':>6} "
+          f"{'total':>6} {'~ms':>7}")
+    with tempfile.TemporaryDirectory() as workdir:
+        photo_urls = None
+        for label, env_vars, cross_origin in scenarios:
+            server, base = start_server(workdir, **env_vars)
+            try:
+                if photo_urls is None:
+                    seed_entries(base, args.photos)
+                    with urllib.request.urlopen(f"{base}/api/entries") as response:
+                        photo_urls = [entry["photo_url"] for entry in json.load(response)][:args.photos]
+
+                caps = BROWSER_CAPS if cross_origin else {"any": 0}
+                for browser_name, cap in caps.items():
+                    for number, counts in enumerate(run_scenario(base, cross_origin, cap, photo_urls), 1):
+                        total = sum(counts.values())
+                        print(f"{label:<28} {browser_name:<8} {('first', 'return')[number - 1]:<7} "
+                              f"{counts['preflight']:>9} {counts['api']:>5} {counts['static']:>6} "
+                              f"{total:>6} {total * args.rtt_ms:>7.0f}")
+            finally:
+                server.terminate()
+                server.wait()
+
+    print("\nStatic requests in cross-origin mode go to GitHub Pages, not through the tunnel.")
+    print("~ms assumes every request is one sequential tunnel round-trip (an upper bound).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Entry search benchmark: query latency of the in-memory index at party scale
+
+Builds the search index over synthetic entries (random first/last names and
+costume names) and times typical queries: short and long prefixes, exact
+words, typos and multi-word searches, plus incremental adds and removes.
+
+Usage (from backend/):
+    python benchmarks/search.py [--entries 10000] [--repeat 200]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search import EntryIndex  # noqa: E402
+
+FIRST_NAMES = [
+    "alice", "bob", "carla", "dmitri", "elena", "farid", "greta", "hiro", "ines", "jamal",
+    "kira", "luca", "maya", "nora", "omar", "priya", "quinn", "rosa", "sven", "tariq",
+    "uma", "victor", "wendy", "xavier", "yara", "zoe", "josé", "zoë", "chloé", "björn",
+]
+LAST_NAMES = [
+    "smith", "nguyen", "garcia", "müller", "kowalski", "okafor", "tanaka", "rossi", "silva", "cohen",
+    "patel", "jensen", "dubois", "novak", "haddad", "kim", "oconnor", "schmidt", "costa", "larsen",
+]
+COSTUME_WORDS = [
+    "ghost", "ghostface", "vampire", "witch", "zombie", "mummy", "werewolf", "pumpkin", "skeleton",
+    "frankenstein", "bride", "pirate", "ninja", "robot", "alien", "dracula", "goblin", "banshee",
+    "scarecrow", "jester", "clown", "reaper", "grim", "princess", "knight", "dragon", "unicorn",
+    "spider", "bat", "cat", "black", "haunted", "headless", "horseman", "sexy", "evil", "tiny",
+]
+
+QUERIES = {
+    "short prefix": "gh",
+    "prefix": "vamp",
+    "exact word": "frankenstein",
+    "typo": "ghots",
+    "two typos": "frankinstien",
+    "name + costume": "maya witch",
+    "accented": "jose",
+    "no match": "xylophone",
+}
+
+
+def make_entry(rng: random.Random) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "name": f"{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()}",
+        "costume_name": " ".join(rng.choice(COSTUME_WORDS).title() for _ in range(rng.randint(1, 3))),
+        "photo_filename": "ab/cd.jpg",
+    }
+
+
+def time_ms(action, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(2024)
+    entries = [make_entry(rng) for _ in range(args.entries)]
+
+    index = EntryIndex()
+    started = time.perf_counter()
+    for entry in entries:
+        index.add(entry)
+    print(f"Indexed {len(index)} entries in {(time.perf_counter() - started) * 1000:.0f} ms\n")
+
+    print(f"{'query':<16} {'matches':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, query in QUERIES.items():
+        total, _ = index.search(query)
+        p50, p99 = time_ms(lambda: index.search(query), args.repeat)
+        print(f"{label:<16} {total:>8} {p50:>8.3f} {p99:>8.3f}")
+
+    extra = [make_entry(rng) for _ in range(args.repeat)]
+    pending = iter(extra)
+    p50, p99 = time_ms(lambda: index.add(next(pending)), len(extra))
+    print(f"\n{'add entry':<16} {'':>8} {p50:>8.3f} {p99:>8.3f}")
+    pending = iter(extra)
+    p50, p99 = time_ms(lambda: index.remove(next(pending)["id"]), len(extra))
+    print(f"{'remove entry':<16} {'':>8} {p50:>8.3f} {p99:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Startup benchmark: time from launching the server until it answers its first request
+
+Runs the backend in a scratch directory, once against a fresh database and
+then several times against the same (already initialized) database, which is
+what refresh.sh --soft and config tweaks do.
+
+Usage (from backend/):
+    python benchmarks/startup.py [--restarts 5]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+TIMEOUT_SECONDS = 30
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_request(workdir: str) -> float:
+    """Start the server and return seconds until GET /api/categories succeeds"""
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    url = f"http://127.0.0.1:{port}/api/categories"
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < TIMEOUT_SECONDS:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("Server did not answer in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--restarts", type=int, default=5, help="Warm restarts to measure")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cold = time_to_first_request(workdir)
+        warm = [time_to_first_request(workdir) for _ in range(args.restarts)]
+
+    print(f"Fresh database:  {cold * 1000:7.1f} ms")
+    print(f"Warm restart:    {statistics.median(warm) * 1000:7.1f} ms (median of {len(warm)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Admin grouped votes benchmark: GROUP BY over the votes table versus voter summaries
+
+Fills a scratch database with voters (one vote per category each), then
+times the GROUP BY query the admin page used to run on every refresh
+against a page of the maintained voter summaries, and what keeping the
+summaries up to date adds to each ballot.
+
+Usage (from backend/):
+    python benchmarks/voters.py [--voters 5000] [--page 50]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiosqlite  # noqa: E402
+
+import database  # noqa: E402
+import events  # noqa: E402
+
+GROUP_BY_QUERY = """
+    SELECT
+        voter_id,
+        GROUP_CONCAT(category, ', ') as categories,
+        COUNT(*) as vote_count,
+        MAX(CASE WHEN deleted = 1 THEN 1 ELSE 0 END) as has_deleted,
+        MIN(CASE WHEN deleted = 0 THEN 0 ELSE 1 END) as all_deleted
+    FROM votes
+    GROUP BY voter_id
+    ORDER BY MAX(created_at) DESC
+"""
+
+
+def summary(samples) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000
+    return f"p50 {p50:8.3f} ms  p99 {p99:8.3f} ms"
+
+
+async def timed(action):
+    started = time.perf_counter()
+    await action
+    return time.perf_counter() - started
+
+
+async def group_by() -> list:
+    async with aiosqlite.connect(events.current().db_path) as db:
+        async with db.execute(GROUP_BY_QUERY) as cursor:
+            return await cursor.fetchall()
+
+
+async def run(args) -> None:
+    await database.ensure_initialized()
+    entry_ids = [
+        await database.create_entry(f"Guest {i}", f"Costume {i}", f"ab/{uuid.uuid4().hex}.jpg")
+        for i in range(30)
+    ]
+    categories = [category["id"] for category in await database.get_categories()]
+    rng = random.Random(7)
+
+    def ballot(voter_id: str):
+        return database.submit_ballot(
+            ballot_id=uuid.uuid4().hex,
+            voter_id=voter_id,
+            votes={category: rng.choice(entry_ids) for category in categories},
+            mc_votes={},
+        )
+
+    voters = [f"voter-{i}" for i in range(args.voters)]
+    cold = [await timed(ballot(voter_id)) for voter_id in voters]
+
+    group_by_times = [await timed(group_by()) for _ in range(20)]
+    build = await timed(database.get_votes_grouped_by_voter_admin(0, args.page))
+    pages = [await timed(database.get_votes_grouped_by_voter_admin(0, args.page)) for _ in range(200)]
+    warm = [await timed(ballot(rng.choice(voters))) for _ in range(len(voters) // 5)]
+
+    print(f"\n{args.voters:,} voters, {args.voters * len(categories):,} votes")
+    print(f"  GROUP BY (old admin refresh)   {summary(group_by_times)}")
+    print(f"  summaries, first build         {build * 1000:8.1f} ms")
+    print(f"  summaries, page of {args.page:<11} {summary(pages)}")
+    print(f"  ballot, summaries not loaded   {summary(cold)}")
+    print(f"  ballot, summaries loaded       {summary(warm)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voters", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,15 @@ CATEGORIES = [
     {"id": "nontheme", "name": "Non-Theme: Off the Record", "order": 5},
 ]
 
+# How a category is voted on (a category's "mode"; "single" if left out):
+#   "single": everyone picks one entry, the most votes wins
+#   "ranked": everyone ranks up to RANKED_MAX_CHOICES entries, counted by instant runoff
+#   "borda":  ranked the same way; a first choice earns RANKED_MAX_CHOICES points,
+#             a second one point less, and so on, and the most points wins
+# e.g. {"id": "couples", "name": "...", "order": 3, "mode": "ranked"}
+VOTING_MODES = ("single", "ranked", "borda")
+RANKED_MAX_CHOICES = 5
+
 # Multiple choice voting questions (not tied to entries)
 MULTIPLE_CHOICE_QUESTIONS = [
     {
@@ -37,6 +46,11 @@ RESULTS_PASSWORD = os.getenv("RESULTS_PASSWORD", "spooky2025")
 # Admin password - CHANGE THIS!
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin2025")
 
+# Secret for signing admin/results session tokens
+# (if unset, a random one is generated and sessions end when the server restarts)
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 12 * 60 * 60))
+
 # Footer text - displayed on all pages
 FOOTER_TEXT = os.getenv("FOOTER_TEXT", "")
 
@@ -50,10 +64,70 @@ HEADER_SUBTEXT = os.getenv("HEADER_SUBTEXT", "Join the fun! Submit your costume
 UPLOAD_DIR = "uploads"
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+DUPLICATE_MAX_DISTANCE = 10  # Photos whose perceptual hashes differ in at most this many of 64 bits look alike
 
 # Database
 DATABASE_PATH = "halloween.db"
 
+# Vote engine: "sqlite" writes every vote to the database as it comes in; "memory"
+# keeps votes and tallies in memory, appends each change to a journal file next to
+# the database (halloween.db.journal.N) and copies the changes into the database
+# every CHECKPOINT_SECONDS
+VOTE_ENGINE = os.getenv("VOTE_ENGINE", "sqlite")
+CHECKPOINT_SECONDS = float(os.getenv("CHECKPOINT_SECONDS", 5))
+# Flush every journal write to disk (survives power loss, not only a crashed server)
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "").lower() in ("1", "true", "yes")
+
+# Events - several parties can run side by side, each with its own database
+DEFAULT_EVENT_ID = "default"  # Served at /api/... using the settings above
+EVENTS_DATABASE_PATH = "events.db"  # Registry of the other events
+EVENTS_DIR = "events"  # Per-event databases and uploads, served at /api/events/{id}/...
+EVENT_CACHE_SIZE = 8  # Event handles kept loaded (least recently used are evicted)
+
+# Online backups and resets
+BACKUP_DIR = "backups"
+ARCHIVE_DIR = "archive"  # Uploads are moved here on reset instead of deleted
+BACKUP_PAGES_PER_STEP = 64  # Pages copied per backup step (progress is reported per step)
+BACKUP_STEP_SLEEP = 0.05  # Seconds to wait before retrying a step if the database is busy
+
+# Background janitor: tidies uploads and the database while the server is idle
+JANITOR_ENABLED = os.getenv("JANITOR_ENABLED", "1").lower() in ("1", "true", "yes")
+JANITOR_TICK_SECONDS = 1.0  # At most one small step per tick
+JANITOR_IDLE_SECONDS = 2.0  # Steps only run once no request has come in for this long
+JANITOR_PASS_SECONDS = 15 * 60  # Pause between full passes over an event
+JANITOR_BATCH_SIZE = 100  # Upload files checked, or entries purged, per step
+JANITOR_GRACE_SECONDS = 60 * 60  # Younger files are never orphans (their entry may still be saving)
+JANITOR_VACUUM_PAGES = 64  # Free database pages handed back per step
+# Permanently remove entries (and photos only they use) this many days after
+# they were deleted; 0 keeps deleted entries forever
+JANITOR_PURGE_AFTER_DAYS = float(os.getenv("JANITOR_PURGE_AFTER_DAYS", 0))
+QUARANTINE_DIR = "quarantine"  # Orphaned uploads are moved here, next to the uploads folder
+
+# Admin profiling (default event's admins, see profiling.py)
+# Requests slower than this are kept in the slow-request log with a timing
+# breakdown and the query plans of their slowest statements; 0 turns it off
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 500))
+SLOW_REQUEST_LOG_SIZE = 100  # Slow requests kept (oldest are dropped first)
+SLOW_REQUEST_PLANS = 5  # Statements per slow request whose query plan is recorded
+PROFILER_INTERVAL_SECONDS = 0.005  # Sampling profiler: time between stack samples
+PROFILER_MAX_SECONDS = 120  # Longest profile that can be recorded
+PROFILER_KEEP = 5  # Finished profiles kept for download
+
+# Idempotency-Key handling for write requests (retried requests get the first response replayed)
+IDEMPOTENCY_TTL_SECONDS = 6 * 60 * 60  # How long a key is remembered
+IDEMPOTENCY_MAX_KEYS = 10000  # Keys remembered per event (oldest are forgotten first)
+IDEMPOTENCY_MAX_BODY_BYTES = 64 * 1024  # Larger responses are not stored for replay
+
+# Same-origin mode: also serve frontend/ from this server (open http://localhost:8000/
+# or the ngrok URL instead of GitHub Pages), so pages and API share one origin and
+# API calls need no CORS preflight
+SERVE_FRONTEND = os.getenv("SERVE_FRONTEND", "").lower() in ("1", "true", "yes")
+FRONTEND_DIR = Path(__file__).parent.parent / "frontend"
+
+# How long browsers may reuse a CORS preflight answer in cross-origin mode
+# (browsers cap it: Chrome at 2 hours, Safari at 10 minutes)
+CORS_MAX_AGE = int(os.getenv("CORS_MAX_AGE", 2 * 60 * 60))
+
 # CORS settings - update with your GitHub Pages URL
 ALLOWED_ORIGINS = [
     "http://localhost:3000",
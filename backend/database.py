@@ -1,298 +1,1758 @@
 """
 Database setup and query functions
 """
+import hashlib
+import json
 import sqlite3
 import aiosqlite
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, AsyncIterator, Set, Tuple
 from datetime import datetime
 import uuid
-from config import DATABASE_PATH, CATEGORIES, MULTIPLE_CHOICE_QUESTIONS
-
+import asyncio
+from bisect import bisect_left, insort
+from pathlib import Path
+from config import (
+    CATEGORIES,
+    MULTIPLE_CHOICE_QUESTIONS,
+    VOTING_MODES,
+    RANKED_MAX_CHOICES,
+    VOTE_ENGINE,
+    CHECKPOINT_SECONDS,
+    JOURNAL_FSYNC,
+)
+import events
+import storage
+import phash
+import placeholders
+import profiling
+import ranked
+import search
+import votestore
+
+
+def _connect():
+    """Open a connection to the current event's database (timed for the slow-request log)"""
+    return profiling.connect(events.current().db_path)
+
+
+class _PendingIndex:
+    """Placeholder for an in-memory index that is still being built"""
+
+    def __init__(self):
+        self.updates = []
+        self.ready = asyncio.get_running_loop().create_future()
+
+
+async def _get_index(name: str, build):
+    """Get a per-event in-memory index, building it from the database on first use
+
+    Changes committed while the index is being built are queued through
+    _update_index() and replayed onto it, so it never misses one.
+    """
+    caches = events.current().caches
+    index = caches.get(name)
+
+    if isinstance(index, _PendingIndex):
+        built = await index.ready
+        return built if built is not None else await _get_index(name, build)
+    if index is not None:
+        return index
+
+    pending = caches[name] = _PendingIndex()
+    try:
+        index = await build()
+        for update in pending.updates:
+            update(index)
+    except BaseException:
+        if caches.get(name) is pending:
+            del caches[name]
+        pending.ready.set_result(None)
+        raise
+
+    # A reset may have dropped the caches while we were building
+    if caches.get(name) is pending:
+        caches[name] = index
+    pending.ready.set_result(index)
+    return index
+
+
+def _update_index(name: str, update) -> None:
+    """Apply an idempotent change to a per-event index if it is loaded"""
+    index = events.current().caches.get(name)
+    if isinstance(index, _PendingIndex):
+        index.updates.append(update)
+    elif index is not None:
+        update(index)
+
+
+def invalidate_caches() -> int:
+    """Drop the current event's in-memory caches, returning how many were dropped"""
+    caches = events.current().caches
+    count = len(caches)
+    caches.clear()
+    return count
+
+
+# One row per voter and category (or question). A changed vote updates its row
+# in place (see _upsert_votes), so its id, created_at and deleted flag survive.
+VOTES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS votes (
+        id TEXT PRIMARY KEY,
+        voter_id TEXT,
+        category TEXT NOT NULL,
+        entry_id TEXT NOT NULL,
+        deleted BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        change_count INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (entry_id) REFERENCES entries(id),
+        UNIQUE(voter_id, category)
+    )
+"""
 
-async def init_db():
-    """Initialize database with required tables"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # Create entries table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS entries (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                costume_name TEXT NOT NULL,
-                photo_filename TEXT NOT NULL,
-                deleted BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+MC_VOTES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS mc_votes (
+        id TEXT PRIMARY KEY,
+        voter_id TEXT,
+        question_id TEXT NOT NULL,
+        option_id TEXT NOT NULL,
+        deleted BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        change_count INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (question_id) REFERENCES mc_questions(id),
+        FOREIGN KEY (option_id) REFERENCES mc_options(id),
+        UNIQUE(voter_id, question_id)
+    )
+"""
 
-        # Create votes table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS votes (
-                id TEXT PRIMARY KEY,
-                voter_id TEXT,
-                category TEXT NOT NULL,
-                entry_id TEXT NOT NULL,
-                deleted BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (entry_id) REFERENCES entries(id),
-                UNIQUE(voter_id, category) ON CONFLICT REPLACE
-            )
-        """)
+# Ranked ballots for categories voted on by ranking ("ranked" or "borda" mode):
+# one row per voter and category like votes, holding the entry IDs in order of
+# preference, comma separated. Identical rankings are identical strings, so the
+# live tallies count ballots per distinct ranking.
+RANKINGS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rankings (
+        id TEXT PRIMARY KEY,
+        voter_id TEXT,
+        category TEXT NOT NULL,
+        ranking TEXT NOT NULL,
+        deleted BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        change_count INTEGER NOT NULL DEFAULT 0,
+        UNIQUE(voter_id, category)
+    )
+"""
 
-        # Create categories table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS categories (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                display_order INTEGER
-            )
+# Table definitions, applied in order. Editing this list (or SCHEMA_COLUMNS)
+# changes the schema fingerprint, so existing databases re-run it on startup.
+SCHEMA = [
+    # Entries
+    """
+    CREATE TABLE IF NOT EXISTS entries (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        costume_name TEXT NOT NULL,
+        photo_filename TEXT NOT NULL,
+        photo_hash TEXT,
+        deleted BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Blobs (one row per distinct photo, shared by entries)
+    """
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        phash INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Votes
+    VOTES_SCHEMA,
+    # Categories
+    """
+    CREATE TABLE IF NOT EXISTS categories (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        display_order INTEGER
+    )
+    """,
+    # Multiple choice questions
+    """
+    CREATE TABLE IF NOT EXISTS mc_questions (
+        id TEXT PRIMARY KEY,
+        question TEXT NOT NULL,
+        display_order INTEGER
+    )
+    """,
+    # Multiple choice options
+    """
+    CREATE TABLE IF NOT EXISTS mc_options (
+        id TEXT PRIMARY KEY,
+        question_id TEXT NOT NULL,
+        option_text TEXT NOT NULL,
+        FOREIGN KEY (question_id) REFERENCES mc_questions(id)
+    )
+    """,
+    # Multiple choice votes
+    MC_VOTES_SCHEMA,
+    # Ranked costume votes
+    RANKINGS_SCHEMA,
+    # Ballots applied so far, keyed by the client's ballot ID so replays are ignored
+    """
+    CREATE TABLE IF NOT EXISTS ballots (
+        id TEXT PRIMARY KEY,
+        voter_id TEXT,
+        vote_count INTEGER NOT NULL,
+        mc_vote_count INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Append-only log of every change to entries and votes (see _audit)
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        type TEXT NOT NULL,
+        subject_id TEXT NOT NULL,
+        data TEXT
+    )
+    """,
+]
+
+# Columns added after their table was first released: (table, column, definition)
+SCHEMA_COLUMNS = [
+    ("entries", "photo_hash", "TEXT"),
+    ("entries", "deleted_at", "TIMESTAMP"),
+    ("blobs", "phash", "INTEGER"),
+    ("blobs", "placeholder", "TEXT"),
+    ("categories", "retired", "BOOLEAN DEFAULT 0"),
+    ("categories", "voting_mode", "TEXT NOT NULL DEFAULT 'single'"),
+    ("mc_questions", "retired", "BOOLEAN DEFAULT 0"),
+    ("mc_options", "retired", "BOOLEAN DEFAULT 0"),
+]
+
+
+# Tables whose old definition used UNIQUE(...) ON CONFLICT REPLACE, which can
+# only be dropped by rebuilding the table: (table, new definition, columns kept)
+REBUILT_TABLES = [
+    ("votes", VOTES_SCHEMA, "id, voter_id, category, entry_id, deleted, created_at"),
+    ("mc_votes", MC_VOTES_SCHEMA, "id, voter_id, question_id, option_id, deleted, created_at"),
+]
+
+
+def _fingerprint(*parts) -> str:
+    """Stable digest of schema or seed definitions"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+async def _get_meta(db, key: str) -> Optional[str]:
+    """Read a value from the meta table, or None if it (or the table) is missing"""
+    try:
+        async with db.execute("SELECT value FROM meta WHERE key = ?", (key,)) as cursor:
+            row = await cursor.fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+async def _set_meta(db, key: str, value: str):
+    """Write a value to the meta table"""
+    await db.execute("""
+        INSERT INTO meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (key, value))
+
+
+async def _ensure_column(db, table: str, column: str, definition: str):
+    """Add a column to an existing table if an older schema lacks it"""
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    if column not in columns:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+async def _rebuild_replace_tables(db):
+    """Move vote tables created with ON CONFLICT REPLACE to their current definition"""
+    for table, schema, columns in REBUILT_TABLES:
+        async with db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)) as cursor:
+            row = await cursor.fetchone()
+        if not row or "ON CONFLICT REPLACE" not in row[0].upper():
+            continue
+
+        await db.execute(f"ALTER TABLE {table} RENAME TO {table}_replace_old")
+        await db.execute(schema)
+        await db.execute(f"""
+            INSERT INTO {table} ({columns}, updated_at)
+            SELECT {columns}, created_at FROM {table}_replace_old
         """)
+        await db.execute(f"DROP TABLE {table}_replace_old")
 
-        # Create multiple choice questions table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS mc_questions (
-                id TEXT PRIMARY KEY,
-                question TEXT NOT NULL,
-                display_order INTEGER
-            )
-        """)
 
-        # Create multiple choice options table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS mc_options (
-                id TEXT PRIMARY KEY,
-                question_id TEXT NOT NULL,
-                option_text TEXT NOT NULL,
-                FOREIGN KEY (question_id) REFERENCES mc_questions(id)
-            )
-        """)
+async def init_db(seed_defaults: bool = True):
+    """Initialize the current event's database with required tables
 
-        # Create multiple choice votes table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS mc_votes (
-                id TEXT PRIMARY KEY,
-                voter_id TEXT,
-                question_id TEXT NOT NULL,
-                option_id TEXT NOT NULL,
-                deleted BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (question_id) REFERENCES mc_questions(id),
-                FOREIGN KEY (option_id) REFERENCES mc_options(id),
-                UNIQUE(voter_id, question_id) ON CONFLICT REPLACE
-            )
-        """)
+    The default event is seeded from the categories and questions in config;
+    other events get theirs from seed_catalog() when they are created. Both
+    steps are skipped when the fingerprint stored by the last run matches.
+    """
+    fingerprint = _fingerprint(SCHEMA, SCHEMA_COLUMNS)
 
-        await db.commit()
+    async with _connect() as db:
+        if await _get_meta(db, "schema") != fingerprint:
+            # Lets the janitor hand free pages back a few at a time (only takes
+            # effect on a new database; janitor.py converts older ones)
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL lets readers (e.g. exports) hold a snapshot without blocking voters
+            await db.execute("PRAGMA journal_mode=WAL")
 
-        # Insert default categories if not exist
-        for cat in CATEGORIES:
+            # One transaction (and one fsync) for the whole schema
+            await db.execute("BEGIN")
             await db.execute("""
-                INSERT OR IGNORE INTO categories (id, name, display_order)
-                VALUES (?, ?, ?)
-            """, (cat["id"], cat["name"], cat["order"]))
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            for statement in SCHEMA:
+                await db.execute(statement)
+            await _rebuild_replace_tables(db)
+            for table, column, definition in SCHEMA_COLUMNS:
+                await _ensure_column(db, table, column, definition)
+            await _backfill_audit_log(db)
+            await _backfill_deleted_at(db)
+            await _set_meta(db, "schema", fingerprint)
+            await db.commit()
+
+    if seed_defaults:
+        await seed_catalog(CATEGORIES, MULTIPLE_CHOICE_QUESTIONS)
+
+
+async def ensure_initialized():
+    """Initialize the current event's database once per process"""
+    event = events.current()
+    if event.initialized:
+        return
+
+    async with event.init_lock:
+        if not event.initialized:
+            await init_db(seed_defaults=event.is_default)
+            await migrate_flat_uploads()
+            event.initialized = True
+
+
+async def seed_catalog(categories: List[Dict], questions: List[Dict]):
+    """Insert categories and multiple choice questions if they don't exist
+
+    Skipped when the same definitions were already seeded.
+    """
+    for cat in categories:
+        _check_voting_mode(cat.get("mode") or "single")
+    fingerprint = _fingerprint(categories, questions)
+
+    async with _connect() as db:
+        if await _get_meta(db, "seed") == fingerprint:
+            return
+
+        await db.executemany("""
+            INSERT OR IGNORE INTO categories (id, name, display_order, voting_mode)
+            VALUES (?, ?, ?, ?)
+        """, [(cat["id"], cat["name"], cat["order"], cat.get("mode") or "single") for cat in categories])
+
+        await db.executemany("""
+            INSERT OR IGNORE INTO mc_questions (id, question, display_order)
+            VALUES (?, ?, ?)
+        """, [(question["id"], question["question"], question["order"]) for question in questions])
+
+        await db.executemany("""
+            INSERT OR IGNORE INTO mc_options (id, question_id, option_text)
+            VALUES (?, ?, ?)
+        """, [
+            (option["id"], question["id"], option["text"])
+            for question in questions
+            for option in question["options"]
+        ])
+
+        await _set_meta(db, "seed", fingerprint)
+        await db.commit()
 
-        # Insert multiple choice questions and options
-        for question in MULTIPLE_CHOICE_QUESTIONS:
-            await db.execute("""
-                INSERT OR IGNORE INTO mc_questions (id, question, display_order)
-                VALUES (?, ?, ?)
-            """, (question["id"], question["question"], question["order"]))
+    events.current().caches.pop("catalog", None)
 
-            for option in question["options"]:
-                await db.execute("""
-                    INSERT OR IGNORE INTO mc_options (id, question_id, option_text)
-                    VALUES (?, ?, ?)
-                """, (option["id"], question["id"], option["text"]))
 
-        await db.commit()
+async def create_entry(
+    name: str,
+    costume_name: str,
+    photo_filename: str,
+    photo_hash: Optional[str] = None,
+    photo_size: int = 0,
+    photo_phash: Optional[int] = None,
+    photo_placeholder: Optional[str] = None,
+) -> str:
+    """Create a new entry and return its ID
 
-
-async def create_entry(name: str, costume_name: str, photo_filename: str) -> str:
-    """Create a new entry and return its ID"""
+    When photo_hash is given, the entry takes a reference on that blob.
+    """
     entry_id = str(uuid.uuid4())
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with _connect() as db:
         await db.execute("""
-            INSERT INTO entries (id, name, costume_name, photo_filename)
-            VALUES (?, ?, ?, ?)
-        """, (entry_id, name, costume_name, photo_filename))
+            INSERT INTO entries (id, name, costume_name, photo_filename, photo_hash)
+            VALUES (?, ?, ?, ?, ?)
+        """, (entry_id, name, costume_name, photo_filename, photo_hash))
+        await _audit(db, [("entry_created", entry_id, {
+            "name": name,
+            "costume_name": costume_name,
+            "photo_filename": photo_filename,
+            "photo_hash": photo_hash,
+        })])
+
+        if photo_hash:
+            await _add_blob_ref(db, photo_hash, photo_filename, photo_size, photo_phash, photo_placeholder)
+
         await db.commit()
 
+    if photo_phash is not None:
+        _update_index("phash", lambda tree: tree.add(entry_id, photo_phash))
+    entry = {"id": entry_id, "name": name, "costume_name": costume_name, "photo_filename": photo_filename}
+    _update_index("search", lambda index: index.add(entry))
+
     return entry_id
 
 
-async def get_all_entries() -> List[Dict]:
-    """Get all entries (excluding deleted)"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+async def _add_blob_ref(
+    db,
+    photo_hash: str,
+    photo_filename: str,
+    photo_size: int,
+    photo_phash: Optional[int] = None,
+    photo_placeholder: Optional[str] = None,
+):
+    """Take a reference on a blob, registering it on first use"""
+    stored_phash = phash.to_db(photo_phash) if photo_phash is not None else None
+    await db.execute("""
+        INSERT INTO blobs (hash, filename, size, ref_count, phash, placeholder)
+        VALUES (?, ?, ?, 1, ?, ?)
+        ON CONFLICT(hash) DO UPDATE SET
+            ref_count = ref_count + 1,
+            phash = COALESCE(phash, excluded.phash),
+            placeholder = COALESCE(placeholder, excluded.placeholder)
+    """, (photo_hash, photo_filename, photo_size, stored_phash, photo_placeholder))
+
+
+async def get_blob(photo_hash: str) -> Optional[Dict]:
+    """Get a stored blob by content hash"""
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute("""
-            SELECT id, name, costume_name, photo_filename, created_at
+            SELECT hash, filename, size, ref_count, phash, placeholder
+            FROM blobs
+            WHERE hash = ?
+        """, (photo_hash,)) as cursor:
+            row = await cursor.fetchone()
+            if not row:
+                return None
+
+            blob = dict(row)
+            if blob["phash"] is not None:
+                blob["phash"] = phash.from_db(blob["phash"])
+            return blob
+
+
+async def migrate_flat_uploads() -> int:
+    """Move photos stored under legacy flat uuid names into content-addressed storage
+
+    Returns the number of entries migrated. Entries whose file is missing are
+    left untouched.
+    """
+    upload_dir = events.current().upload_dir
+
+    async with _connect() as db:
+        async with db.execute("""
+            SELECT id, photo_filename
             FROM entries
-            WHERE deleted = 0
-            ORDER BY created_at DESC
+            WHERE photo_hash IS NULL
+        """) as cursor:
+            legacy = await cursor.fetchall()
+
+        migrated = []
+        for entry_id, old_filename in legacy:
+            if not (Path(upload_dir) / old_filename).is_file():
+                continue
+
+            digest, filename, size = await asyncio.to_thread(storage.adopt_file, upload_dir, old_filename)
+            await db.execute("""
+                UPDATE entries SET photo_filename = ?, photo_hash = ? WHERE id = ?
+            """, (filename, digest, entry_id))
+            await _add_blob_ref(db, digest, filename, size)
+            await _audit(db, [("entry_photo_moved", entry_id, {"photo_filename": filename, "photo_hash": digest})])
+            migrated.append(old_filename)
+
+        await db.commit()
+
+    # Only drop the legacy names once the entries point at the new ones
+    await asyncio.to_thread(storage.remove_files, upload_dir, migrated)
+    return len(migrated)
+
+
+async def get_all_entries() -> List[Dict]:
+    """Get all entries (excluding deleted), with their photo's placeholder"""
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute("""
+            SELECT e.id, e.name, e.costume_name, e.photo_filename, e.created_at, b.placeholder
+            FROM entries e
+            LEFT JOIN blobs b ON b.hash = e.photo_hash
+            WHERE e.deleted = 0
+            ORDER BY e.created_at DESC
         """) as cursor:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
 
-async def create_vote(category: str, entry_id: str, voter_id: Optional[str] = None) -> str:
-    """Create a vote and return its ID"""
-    vote_id = str(uuid.uuid4())
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+async def create_vote(category: str, entry_id: str, voter_id: Optional[str] = None) -> Dict:
+    """Cast or change a vote, returning {"vote_id", "status"}
+
+    status is "created", "changed" or "unchanged". A changed vote keeps its
+    row (id, created_at, and a soft delete by an admin).
+    """
+    # Check if category exists and is open for voting
+    catalog = await get_catalog()
+    if category not in catalog.category_ids:
+        raise ValueError("Category not found")
+    if category in catalog.ranked_category_ids:
+        raise ValueError("Category is voted on by ranking; submit a ballot with rankings")
+
+    engine = await _get_engine()
+    if engine:
+        await _check_entries(engine, [entry_id])
+        async with engine.lock:
+            outcome, operation = _engine_votes(engine, "votes", voter_id, {category: entry_id})
+            _engine_commit(engine, operation)
+        return outcome[category]
+
+    async with _connect() as db:
         # Check if entry exists
         async with db.execute("SELECT id FROM entries WHERE id = ?", (entry_id,)) as cursor:
             if not await cursor.fetchone():
                 raise ValueError("Entry not found")
 
-        # Check if category exists
-        async with db.execute("SELECT id FROM categories WHERE id = ?", (category,)) as cursor:
-            if not await cursor.fetchone():
-                raise ValueError("Category not found")
-
-        # Insert vote (will replace if voter_id+category already exists)
-        await db.execute("""
-            INSERT INTO votes (id, voter_id, category, entry_id)
-            VALUES (?, ?, ?, ?)
-        """, (vote_id, voter_id, category, entry_id))
+        await db.execute("BEGIN IMMEDIATE")
+        outcome, committed = await _upsert_votes(db, "votes", voter_id, {category: entry_id})
         await db.commit()
 
-    return vote_id
+    committed()
+    return outcome[category]
 
 
-async def get_results() -> Dict[str, List[Dict]]:
-    """Get vote results grouped by category"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def get_results() -> Dict[str, Dict]:
+    """Get vote results by category, as {"mode", "results", "rounds"}
 
-        results = {}
+    Single-vote categories are ordered by votes. Ranked categories are
+    counted by instant runoff: results follow the finishing order, vote_count
+    is an entry's votes in the last round it took part in, and rounds holds
+    every round. Borda categories are ordered by points, with vote_count
+    counting first choices.
+    """
+    catalog = await get_catalog()
+    tallies = await _get_tallies("votes")
+    rankings = await _get_tallies("rankings") if catalog.ranked_category_ids else None
 
-        for category in CATEGORIES:
-            async with db.execute("""
-                SELECT
-                    e.id as entry_id,
-                    e.name,
-                    e.costume_name,
-                    e.photo_filename,
-                    COUNT(v.id) as vote_count
-                FROM entries e
-                LEFT JOIN votes v ON e.id = v.entry_id AND v.category = ? AND v.deleted = 0
-                WHERE e.deleted = 0
-                GROUP BY e.id
-                ORDER BY vote_count DESC, e.name ASC
-            """, (category["id"],)) as cursor:
-                rows = await cursor.fetchall()
-                results[category["id"]] = [dict(row) for row in rows]
-
-        return results
-
-
-async def get_categories() -> List[Dict]:
-    """Get all categories"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute("""
-            SELECT id, name, display_order
-            FROM categories
-            ORDER BY display_order
+            SELECT id, name, costume_name, photo_filename
+            FROM entries
+            WHERE deleted = 0
         """) as cursor:
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+            entries = [dict(row) for row in await cursor.fetchall()]
+
+    results = {}
+    for category in catalog.categories:
+        mode = category["voting_mode"]
+        if mode != "single":
+            results[category["id"]] = _ranked_results(rankings, category["id"], mode, entries)
+            continue
+
+        rows = [
+            _result_row(entry, tallies.count(category["id"], entry["id"]))
+            for entry in entries
+        ]
+        rows.sort(key=lambda row: (-row["vote_count"], row["name"]))
+        results[category["id"]] = {"mode": mode, "results": rows, "rounds": []}
+
+    return results
+
+
+def _result_row(entry: Dict, vote_count: int) -> Dict:
+    return {
+        "entry_id": entry["id"],
+        "name": entry["name"],
+        "costume_name": entry["costume_name"],
+        "photo_filename": entry["photo_filename"],
+        "vote_count": vote_count,
+    }
+
+
+def _ranked_results(tallies: "_Tallies", category_id: str, mode: str, entries: List[Dict]) -> Dict:
+    """Count a ranked or Borda category from its tallies of distinct rankings
+
+    The count is kept until a ranking in the category changes (the tallies'
+    version for it moves on), the mode changes or an entry is added or deleted.
+    """
+    cache = events.current().caches.setdefault("ranked_results", {})
+    key = (tallies, tallies.version(category_id), mode, tuple(entry["id"] for entry in entries))
+    cached = cache.get(category_id)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    groups = {
+        tuple(_split_ranking(ranking)): ballots
+        for ranking, ballots in tallies.groups(category_id).items()
+    }
+    result = _count_ranked(groups, mode, entries)
+    cache[category_id] = (key, result)
+    return result
+
+
+def _count_ranked(groups: ranked.Groups, mode: str, entries: List[Dict]) -> Dict:
+    """Count a ranked or Borda category's ballots, grouped by distinct ranking (see get_results)"""
+    by_id = {entry["id"]: entry for entry in entries}
+
+    if mode == "ranked":
+        count = ranked.instant_runoff(groups, by_id)
+        rows = [_result_row(by_id[entry_id], votes) for entry_id, votes in count["finish"]]
+        return {"mode": mode, "results": rows, "rounds": count["rounds"]}
+
+    points = ranked.borda(groups, by_id, RANKED_MAX_CHOICES)
+    rows = [
+        {**_result_row(entry, points[entry["id"]][1]), "points": points[entry["id"]][0]}
+        for entry in entries
+    ]
+    rows.sort(key=lambda row: (-row["points"], -row["vote_count"], row["name"]))
+    return {"mode": mode, "results": rows, "rounds": []}
+
+
+async def get_categories() -> List[Dict]:
+    """Get all categories open for voting"""
+    catalog = await get_catalog()
+    return list(catalog.categories)
 
 
 async def get_mc_questions() -> List[Dict]:
-    """Get all multiple choice questions with their options"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    """Get all multiple choice questions open for voting, with their options"""
+    catalog = await get_catalog()
+    return list(catalog.questions)
+
+
+async def create_mc_vote(question_id: str, option_id: str, voter_id: Optional[str] = None) -> Dict:
+    """Cast or change a multiple choice vote, returning {"vote_id", "status"} like create_vote()"""
+    # Check if question exists and the option belongs to it
+    catalog = await get_catalog()
+    if question_id not in catalog.question_ids:
+        raise ValueError("Question not found")
+    if (question_id, option_id) not in catalog.option_keys:
+        raise ValueError("Option not found or does not belong to this question")
+
+    engine = await _get_engine()
+    if engine:
+        async with engine.lock:
+            outcome, operation = _engine_votes(engine, "mc_votes", voter_id, {question_id: option_id})
+            _engine_commit(engine, operation)
+        return outcome[question_id]
+
+    async with _connect() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        outcome, committed = await _upsert_votes(db, "mc_votes", voter_id, {question_id: option_id})
+        await db.commit()
 
-        questions = []
-        async with db.execute("""
-            SELECT id, question, display_order
-            FROM mc_questions
-            ORDER BY display_order
+    committed()
+    return outcome[question_id]
+
+
+def _check_rankings(catalog: "Catalog", rankings: Dict[str, List[str]]) -> Dict[str, str]:
+    """Validate rankings (category -> entry IDs, first choice first), returning them as stored choices"""
+    choices = {}
+    for category, ranking in rankings.items():
+        if category not in catalog.ranked_category_ids:
+            raise ValueError(f"Category not found or not voted on by ranking: {category}")
+        if not ranking:
+            raise ValueError(f"Ranking is empty: {category}")
+        if len(ranking) > RANKED_MAX_CHOICES:
+            raise ValueError(f"Rank at most {RANKED_MAX_CHOICES} entries: {category}")
+        if len(set(ranking)) != len(ranking):
+            raise ValueError(f"Ranking lists an entry twice: {category}")
+        choices[category] = RANKING_SEPARATOR.join(ranking)
+    return choices
+
+
+def _split_ranking(ranking: str) -> List[str]:
+    return ranking.split(RANKING_SEPARATOR)
+
+
+async def submit_ballot(
+    ballot_id: str,
+    voter_id: Optional[str],
+    votes: Dict[str, str],
+    mc_votes: Dict[str, str],
+    rankings: Optional[Dict[str, List[str]]] = None,
+) -> Dict:
+    """Apply a whole ballot (category -> entry, question -> option, category -> ranked entries) at once
+
+    The ballot ID is recorded in the same transaction as the votes, so a
+    ballot that is sent again (retries, offline replays) is recognised by a
+    primary key lookup and changes nothing. Rankings count as votes.
+    """
+    catalog = await get_catalog()
+    for category in votes:
+        if category not in catalog.category_ids:
+            raise ValueError(f"Category not found: {category}")
+        if category in catalog.ranked_category_ids:
+            raise ValueError(f"Category is voted on by ranking: {category}")
+    for question_id, option_id in mc_votes.items():
+        if (question_id, option_id) not in catalog.option_keys:
+            raise ValueError(f"Option not found for question: {question_id}")
+    ranking_choices = _check_rankings(catalog, rankings or {})
+    entry_ids = set(votes.values()).union(*(rankings or {}).values())
+    vote_count = len(votes) + len(ranking_choices)
+
+    engine = await _get_engine()
+    if engine:
+        return await _engine_submit_ballot(engine, ballot_id, voter_id, votes, mc_votes, ranking_choices, entry_ids)
+
+    async with _connect() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        cursor = await db.execute("""
+            INSERT OR IGNORE INTO ballots (id, voter_id, vote_count, mc_vote_count)
+            VALUES (?, ?, ?, ?)
+        """, (ballot_id, voter_id, vote_count, len(mc_votes)))
+
+        if cursor.rowcount == 0:
+            async with db.execute("""
+                SELECT vote_count, mc_vote_count FROM ballots WHERE id = ?
+            """, (ballot_id,)) as cursor:
+                vote_count, mc_vote_count = await cursor.fetchone()
+            return {"ballot_id": ballot_id, "votes": vote_count, "mc_votes": mc_vote_count, "replayed": True}
+
+        if entry_ids:
+            marks = ", ".join("?" * len(entry_ids))
+            async with db.execute(f"SELECT id FROM entries WHERE id IN ({marks})", list(entry_ids)) as cursor:
+                found = {row[0] for row in await cursor.fetchall()}
+            if len(found) != len(entry_ids):
+                raise ValueError("Entry not found")
+
+        # Each choice updates the voter's earlier vote in its category, if any
+        _, votes_committed = await _upsert_votes(db, "votes", voter_id, votes, ballot_id=ballot_id)
+        _, mc_votes_committed = await _upsert_votes(db, "mc_votes", voter_id, mc_votes, ballot_id=ballot_id)
+        _, rankings_committed = await _upsert_votes(db, "rankings", voter_id, ranking_choices, ballot_id=ballot_id)
+        await db.commit()
+
+    votes_committed()
+    mc_votes_committed()
+    rankings_committed()
+    return {"ballot_id": ballot_id, "votes": vote_count, "mc_votes": len(mc_votes), "replayed": False}
+
+
+async def get_voter_ballot(voter_id: str) -> Dict[str, Dict]:
+    """Get a voter's current choices (category -> entry, question -> option, category -> ranked entries)
+
+    Served by the UNIQUE(voter_id, ...) indexes, so it touches only this
+    voter's rows. Soft-deleted votes and retired categories or questions are
+    left out.
+    """
+    catalog = await get_catalog()
+    engine = await _get_engine()
+    if engine:
+        ballot = {table: engine.tables[table].choices(voter_id) for table in VOTE_TABLES}
+    else:
+        ballot = {}
+        async with _connect() as db:
+            for table, (key_column, choice_column) in VOTE_TABLES.items():
+                async with db.execute(f"""
+                    SELECT {key_column}, {choice_column}
+                    FROM {table}
+                    WHERE voter_id = ? AND deleted = 0
+                """, (voter_id,)) as cursor:
+                    ballot[table] = dict(await cursor.fetchall())
+
+    return {
+        "votes": {
+            category: entry_id
+            for category, entry_id in ballot["votes"].items()
+            if category in catalog.category_ids
+        },
+        "mc_votes": {
+            question_id: option_id
+            for question_id, option_id in ballot["mc_votes"].items()
+            if (question_id, option_id) in catalog.option_keys
+        },
+        "rankings": {
+            category: _split_ranking(ranking)
+            for category, ranking in ballot["rankings"].items()
+            if category in catalog.ranked_category_ids
+        },
+    }
+
+
+async def get_mc_results() -> Dict[str, Dict]:
+    """Get multiple choice vote results"""
+    catalog = await get_catalog()
+    tallies = await _get_tallies("mc_votes")
+
+    results = {}
+    for question in catalog.questions:
+        options = [
+            {
+                "option_id": option["id"],
+                "option_text": option["option_text"],
+                "vote_count": tallies.count(question["id"], option["id"]),
+            }
+            for option in question["options"]
+        ]
+        options.sort(key=lambda option: (-option["vote_count"], option["option_text"]))
+        results[question["id"]] = {
+            "question": question["question"],
+            "options": options,
+        }
+
+    return results
+
+
+# Vote writes and live tallies
+
+# Vote tables: (column a voter picks once, column holding their choice)
+VOTE_TABLES = {
+    "votes": ("category", "entry_id"),
+    "mc_votes": ("question_id", "option_id"),
+    "rankings": ("category", "ranking"),
+}
+
+# Separates the entry IDs of a ranking stored as a choice
+RANKING_SEPARATOR = ","
+
+
+class _Tallies:
+    """Live counts of active votes per (category, entry) or (question, option)
+
+    Tracked per vote row, so applying the same change twice is harmless.
+    """
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}  # key -> choice -> count
+        self._choice_of: Dict[str, Tuple[str, str]] = {}
+        self._versions: Dict[str, int] = {}
+
+    def count(self, key: str, choice: str) -> int:
+        return self._counts.get(key, {}).get(choice, 0)
+
+    def groups(self, key: str) -> Dict[str, int]:
+        """Active votes per choice for one key (for rankings: ballots per distinct ranking)"""
+        return {choice: count for choice, count in self._counts.get(key, {}).items() if count}
+
+    def version(self, key: str) -> int:
+        """Changes whenever a count for the key does, for caching what is computed from them"""
+        return self._versions.get(key, 0)
+
+    def _add(self, key: str, choice: str, delta: int) -> None:
+        counts = self._counts.setdefault(key, {})
+        counts[choice] = counts.get(choice, 0) + delta
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def set(self, vote_id: str, key: str, choice: str) -> None:
+        """Count an active vote (or move it to a new choice)"""
+        previous = self._choice_of.get(vote_id)
+        if previous == (key, choice):
+            return
+        if previous:
+            self._add(*previous, -1)
+        self._choice_of[vote_id] = (key, choice)
+        self._add(key, choice, 1)
+
+    def discard(self, vote_id: str) -> None:
+        """Stop counting a vote"""
+        previous = self._choice_of.pop(vote_id, None)
+        if previous:
+            self._add(*previous, -1)
+
+
+async def _get_tallies(table: str) -> _Tallies:
+    """Get the live tallies of a vote table, counting it once on first use"""
+    engine = await _get_engine()
+    if engine:
+        return engine.tables[table]
+
+    key_column, choice_column = VOTE_TABLES[table]
+
+    async def build():
+        tallies = _Tallies()
+        async with _connect() as db:
+            async with db.execute(f"""
+                SELECT id, {key_column}, {choice_column}
+                FROM {table}
+                WHERE deleted = 0
+            """) as cursor:
+                async for vote_id, key, choice in cursor:
+                    tallies.set(vote_id, key, choice)
+        return tallies
+
+    return await _get_index(f"{table}_tallies", build)
+
+
+class _VoterSummary:
+    """One voter's votes in a table (vote ID -> [key, deleted]) and when the voter was active"""
+
+    __slots__ = ("voter_id", "votes", "deleted", "first_seen", "last_seen")
+
+    def __init__(self, voter_id: Optional[str], seen: str):
+        self.voter_id = voter_id
+        self.votes: Dict[str, List] = {}
+        self.deleted = 0
+        self.first_seen = seen
+        self.last_seen = seen
+
+    def position(self) -> Tuple[str, str, bool]:
+        """Sort key: last activity, then voter (anonymous votes count as one voter)"""
+        return (self.last_seen, self.voter_id or "", self.voter_id is None)
+
+
+class _VoterSummaries:
+    """Per-voter summaries of one or more vote tables, kept in order of last activity
+
+    Backs the admin's grouped views: a page of the most recently active
+    voters is a slice of the ordered list rather than a GROUP BY over the
+    whole table. Tracked per vote row like _Tallies, so applying the same
+    change twice is harmless.
+    """
+
+    def __init__(self, tables: Tuple[str, ...]):
+        self.tables = tables
+        self._voters: Dict[Optional[str], _VoterSummary] = {}
+        self._voter_of: Dict[str, Optional[str]] = {}  # Vote ID -> voter ID
+        self._order: List[Tuple[str, str, bool]] = []  # _VoterSummary.position(), least recent first
+        self.voters_with_deleted = 0
+
+    def __len__(self) -> int:
+        return len(self._voters)
+
+    @property
+    def vote_count(self) -> int:
+        return len(self._voter_of)
+
+    def record(self, vote_id: str, voter_id: Optional[str], key: str, deleted: bool, created_at: str, updated_at: str):
+        """Count a vote, or note activity on one already counted"""
+        voter = self._voters.get(voter_id)
+        if voter is None:
+            voter = self._voters[voter_id] = _VoterSummary(voter_id, created_at)
+            insort(self._order, voter.position())
+        if vote_id not in voter.votes:
+            voter.votes[vote_id] = [key, False]
+            self._voter_of[vote_id] = voter_id
+            self._set_deleted(voter, vote_id, deleted)
+
+        voter.first_seen = min(voter.first_seen, created_at)
+        if updated_at > voter.last_seen:
+            del self._order[bisect_left(self._order, voter.position())]
+            voter.last_seen = updated_at
+            insort(self._order, voter.position())
+
+    def _set_deleted(self, voter: _VoterSummary, vote_id: str, deleted: bool) -> None:
+        vote = voter.votes[vote_id]
+        if vote[1] == deleted:
+            return
+        had_deleted = voter.deleted > 0
+        vote[1] = deleted
+        voter.deleted += 1 if deleted else -1
+        self.voters_with_deleted += (voter.deleted > 0) - had_deleted
+
+    def apply(self, operation: Dict) -> None:
+        """Apply committed vote changes, given as a vote engine operation"""
+        at = operation["at"]
+        for table, vote_id, voter_id, key, _ in operation.get("set", ()):
+            if table in self.tables:
+                self.record(vote_id, voter_id, key, False, at, at)
+        for table, vote_id, deleted in operation.get("deleted", ()):
+            if table in self.tables and vote_id in self._voter_of:
+                self._set_deleted(self._voters[self._voter_of[vote_id]], vote_id, deleted)
+
+    def page(self, offset: int, limit: int) -> List[_VoterSummary]:
+        """Voters from offset to offset + limit, most recently active first"""
+        end = len(self._order) - offset
+        if end <= 0:
+            return []
+        return [
+            self._voters[None if anonymous else voter_id]
+            for _, voter_id, anonymous in reversed(self._order[max(end - limit, 0):end])
+        ]
+
+
+# Admin grouped views: the vote tables each one summarizes per voter
+# (costume votes cover both single votes and rankings)
+VOTER_VIEWS = {
+    "votes": ("votes", "rankings"),
+    "mc_votes": ("mc_votes",),
+}
+
+
+async def _get_voter_summaries(view: str) -> _VoterSummaries:
+    """Get the per-voter summaries of a grouped view, reading its tables once on first use"""
+    tables = VOTER_VIEWS[view]
+
+    async def build():
+        summaries = _VoterSummaries(tables)
+        engine = await _get_engine()
+        for table in tables:
+            if engine:
+                votes = engine.tables[table]
+                for vote_id in votes.records:
+                    vote_id, voter_id, key, _, deleted, created_at, updated_at, _ = votes.row(vote_id)
+                    summaries.record(vote_id, voter_id, key, bool(deleted), created_at, updated_at)
+                continue
+
+            key_column, _ = VOTE_TABLES[table]
+            async with _connect() as db:
+                async with db.execute(f"""
+                    SELECT id, voter_id, {key_column}, deleted, created_at, updated_at
+                    FROM {table}
+                """) as cursor:
+                    async for vote_id, voter_id, key, deleted, created_at, updated_at in cursor:
+                        summaries.record(vote_id, voter_id, key, bool(deleted), created_at, updated_at or created_at)
+        return summaries
+
+    return await _get_index(f"{view}_voters", build)
+
+
+def _update_voter_summaries(operation: Dict) -> None:
+    """Apply committed vote changes (a vote engine operation, with its "at") to the loaded voter summaries"""
+    for view in VOTER_VIEWS:
+        _update_index(f"{view}_voters", lambda summaries: summaries.apply(operation))
+
+
+async def _upsert_votes(db, table: str, voter_id: Optional[str], choices: Dict[str, str], **context):
+    """Record a voter's choices with INSERT ... ON CONFLICT DO UPDATE
+
+    Must run inside a write transaction. Returns ({key: {"vote_id", "status"}},
+    function to call once committed, which updates the live tallies and voter
+    summaries). Extra keyword arguments (such as the ballot ID) are added to
+    the audit events.
+    """
+    key_column, choice_column = VOTE_TABLES[table]
+
+    # Anonymous votes never conflict (NULLs are distinct in UNIQUE)
+    previous = {}
+    if voter_id is not None and choices:
+        marks = ", ".join("?" * len(choices))
+        async with db.execute(f"""
+            SELECT {key_column}, id, {choice_column}, deleted
+            FROM {table}
+            WHERE voter_id = ? AND {key_column} IN ({marks})
+        """, (voter_id, *choices)) as cursor:
+            previous = {row[0]: row[1:] for row in await cursor.fetchall()}
+
+    outcome, rows, counted, logged = _plan_votes(table, voter_id, choices, previous, context)
+    await db.executemany(f"""
+        INSERT INTO {table} (id, voter_id, {key_column}, {choice_column})
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(voter_id, {key_column}) DO UPDATE SET
+            {choice_column} = excluded.{choice_column},
+            updated_at = CURRENT_TIMESTAMP,
+            change_count = change_count + 1
+        WHERE {choice_column} != excluded.{choice_column}
+    """, rows)
+    await _audit(db, logged)
+
+    def update(tallies: _Tallies):
+        for vote_id, key, choice in counted:
+            tallies.set(vote_id, key, choice)
+
+    def committed():
+        _update_index(f"{table}_tallies", update)
+        _update_voter_summaries({"at": votestore.now(), "set": [[table, *row] for row in rows]})
+
+    return outcome, committed
+
+
+def _plan_votes(table: str, voter_id: Optional[str], choices: Dict[str, str], previous: Dict, context: Dict):
+    """Work out what recording a voter's choices changes
+
+    previous maps keys the voter already voted on to (vote ID, choice,
+    deleted). Returns (outcome per key, rows to write as (vote ID, voter ID,
+    key, choice), active votes to count as (vote ID, key, choice), audit events).
+    """
+    key_column, choice_column = VOTE_TABLES[table]
+    subject = AUDIT_SUBJECTS[table]
+    outcome = {}
+    rows = []
+    counted = []
+    logged = []
+    for key, choice in choices.items():
+        if key not in previous:
+            vote_id, status, deleted = str(uuid.uuid4()), "created", False
+            logged.append((f"{subject}_cast", vote_id, {
+                "voter_id": voter_id, key_column: key, choice_column: choice, **context,
+            }))
+        else:
+            vote_id, previous_choice, deleted = previous[key]
+            status = "unchanged" if previous_choice == choice else "changed"
+            if status == "changed":
+                logged.append((f"{subject}_changed", vote_id, {
+                    choice_column: choice, f"previous_{choice_column}": previous_choice, **context,
+                }))
+
+        outcome[key] = {"vote_id": vote_id, "status": status}
+        if status != "unchanged":
+            rows.append((vote_id, voter_id, key, choice))
+            if not deleted:
+                counted.append((vote_id, key, choice))
+
+    return outcome, rows, counted, logged
+
+
+async def _set_votes_deleted(table: str, column: str, value: str, deleted: bool) -> int:
+    """Soft delete or restore the votes with the given id or voter_id, keeping the live tallies in step"""
+    key_column, choice_column = VOTE_TABLES[table]
+    event_type = f"{AUDIT_SUBJECTS[table]}_{'deleted' if deleted else 'restored'}"
+
+    engine = await _get_engine()
+    if engine:
+        async with engine.lock:
+            matching = engine.tables[table].matching(column, value)
+            changed = [record.id for record in matching if record.deleted != deleted]
+            _engine_commit(engine, {
+                "deleted": [[table, vote_id, deleted] for vote_id in changed],
+                "audit": [[event_type, vote_id, None] for vote_id in changed],
+            })
+        return len(matching)
+
+    where, params = f"{column} = ?", (value,)
+    async with _connect() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        async with db.execute(f"""
+            SELECT id, {key_column}, {choice_column}, deleted
+            FROM {table}
+            WHERE {where}
+        """, params) as cursor:
+            votes = [row[:3] for row in await cursor.fetchall() if bool(row[3]) != deleted]
+        cursor = await db.execute(f"UPDATE {table} SET deleted = ? WHERE {where}", (int(deleted), *params))
+        await _audit(db, [(event_type, vote_id, None) for vote_id, _, _ in votes])
+        await db.commit()
+
+    def update(tallies: _Tallies):
+        for vote_id, key, choice in votes:
+            if deleted:
+                tallies.discard(vote_id)
+            else:
+                tallies.set(vote_id, key, choice)
+
+    _update_index(f"{table}_tallies", update)
+    _update_voter_summaries({
+        "at": votestore.now(),
+        "deleted": [[table, vote_id, deleted] for vote_id, _, _ in votes],
+    })
+    return cursor.rowcount
+
+
+# Memory-resident vote engine (VOTE_ENGINE = "memory", see votestore.py)
+#
+# Vote writes and reads go to the engine instead of the vote tables; the
+# engine journals every change and _checkpoint() copies them into the
+# database in the background. Code that reads the vote tables directly
+# (admin lists, exports, backups, the audit log) checkpoints first.
+
+# Loaded engines by database path, so they outlive evicted event handles
+_engines: Dict[str, votestore.VoteStore] = {}
+_engines_lock = asyncio.Lock()
+
+
+async def _get_engine() -> Optional[votestore.VoteStore]:
+    """Get the current event's memory-resident votes, loading them on first use
+
+    Returns None when the SQLite engine is configured.
+    """
+    if VOTE_ENGINE != "memory":
+        return None
+
+    db_path = events.current().db_path
+    engine = _engines.get(db_path)
+    if engine is None:
+        async with _engines_lock:
+            engine = _engines.get(db_path)
+            if engine is None:
+                engine = _engines[db_path] = await _load_engine(db_path)
+    return engine
+
+
+async def _load_engine(db_path: str) -> votestore.VoteStore:
+    """Read an event's votes into memory, replaying journals a crash left behind"""
+    engine = votestore.VoteStore(db_path, VOTE_TABLES, fsync=JOURNAL_FSYNC)
+
+    async with aiosqlite.connect(db_path) as db:
+        checkpointed = int(await _get_meta(db, "journal_checkpoint") or 0)
+        async with db.execute("SELECT id FROM entries") as cursor:
+            engine.entry_ids.update(row[0] for row in await cursor.fetchall())
+        for table, (key_column, choice_column) in VOTE_TABLES.items():
+            async with db.execute(f"""
+                SELECT id, voter_id, {key_column}, {choice_column}, deleted, created_at, updated_at, change_count
+                FROM {table}
+            """) as cursor:
+                async for row in cursor:
+                    engine.tables[table].load(*row)
+        async with db.execute("SELECT id, vote_count, mc_vote_count FROM ballots") as cursor:
+            async for ballot_id, vote_count, mc_vote_count in cursor:
+                engine.ballots[ballot_id] = (vote_count, mc_vote_count)
+
+    last_journal = checkpointed
+    for number, path in votestore.journal_files(db_path):
+        if number > checkpointed:
+            engine.replay(number, path)
+        else:
+            path.unlink()  # Already in the database
+        last_journal = max(last_journal, number)
+    engine.open(last_journal)
+
+    if engine.has_changes():
+        await _checkpoint(engine)
+    return engine
+
+
+async def _check_entries(engine: votestore.VoteStore, entry_ids) -> None:
+    """Raise ValueError unless every entry exists, looking up IDs the engine hasn't seen yet"""
+    missing = set(entry_ids) - engine.entry_ids
+    if not missing:
+        return
+
+    marks = ", ".join("?" * len(missing))
+    async with _connect() as db:
+        async with db.execute(f"SELECT id FROM entries WHERE id IN ({marks})", list(missing)) as cursor:
+            found = {row[0] for row in await cursor.fetchall()}
+    engine.entry_ids.update(found)
+    if found != missing:
+        raise ValueError("Entry not found")
+
+
+def _engine_votes(engine: votestore.VoteStore, table: str, voter_id: Optional[str], choices: Dict[str, str], **context):
+    """Like _upsert_votes(), but returns the engine operation recording the choices"""
+    previous = engine.tables[table].previous(voter_id, choices)
+    outcome, rows, _, logged = _plan_votes(table, voter_id, choices, previous, context)
+    return outcome, {
+        "set": [[table, *row] for row in rows],
+        "audit": [list(event) for event in logged],
+    }
+
+
+async def _engine_submit_ballot(
+    engine: votestore.VoteStore,
+    ballot_id: str,
+    voter_id: Optional[str],
+    votes: Dict[str, str],
+    mc_votes: Dict[str, str],
+    rankings: Dict[str, str],
+    entry_ids: Set[str],
+) -> Dict:
+    """submit_ballot() against the memory-resident votes (rankings already joined into choices)"""
+    if ballot_id not in engine.ballots:
+        await _check_entries(engine, entry_ids)
+
+    vote_count = len(votes) + len(rankings)
+    async with engine.lock:
+        if ballot_id in engine.ballots:
+            vote_count, mc_vote_count = engine.ballots[ballot_id]
+            return {"ballot_id": ballot_id, "votes": vote_count, "mc_votes": mc_vote_count, "replayed": True}
+
+        operations = [
+            _engine_votes(engine, table, voter_id, choices, ballot_id=ballot_id)[1]
+            for table, choices in (("votes", votes), ("mc_votes", mc_votes), ("rankings", rankings))
+        ]
+        _engine_commit(engine, {
+            "set": [row for operation in operations for row in operation["set"]],
+            "ballot": [ballot_id, voter_id, vote_count, len(mc_votes)],
+            "audit": [event for operation in operations for event in operation["audit"]],
+        })
+
+    return {"ballot_id": ballot_id, "votes": vote_count, "mc_votes": len(mc_votes), "replayed": False}
+
+
+def _engine_commit(engine: votestore.VoteStore, operation: Dict) -> None:
+    """Journal and apply an engine operation, and make sure a checkpoint follows"""
+    if not any(operation.values()):
+        return
+    _update_voter_summaries(engine.commit(operation))
+    _schedule_checkpoint(engine)
+
+
+def _schedule_checkpoint(engine: votestore.VoteStore) -> None:
+    if engine.checkpoint_task is None:
+        engine.checkpoint_task = asyncio.get_running_loop().create_task(_checkpoint_later(engine))
+
+
+async def _checkpoint_later(engine: votestore.VoteStore) -> None:
+    await asyncio.sleep(CHECKPOINT_SECONDS)
+    engine.checkpoint_task = None
+    try:
+        await _checkpoint(engine)
+    except Exception as error:
+        # The changes are still journaled; try again later
+        print(f"⚠️  Checkpoint of {engine.db_path} failed: {error}")
+        _schedule_checkpoint(engine)
+
+
+async def _checkpoint(engine: votestore.VoteStore) -> None:
+    """Copy the changes journaled so far into the database, in one transaction"""
+    async with engine.checkpoint_lock:
+        checkpoint = engine.start_checkpoint()
+        if checkpoint is None:
+            return
+
+        try:
+            async with aiosqlite.connect(engine.db_path) as db:
+                await db.execute("BEGIN IMMEDIATE")
+                for table, rows in checkpoint.rows.items():
+                    key_column, choice_column = VOTE_TABLES[table]
+                    await db.executemany(f"""
+                        INSERT INTO {table} (
+                            id, voter_id, {key_column}, {choice_column}, deleted, created_at, updated_at, change_count
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(id) DO UPDATE SET
+                            {choice_column} = excluded.{choice_column},
+                            deleted = excluded.deleted,
+                            updated_at = excluded.updated_at,
+                            change_count = excluded.change_count
+                    """, rows)
+                await db.executemany("""
+                    INSERT OR IGNORE INTO ballots (id, voter_id, vote_count, mc_vote_count, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, checkpoint.ballots)
+                await db.executemany(
+                    "INSERT INTO audit_log (at, type, subject_id, data) VALUES (?, ?, ?, ?)",
+                    checkpoint.audit,
+                )
+                # Journals up to this one are now in the database and are never replayed
+                await _set_meta(db, "journal_checkpoint", str(checkpoint.journal))
+                await db.commit()
+        except BaseException:
+            engine.abort_checkpoint(checkpoint)
+            raise
+        engine.finish_checkpoint(checkpoint)
+
+
+async def _checkpoint_votes() -> None:
+    """Bring the vote tables up to date before reading them directly"""
+    engine = await _get_engine()
+    if engine:
+        await _checkpoint(engine)
+
+
+async def close_engines() -> None:
+    """Checkpoint and close every loaded vote engine (on shutdown)"""
+    for db_path, engine in list(_engines.items()):
+        await _checkpoint(engine)
+        if engine.checkpoint_task:
+            engine.checkpoint_task.cancel()
+        engine.close()
+        del _engines[db_path]
+
+
+# Append-only audit log
+#
+# Every change to entries and votes appends an event in the same transaction
+# as the change itself, so replaying the log from the start (see audit.py)
+# rebuilds the current entries, votes and tallies. Events are never updated
+# or deleted, not even by a data reset.
+
+# Event type prefix for each vote table: vote_cast, mc_vote_deleted, ...
+AUDIT_SUBJECTS = {
+    "votes": "vote",
+    "mc_votes": "mc_vote",
+    "rankings": "ranking",
+}
+
+AUDIT_CHUNK_SIZE = 1000
+
+
+async def _audit(db, logged: List[Tuple[str, str, Optional[Dict]]]) -> None:
+    """Append (type, subject ID, data) events inside the caller's transaction"""
+    if not logged:
+        return
+    await db.executemany(
+        "INSERT INTO audit_log (type, subject_id, data) VALUES (?, ?, ?)",
+        [
+            (event_type, subject_id, json.dumps(data, separators=(",", ":")) if data else None)
+            for event_type, subject_id, data in logged
+        ],
+    )
+
+
+async def _backfill_audit_log(db) -> None:
+    """Describe data written before the audit log existed as its first events"""
+    async with db.execute("SELECT 1 FROM audit_log LIMIT 1") as cursor:
+        if await cursor.fetchone():
+            return
+
+    backfilled = []
+    async with db.execute("""
+        SELECT id, name, costume_name, photo_filename, photo_hash, deleted
+        FROM entries
+        ORDER BY created_at, id
+    """) as cursor:
+        async for entry_id, name, costume_name, photo_filename, photo_hash, deleted in cursor:
+            backfilled.append(("entry_created", entry_id, {
+                "name": name,
+                "costume_name": costume_name,
+                "photo_filename": photo_filename,
+                "photo_hash": photo_hash,
+                "backfilled": True,
+            }))
+            if deleted:
+                backfilled.append(("entry_deleted", entry_id, {"backfilled": True}))
+
+    for table, (key_column, choice_column) in VOTE_TABLES.items():
+        subject = AUDIT_SUBJECTS[table]
+        async with db.execute(f"""
+            SELECT id, voter_id, {key_column}, {choice_column}, deleted
+            FROM {table}
+            ORDER BY created_at, id
         """) as cursor:
-            question_rows = await cursor.fetchall()
+            async for vote_id, voter_id, key, choice, deleted in cursor:
+                backfilled.append((f"{subject}_cast", vote_id, {
+                    "voter_id": voter_id, key_column: key, choice_column: choice, "backfilled": True,
+                }))
+                if deleted:
+                    backfilled.append((f"{subject}_deleted", vote_id, {"backfilled": True}))
+
+    await _audit(db, backfilled)
+
+
+async def _backfill_deleted_at(db) -> None:
+    """Date entries deleted before deleted_at existed by their audit event"""
+    await db.execute("""
+        UPDATE entries
+        SET deleted_at = COALESCE(
+            (SELECT MAX(at) FROM audit_log WHERE type = 'entry_deleted' AND subject_id = entries.id),
+            CURRENT_TIMESTAMP
+        )
+        WHERE deleted = 1 AND deleted_at IS NULL
+    """)
+
+
+def audit_record(seq: int, at: str, event_type: str, subject_id: str, data: Optional[str]) -> Dict:
+    """Flatten an audit_log row into the record used by exports and replays"""
+    record = {"seq": seq, "at": at, "type": event_type, "id": subject_id}
+    if data:
+        record.update(json.loads(data))
+    return record
+
+
+async def iter_audit_log(after: int = 0) -> AsyncIterator[List[Dict]]:
+    """Stream audit records with seq > after, oldest first, in chunks (admin only)"""
+    await _checkpoint_votes()
+    async with _connect() as db:
+        async with db.execute("""
+            SELECT seq, at, type, subject_id, data
+            FROM audit_log
+            WHERE seq > ?
+            ORDER BY seq
+        """, (after,)) as cursor:
+            while True:
+                rows = await cursor.fetchmany(AUDIT_CHUNK_SIZE)
+                if not rows:
+                    break
+                yield [audit_record(*row) for row in rows]
+
+
+# Voting catalog (categories and multiple choice questions)
+#
+# The database is the source of truth; each event keeps an immutable
+# snapshot of the active catalog in memory. Changes are written under the
+# event's catalog lock and a freshly loaded snapshot is swapped in, so
+# readers see either the old catalog or the new one, never a mix.
+
+class Catalog:
+    """Snapshot of an event's categories and questions that are open for voting"""
+
+    __slots__ = ("categories", "questions", "category_ids", "ranked_category_ids", "question_ids", "option_keys")
+
+    def __init__(self, categories: List[Dict], questions: List[Dict]):
+        self.categories = tuple(categories)
+        self.questions = tuple(questions)
+        # Validation sets for incoming votes (ranked categories take rankings, the others single votes)
+        self.category_ids = frozenset(cat["id"] for cat in categories)
+        self.ranked_category_ids = frozenset(cat["id"] for cat in categories if cat["voting_mode"] != "single")
+        self.question_ids = frozenset(q["id"] for q in questions)
+        self.option_keys = frozenset((q["id"], opt["id"]) for q in questions for opt in q["options"])
+
+
+async def _read_catalog(db, include_retired: bool = False) -> Tuple[List[Dict], List[Dict]]:
+    """Read categories and questions (with options) in display order"""
+    retired = "" if include_retired else "WHERE retired = 0"
+    columns = ", retired" if include_retired else ""
+
+    async with db.execute(f"""
+        SELECT id, name, display_order, voting_mode{columns}
+        FROM categories
+        {retired}
+        ORDER BY display_order, id
+    """) as cursor:
+        categories = [dict(row) for row in await cursor.fetchall()]
+
+    async with db.execute(f"""
+        SELECT id, question, display_order{columns}
+        FROM mc_questions
+        {retired}
+        ORDER BY display_order, id
+    """) as cursor:
+        questions = [dict(row) for row in await cursor.fetchall()]
+
+    async with db.execute(f"""
+        SELECT question_id, id, option_text{columns}
+        FROM mc_options
+        {retired}
+        ORDER BY id
+    """) as cursor:
+        options: Dict[str, List[Dict]] = {}
+        for row in await cursor.fetchall():
+            option = dict(row)
+            options.setdefault(option.pop("question_id"), []).append(option)
+
+    for question in questions:
+        question["options"] = options.get(question["id"], [])
+
+    for item in categories + questions + [opt for q in questions for opt in q["options"]]:
+        if "retired" in item:
+            item["retired"] = bool(item["retired"])
+
+    return categories, questions
+
+
+async def _load_catalog() -> Catalog:
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        return Catalog(*await _read_catalog(db))
+
 
-            for q_row in question_rows:
-                question = dict(q_row)
+async def get_catalog() -> Catalog:
+    """Get the current event's active catalog snapshot"""
+    return await _get_index("catalog", _load_catalog)
 
-                # Get options for this question
-                async with db.execute("""
-                    SELECT id, option_text
-                    FROM mc_options
-                    WHERE question_id = ?
-                    ORDER BY id
-                """, (question["id"],)) as opt_cursor:
-                    option_rows = await opt_cursor.fetchall()
-                    question["options"] = [dict(opt) for opt in option_rows]
 
-                questions.append(question)
+async def get_catalog_admin() -> Dict[str, List[Dict]]:
+    """Get all categories and questions, including retired ones (admin only)"""
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        categories, questions = await _read_catalog(db, include_retired=True)
+    return {"categories": categories, "mc_questions": questions}
+
+
+async def _change_catalog(write) -> bool:
+    """Apply a catalog write and swap in a new snapshot if it changed anything"""
+    event = events.current()
+    async with event.catalog_lock:
+        async with _connect() as db:
+            changed = await write(db)
+            await db.commit()
+
+        # Only the catalog depends on these tables; other caches stay warm
+        if changed:
+            event.caches["catalog"] = await _load_catalog()
+    return changed
+
+
+async def _next_display_order(db, table: str) -> int:
+    async with db.execute(f"SELECT COALESCE(MAX(display_order), 0) + 1 FROM {table}") as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def _update_row(db, table: str, where: Dict, changes: Dict) -> bool:
+    """Update the given columns of one row, returning whether it exists"""
+    changes = {column: value for column, value in changes.items() if value is not None}
+    conditions = " AND ".join(f"{column} = ?" for column in where)
+    if not changes:
+        async with db.execute(f"SELECT 1 FROM {table} WHERE {conditions}", tuple(where.values())) as cursor:
+            return await cursor.fetchone() is not None
+
+    assignments = ", ".join(f"{column} = ?" for column in changes)
+    cursor = await db.execute(
+        f"UPDATE {table} SET {assignments} WHERE {conditions}",
+        (*changes.values(), *where.values()),
+    )
+    return cursor.rowcount > 0
+
+
+async def _reorder(db, table: str, ids: List[str]) -> bool:
+    """Move the listed rows to the front in list order, keeping the rest after them"""
+    if len(set(ids)) != len(ids):
+        raise ValueError("Duplicate IDs in order")
+
+    async with db.execute(f"SELECT id FROM {table} ORDER BY display_order, id") as cursor:
+        current = [row[0] for row in await cursor.fetchall()]
+    unknown = set(ids) - set(current)
+    if unknown:
+        raise ValueError(f"Unknown IDs: {', '.join(sorted(unknown))}")
+
+    listed = set(ids)
+    order = ids + [item_id for item_id in current if item_id not in listed]
+    await db.executemany(
+        f"UPDATE {table} SET display_order = ? WHERE id = ?",
+        [(position, item_id) for position, item_id in enumerate(order, start=1)],
+    )
+    return True
+
+
+def _check_voting_mode(voting_mode: str) -> None:
+    if voting_mode not in VOTING_MODES:
+        raise ValueError(f"Unknown voting mode. Allowed: {', '.join(VOTING_MODES)}")
+
+
+async def add_category(
+    category_id: str,
+    name: str,
+    display_order: Optional[int] = None,
+    voting_mode: str = "single",
+) -> None:
+    """Add a voting category (appended after the others by default)"""
+    _check_voting_mode(voting_mode)
+
+    async def write(db):
+        order = display_order if display_order is not None else await _next_display_order(db, "categories")
+        try:
+            await db.execute("""
+                INSERT INTO categories (id, name, display_order, voting_mode)
+                VALUES (?, ?, ?, ?)
+            """, (category_id, name, order, voting_mode))
+        except sqlite3.IntegrityError:
+            raise ValueError("Category already exists")
+        return True
+
+    await _change_catalog(write)
+
+
+async def update_category(
+    category_id: str,
+    name: Optional[str] = None,
+    display_order: Optional[int] = None,
+    retired: Optional[bool] = None,
+    voting_mode: Optional[str] = None,
+) -> bool:
+    """Rename, move, retire or change the voting mode of a category; returns False if it doesn't exist
+
+    Votes in a retired category are kept, but it no longer appears on the
+    ballot or in results, and new votes for it are rejected. A category can
+    switch between "ranked" and "borda" at any time (both count the same
+    rankings), but only switch to or from "single" while nobody has voted in it.
+    """
+    if voting_mode is not None:
+        _check_voting_mode(voting_mode)
+        await _checkpoint_votes()
+
+    async def write(db):
+        if voting_mode is not None:
+            async with db.execute("SELECT voting_mode FROM categories WHERE id = ?", (category_id,)) as cursor:
+                row = await cursor.fetchone()
+            if row and (row[0] == "single") != (voting_mode == "single"):
+                table = "votes" if row[0] == "single" else "rankings"
+                async with db.execute(f"SELECT 1 FROM {table} WHERE category = ? LIMIT 1", (category_id,)) as cursor:
+                    if await cursor.fetchone():
+                        raise ValueError("Category already has votes; its voting mode can no longer change")
+
+        return await _update_row(
+            db, "categories", {"id": category_id},
+            {"name": name, "display_order": display_order, "retired": retired, "voting_mode": voting_mode},
+        )
+
+    return await _change_catalog(write)
+
+
+async def reorder_categories(category_ids: List[str]) -> None:
+    """Set the display order of categories to the given order"""
+    await _change_catalog(lambda db: _reorder(db, "categories", category_ids))
+
+
+async def add_mc_question(
+    question_id: str,
+    question: str,
+    options: List[Dict],
+    display_order: Optional[int] = None,
+) -> None:
+    """Add a multiple choice question with its options"""
+    async def write(db):
+        order = display_order if display_order is not None else await _next_display_order(db, "mc_questions")
+        try:
+            await db.execute("""
+                INSERT INTO mc_questions (id, question, display_order)
+                VALUES (?, ?, ?)
+            """, (question_id, question, order))
+            await db.executemany("""
+                INSERT INTO mc_options (id, question_id, option_text)
+                VALUES (?, ?, ?)
+            """, [(option["id"], question_id, option["text"]) for option in options])
+        except sqlite3.IntegrityError:
+            raise ValueError("Question or option already exists")
+        return True
 
-        return questions
+    await _change_catalog(write)
 
 
-async def create_mc_vote(question_id: str, option_id: str, voter_id: Optional[str] = None) -> str:
-    """Create a multiple choice vote and return its ID"""
-    vote_id = str(uuid.uuid4())
+async def update_mc_question(
+    question_id: str,
+    question: Optional[str] = None,
+    display_order: Optional[int] = None,
+    retired: Optional[bool] = None,
+) -> bool:
+    """Reword, move or retire a multiple choice question; returns False if it doesn't exist"""
+    async def write(db):
+        return await _update_row(
+            db, "mc_questions", {"id": question_id},
+            {"question": question, "display_order": display_order, "retired": retired},
+        )
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # Check if question exists
-        async with db.execute("SELECT id FROM mc_questions WHERE id = ?", (question_id,)) as cursor:
-            if not await cursor.fetchone():
-                raise ValueError("Question not found")
+    return await _change_catalog(write)
 
-        # Check if option exists and belongs to the question
-        async with db.execute(
-            "SELECT id FROM mc_options WHERE id = ? AND question_id = ?",
-            (option_id, question_id)
-        ) as cursor:
-            if not await cursor.fetchone():
-                raise ValueError("Option not found or does not belong to this question")
 
-        # Insert vote (will replace if voter_id+question_id already exists)
-        await db.execute("""
-            INSERT INTO mc_votes (id, voter_id, question_id, option_id)
-            VALUES (?, ?, ?, ?)
-        """, (vote_id, voter_id, question_id, option_id))
-        await db.commit()
+async def reorder_mc_questions(question_ids: List[str]) -> None:
+    """Set the display order of multiple choice questions to the given order"""
+    await _change_catalog(lambda db: _reorder(db, "mc_questions", question_ids))
 
-    return vote_id
 
+async def add_mc_option(question_id: str, option_id: str, text: str) -> bool:
+    """Add an option to a question; returns False if the question doesn't exist"""
+    async def write(db):
+        async with db.execute("SELECT 1 FROM mc_questions WHERE id = ?", (question_id,)) as cursor:
+            if not await cursor.fetchone():
+                return False
+        try:
+            await db.execute("""
+                INSERT INTO mc_options (id, question_id, option_text)
+                VALUES (?, ?, ?)
+            """, (option_id, question_id, text))
+        except sqlite3.IntegrityError:
+            raise ValueError("Option already exists")
+        return True
 
-async def get_mc_results() -> Dict[str, Dict]:
-    """Get multiple choice vote results"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    return await _change_catalog(write)
 
-        results = {}
 
-        for question in MULTIPLE_CHOICE_QUESTIONS:
-            question_id = question["id"]
+async def update_mc_option(
+    question_id: str,
+    option_id: str,
+    text: Optional[str] = None,
+    retired: Optional[bool] = None,
+) -> bool:
+    """Reword or retire an option; returns False if it doesn't exist"""
+    async def write(db):
+        return await _update_row(
+            db, "mc_options", {"id": option_id, "question_id": question_id},
+            {"option_text": text, "retired": retired},
+        )
 
-            async with db.execute("""
-                SELECT
-                    o.id as option_id,
-                    o.option_text,
-                    COUNT(v.id) as vote_count
-                FROM mc_options o
-                LEFT JOIN mc_votes v ON o.id = v.option_id AND v.question_id = ? AND v.deleted = 0
-                WHERE o.question_id = ?
-                GROUP BY o.id
-                ORDER BY vote_count DESC, o.option_text ASC
-            """, (question_id, question_id)) as cursor:
-                rows = await cursor.fetchall()
-                results[question_id] = {
-                    "question": question["question"],
-                    "options": [dict(row) for row in rows]
-                }
-
-        return results
+    return await _change_catalog(write)
 
 
 # Admin functions for soft deletion management
 
 async def get_all_entries_admin() -> List[Dict]:
     """Get all entries including deleted (admin only)"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute("""
             SELECT id, name, costume_name, photo_filename, deleted, created_at
@@ -305,7 +1765,8 @@ async def get_all_entries_admin() -> List[Dict]:
 
 async def get_all_votes_admin() -> List[Dict]:
     """Get all votes including deleted (admin only)"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    await _checkpoint_votes()
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute("""
             SELECT v.id, v.voter_id, v.category, v.entry_id, v.deleted, v.created_at,
@@ -320,7 +1781,8 @@ async def get_all_votes_admin() -> List[Dict]:
 
 async def get_all_mc_votes_admin() -> List[Dict]:
     """Get all MC votes including deleted (admin only)"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    await _checkpoint_votes()
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute("""
             SELECT v.id, v.voter_id, v.question_id, v.option_id, v.deleted, v.created_at,
@@ -336,120 +1798,581 @@ async def get_all_mc_votes_admin() -> List[Dict]:
 
 async def soft_delete_entry(entry_id: str) -> bool:
     """Soft delete an entry"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("UPDATE entries SET deleted = 1 WHERE id = ?", (entry_id,))
+    async with _connect() as db:
+        cursor = await db.execute("""
+            UPDATE entries SET deleted = 1, deleted_at = CURRENT_TIMESTAMP WHERE id = ? AND deleted = 0
+        """, (entry_id,))
+        if cursor.rowcount:
+            await _audit(db, [("entry_deleted", entry_id, None)])
         await db.commit()
-        return True
+
+    _update_index("phash", lambda tree: tree.remove(entry_id))
+    _update_index("search", lambda index: index.remove(entry_id))
+    return True
 
 
 async def restore_entry(entry_id: str) -> bool:
     """Restore a deleted entry"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("UPDATE entries SET deleted = 0 WHERE id = ?", (entry_id,))
+    async with _connect() as db:
+        cursor = await db.execute("""
+            UPDATE entries SET deleted = 0, deleted_at = NULL WHERE id = ? AND deleted = 1
+        """, (entry_id,))
+        if cursor.rowcount:
+            await _audit(db, [("entry_restored", entry_id, None)])
+        db.row_factory = aiosqlite.Row
+        async with db.execute("""
+            SELECT e.id, e.name, e.costume_name, e.photo_filename, b.phash
+            FROM entries e
+            LEFT JOIN blobs b ON b.hash = e.photo_hash
+            WHERE e.id = ?
+        """, (entry_id,)) as cursor:
+            row = await cursor.fetchone()
         await db.commit()
+
+    if row is None:
         return True
 
+    entry = dict(row)
+    photo_phash = entry.pop("phash")
+    if photo_phash is not None:
+        photo_phash = phash.from_db(photo_phash)
+        _update_index("phash", lambda tree: tree.add(entry_id, photo_phash))
+    _update_index("search", lambda index: index.add(entry))
+    return True
+
 
 async def soft_delete_vote(vote_id: str) -> bool:
     """Soft delete a vote"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("UPDATE votes SET deleted = 1 WHERE id = ?", (vote_id,))
-        await db.commit()
-        return True
+    await _set_votes_deleted("votes", "id", vote_id, True)
+    return True
 
 
 async def restore_vote(vote_id: str) -> bool:
     """Restore a deleted vote"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("UPDATE votes SET deleted = 0 WHERE id = ?", (vote_id,))
-        await db.commit()
-        return True
+    await _set_votes_deleted("votes", "id", vote_id, False)
+    return True
 
 
 async def soft_delete_mc_vote(vote_id: str) -> bool:
     """Soft delete an MC vote"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("UPDATE mc_votes SET deleted = 1 WHERE id = ?", (vote_id,))
-        await db.commit()
-        return True
+    await _set_votes_deleted("mc_votes", "id", vote_id, True)
+    return True
 
 
 async def restore_mc_vote(vote_id: str) -> bool:
     """Restore a deleted MC vote"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("UPDATE mc_votes SET deleted = 0 WHERE id = ?", (vote_id,))
-        await db.commit()
-        return True
+    await _set_votes_deleted("mc_votes", "id", vote_id, False)
+    return True
 
 
 # Admin functions for grouped votes by voter
 
-async def get_votes_grouped_by_voter_admin() -> List[Dict]:
-    """Get votes grouped by voter_id (admin only)"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+def _voter_page(summaries: _VoterSummaries, offset: int, limit: int, field: str, label) -> Dict:
+    """One page of voter summaries, with totals over all voters"""
+    return {
+        "total": len(summaries),
+        "offset": offset,
+        "limit": limit,
+        "vote_count": summaries.vote_count,
+        "voters_with_deleted": summaries.voters_with_deleted,
+        "voters": [
+            {
+                "voter_id": voter.voter_id,
+                field: label([key for key, _ in voter.votes.values()]),
+                "vote_count": len(voter.votes),
+                "has_deleted": int(voter.deleted > 0),
+                "all_deleted": int(voter.deleted == len(voter.votes)),
+                "first_seen": voter.first_seen,
+                "last_seen": voter.last_seen,
+            }
+            for voter in summaries.page(offset, limit)
+        ],
+    }
+
+
+async def get_votes_grouped_by_voter_admin(offset: int = 0, limit: int = 50) -> Dict:
+    """Get a page of voters, most recently active first, with their votes summarized (admin only)"""
+    summaries = await _get_voter_summaries("votes")
+    return _voter_page(summaries, offset, limit, "categories", ", ".join)
+
+
+async def get_mc_votes_grouped_by_voter_admin(offset: int = 0, limit: int = 50) -> Dict:
+    """Get a page of voters, most recently active first, with their MC votes summarized (admin only)"""
+    summaries = await _get_voter_summaries("mc_votes")
+    async with _connect() as db:
+        async with db.execute("SELECT id, question FROM mc_questions") as cursor:
+            questions = dict(await cursor.fetchall())
+    return _voter_page(
+        summaries, offset, limit, "questions",
+        lambda keys: " | ".join(questions.get(key, key) for key in keys),
+    )
+
+
+async def soft_delete_all_votes_by_voter(voter_id: str) -> int:
+    """Soft delete all votes (and rankings) from a specific voter"""
+    return sum([await _set_votes_deleted(table, "voter_id", voter_id, True) for table in VOTER_VIEWS["votes"]])
+
+
+async def restore_all_votes_by_voter(voter_id: str) -> int:
+    """Restore all votes (and rankings) from a specific voter"""
+    return sum([await _set_votes_deleted(table, "voter_id", voter_id, False) for table in VOTER_VIEWS["votes"]])
+
+
+async def soft_delete_all_mc_votes_by_voter(voter_id: str) -> int:
+    """Soft delete all MC votes from a specific voter"""
+    return await _set_votes_deleted("mc_votes", "voter_id", voter_id, True)
+
+
+async def restore_all_mc_votes_by_voter(voter_id: str) -> int:
+    """Restore all MC votes from a specific voter"""
+    return await _set_votes_deleted("mc_votes", "voter_id", voter_id, False)
+
+
+# Admin export of raw data and tallies
+
+EXPORT_CHUNK_SIZE = 500
+
+async def _export_results(db) -> Tuple[List[str], List[tuple]]:
+    """Final results of the open categories, counted inside the export's snapshot
+
+    Counted like get_results(), one row per entry in finishing order. place
+    and winner follow the category's voting mode: most votes, instant runoff
+    (round_votes lists an entry's votes in each round it took part in) or
+    most Borda points. Ties for the most votes or points share the win.
+    """
+    columns = [
+        "category_id", "category", "voting_mode", "place", "entry_id", "name", "costume_name",
+        "vote_count", "points", "round_votes", "winner",
+    ]
+    async with db.execute("""
+        SELECT id, name, voting_mode FROM categories WHERE retired = 0 ORDER BY display_order
+    """) as cursor:
+        categories = await cursor.fetchall()
+    async with db.execute("""
+        SELECT id, name, costume_name, photo_filename FROM entries WHERE deleted = 0
+    """) as cursor:
+        entries = [
+            {"id": row[0], "name": row[1], "costume_name": row[2], "photo_filename": row[3]}
+            for row in await cursor.fetchall()
+        ]
+    async with db.execute("""
+        SELECT category, entry_id, COUNT(*) FROM votes WHERE deleted = 0 GROUP BY category, entry_id
+    """) as cursor:
+        vote_counts = {(category, entry_id): count for category, entry_id, count in await cursor.fetchall()}
+    groups: Dict[str, ranked.Groups] = {}
+    async with db.execute("""
+        SELECT category, ranking, COUNT(*) FROM rankings WHERE deleted = 0 GROUP BY category, ranking
+    """) as cursor:
+        for category, ranking, count in await cursor.fetchall():
+            groups.setdefault(category, {})[tuple(_split_ranking(ranking))] = count
+
+    rows = []
+    for category_id, category_name, mode in categories:
+        if mode == "single":
+            results = [_result_row(entry, vote_counts.get((category_id, entry["id"]), 0)) for entry in entries]
+            results.sort(key=lambda row: (-row["vote_count"], row["name"]))
+            rounds = []
+        else:
+            counted = _count_ranked(groups.get(category_id, {}), mode, entries)
+            results, rounds = counted["results"], counted["rounds"]
+
+        if mode == "ranked":
+            winners = {rounds[-1]["elected"]} if rounds else set()
+        else:
+            score = "vote_count" if mode == "single" else "points"
+            best = max((row[score] for row in results), default=0)
+            winners = {row["entry_id"] for row in results if best and row[score] == best}
+
+        for place, row in enumerate(results, 1):
+            round_votes = [
+                str(result["counts"][row["entry_id"]]) for result in rounds if row["entry_id"] in result["counts"]
+            ]
+            rows.append((
+                category_id, category_name, mode, place, row["entry_id"], row["name"], row["costume_name"],
+                row["vote_count"], row.get("points"), RANKING_SEPARATOR.join(round_votes) or None,
+                int(row["entry_id"] in winners),
+            ))
+    return columns, rows
+
+
+# Export datasets: SQL, or a function computing (columns, rows) on the export's connection
+EXPORT_QUERIES = {
+    "entries": """
+        SELECT id, name, costume_name, photo_filename, deleted, created_at
+        FROM entries
+        ORDER BY created_at, id
+    """,
+    "votes": """
+        SELECT v.id, v.voter_id, v.category, v.entry_id, v.deleted, v.created_at,
+               v.updated_at, v.change_count, e.name as entry_name, e.costume_name
+        FROM votes v
+        LEFT JOIN entries e ON v.entry_id = e.id
+        ORDER BY v.created_at, v.id
+    """,
+    "mc-votes": """
+        SELECT v.id, v.voter_id, v.question_id, v.option_id, v.deleted, v.created_at,
+               v.updated_at, v.change_count, q.question, o.option_text
+        FROM mc_votes v
+        LEFT JOIN mc_questions q ON v.question_id = q.id
+        LEFT JOIN mc_options o ON v.option_id = o.id
+        ORDER BY v.created_at, v.id
+    """,
+    "rankings": """
+        SELECT id, voter_id, category, ranking, deleted, created_at, updated_at, change_count
+        FROM rankings
+        ORDER BY created_at, id
+    """,
+    "results": _export_results,
+    "mc-results": """
+        SELECT
+            q.id as question_id,
+            q.question,
+            o.id as option_id,
+            o.option_text,
+            COUNT(v.id) as vote_count
+        FROM mc_questions q
+        JOIN mc_options o ON o.question_id = q.id
+        LEFT JOIN mc_votes v ON o.id = v.option_id AND v.question_id = q.id AND v.deleted = 0
+        WHERE q.retired = 0 AND o.retired = 0
+        GROUP BY q.id, o.id
+        ORDER BY q.display_order, vote_count DESC, o.option_text ASC
+    """,
+}
+
+
+async def iter_export(datasets: List[str]) -> AsyncIterator[Tuple[str, List[str], List[tuple]]]:
+    """Stream (dataset, columns, rows) chunks for the given datasets (admin only)
+
+    All datasets are read inside one read transaction, so a multi-dataset
+    export reflects a single snapshot even while votes keep coming in. The
+    first chunk of every dataset carries no rows, only the column names.
+    """
+    await _checkpoint_votes()
+    async with _connect() as db:
+        await db.execute("BEGIN")
+        try:
+            for dataset in datasets:
+                query = EXPORT_QUERIES[dataset]
+                if callable(query):
+                    columns, rows = await query(db)
+                    yield dataset, columns, []
+                    for start in range(0, len(rows), EXPORT_CHUNK_SIZE):
+                        yield dataset, columns, rows[start:start + EXPORT_CHUNK_SIZE]
+                    continue
+
+                async with db.execute(query) as cursor:
+                    columns = [description[0] for description in cursor.description]
+                    yield dataset, columns, []
+
+                    while True:
+                        rows = await cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                        if not rows:
+                            break
+                        yield dataset, columns, rows
+        finally:
+            await db.rollback()
+
+
+# Online backup and in-place reset
+
+async def backup_database(target_path: str, pages: int, sleep: float, progress=None) -> None:
+    """Copy the live database to target_path with SQLite's online backup API
+
+    The copy runs on the connection's worker thread in steps of `pages`
+    pages. The source connection holds a WAL read transaction for the whole
+    copy: writers keep going, and their commits no longer force SQLite to
+    restart the backup, so the file is one consistent snapshot.
+    """
+    await _checkpoint_votes()
+    target = sqlite3.connect(target_path, check_same_thread=False)
+    try:
+        async with _connect() as db:
+            await db.execute("BEGIN")
+            async with db.execute("SELECT COUNT(*) FROM sqlite_master") as cursor:
+                await cursor.fetchone()
+
+            try:
+                await db.backup(target, pages=pages, progress=progress, sleep=sleep)
+            finally:
+                await db.rollback()
+    finally:
+        target.close()
+
+
+async def reset_data() -> Dict[str, int]:
+    """Delete all entries and votes in one transaction, keeping categories, questions and the audit log"""
+    engine = await _get_engine()
+    if engine is None:
+        return await _delete_data()
+
+    # No votes come in until the memory copy is emptied along with the tables
+    async with engine.lock:
+        await _checkpoint(engine)
+        counts = await _delete_data()
+        engine.clear()
+    return counts
+
+
+async def _delete_data() -> Dict[str, int]:
+    async with _connect() as db:
+        counts = {}
+        for table in ("mc_votes", "votes", "rankings", "ballots", "entries", "blobs"):
+            cursor = await db.execute(f"DELETE FROM {table}")
+            counts[table] = cursor.rowcount
+        # The log itself is kept: replaying it starts over from here
+        await _audit(db, [("data_reset", "*", counts)])
+        await db.commit()
+
+    return counts
+
+
+# Near-duplicate detection by perceptual hash
+
+def _phash_file(upload_dir: str, filename: str) -> Optional[int]:
+    """Perceptual hash of a stored photo, or None if it can't be read"""
+    try:
+        return phash.dhash((Path(upload_dir) / filename).read_bytes())
+    except Exception:
+        return None
+
+
+async def _build_phash_index() -> phash.BKTree:
+    """Load perceptual hashes of active entries into a BK-tree"""
+    upload_dir = events.current().upload_dir
+    tree = phash.BKTree()
+
+    async with _connect() as db:
+        # Backfill photos stored before perceptual hashing existed
+        async with db.execute("SELECT hash, filename FROM blobs WHERE phash IS NULL") as cursor:
+            missing = await cursor.fetchall()
+
+        for blob_hash, filename in missing:
+            value = await asyncio.to_thread(_phash_file, upload_dir, filename)
+            if value is not None:
+                await db.execute(
+                    "UPDATE blobs SET phash = ? WHERE hash = ?",
+                    (phash.to_db(value), blob_hash),
+                )
+        await db.commit()
+
         async with db.execute("""
-            SELECT
-                voter_id,
-                GROUP_CONCAT(category, ', ') as categories,
-                COUNT(*) as vote_count,
-                MAX(CASE WHEN deleted = 1 THEN 1 ELSE 0 END) as has_deleted,
-                MIN(CASE WHEN deleted = 0 THEN 0 ELSE 1 END) as all_deleted
-            FROM votes
-            GROUP BY voter_id
-            ORDER BY MAX(created_at) DESC
+            SELECT e.id, b.phash
+            FROM entries e
+            JOIN blobs b ON b.hash = e.photo_hash
+            WHERE e.deleted = 0 AND b.phash IS NOT NULL
         """) as cursor:
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+            async for entry_id, value in cursor:
+                tree.add(entry_id, phash.from_db(value))
+
+    return tree
 
 
-async def get_mc_votes_grouped_by_voter_admin() -> List[Dict]:
-    """Get MC votes grouped by voter_id (admin only)"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+async def _get_entries_by_id(entry_ids: List[str]) -> Dict[str, Dict]:
+    """Get entries (including deleted) keyed by ID"""
+    if not entry_ids:
+        return {}
+
+    marks = ", ".join("?" for _ in entry_ids)
+    async with _connect() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(f"""
+            SELECT id, name, costume_name, photo_filename, deleted, created_at
+            FROM entries
+            WHERE id IN ({marks})
+        """, entry_ids) as cursor:
+            return {row["id"]: dict(row) for row in await cursor.fetchall()}
+
+
+async def find_similar_entries(photo_phash: int, max_distance: int, exclude_id: Optional[str] = None) -> List[Dict]:
+    """Active entries whose photo is within max_distance bits of photo_phash, closest first"""
+    tree = await _get_index("phash", _build_phash_index)
+    matches = [(entry_id, d) for entry_id, d in tree.search(photo_phash, max_distance) if entry_id != exclude_id]
+
+    entries = await _get_entries_by_id([entry_id for entry_id, _ in matches])
+    return [
+        {**entries[entry_id], "distance": d}
+        for entry_id, d in matches
+        if entry_id in entries
+    ]
+
+
+async def get_duplicate_pairs(max_distance: int) -> List[Dict]:
+    """Pairs of active entries with near-identical photos (admin only)"""
+    tree = await _get_index("phash", _build_phash_index)
+
+    pairs = []
+    for entry_id, value in list(tree.items()):
+        for other_id, d in tree.search(value, max_distance):
+            if other_id > entry_id:
+                pairs.append((entry_id, other_id, d))
+    pairs.sort(key=lambda pair: pair[2])
+
+    entries = await _get_entries_by_id(sorted({entry_id for pair in pairs for entry_id in pair[:2]}))
+    return [
+        {"entry": entries[a], "duplicate": entries[b], "distance": d}
+        for a, b, d in pairs
+        if a in entries and b in entries
+    ]
+
+
+# Photo placeholders
+
+async def _backfill_placeholders() -> int:
+    """Generate placeholders for photos stored before they existed"""
+    upload_dir = events.current().upload_dir
+    async with _connect() as db:
+        async with db.execute("SELECT hash, filename FROM blobs WHERE placeholder IS NULL") as cursor:
+            missing = await cursor.fetchall()
+
+        done = 0
+        for blob_hash, filename in missing:
+            placeholder = await asyncio.to_thread(placeholders.placeholder_for_file, upload_dir, filename)
+            if placeholder is not None:
+                await db.execute("UPDATE blobs SET placeholder = ? WHERE hash = ?", (placeholder, blob_hash))
+                await db.commit()
+                done += 1
+    return done
+
+
+def backfill_placeholders_soon() -> None:
+    """Start generating missing placeholders in the background, once per event"""
+    caches = events.current().caches
+    if "placeholders" not in caches:
+        # The task inherits the current event from the caller's context
+        caches["placeholders"] = asyncio.create_task(_backfill_placeholders())
+
+
+# Entry search
+
+async def _build_search_index() -> search.EntryIndex:
+    """Index the names and costume names of active entries"""
+    index = search.EntryIndex()
+    async with _connect() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute("""
-            SELECT
-                v.voter_id,
-                GROUP_CONCAT(q.question, ' | ') as questions,
-                COUNT(*) as vote_count,
-                MAX(CASE WHEN v.deleted = 1 THEN 1 ELSE 0 END) as has_deleted,
-                MIN(CASE WHEN v.deleted = 0 THEN 0 ELSE 1 END) as all_deleted
-            FROM mc_votes v
-            LEFT JOIN mc_questions q ON v.question_id = q.id
-            GROUP BY v.voter_id
-            ORDER BY MAX(v.created_at) DESC
+            SELECT id, name, costume_name, photo_filename
+            FROM entries
+            WHERE deleted = 0
         """) as cursor:
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+            async for row in cursor:
+                index.add(dict(row))
+    return index
 
 
-async def soft_delete_all_votes_by_voter(voter_id: str) -> int:
-    """Soft delete all votes from a specific voter"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("UPDATE votes SET deleted = 1 WHERE voter_id = ?", (voter_id,))
-        await db.commit()
-        return cursor.rowcount
+async def search_entries(query: str, offset: int, limit: int) -> Tuple[int, List[Dict]]:
+    """Find active entries by name or costume name, best match first
 
+    Returns (total matches, entries on the requested page, each with a score).
+    """
+    index = await _get_index("search", _build_search_index)
+    total, page = index.search(query, offset, limit)
+    return total, [{**entry, "score": round(score, 3)} for entry, score in page]
 
-async def restore_all_votes_by_voter(voter_id: str) -> int:
-    """Restore all votes from a specific voter"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("UPDATE votes SET deleted = 0 WHERE voter_id = ?", (voter_id,))
-        await db.commit()
-        return cursor.rowcount
 
+# Background maintenance (see janitor.py)
 
-async def soft_delete_all_mc_votes_by_voter(voter_id: str) -> int:
-    """Soft delete all MC votes from a specific voter"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("UPDATE mc_votes SET deleted = 1 WHERE voter_id = ?", (voter_id,))
-        await db.commit()
-        return cursor.rowcount
+async def referenced_uploads(filenames: List[str]) -> set:
+    """The given upload filenames that an entry or blob still points at"""
+    marks = ", ".join("?" * len(filenames))
+    async with _connect() as db:
+        async with db.execute(f"""
+            SELECT photo_filename FROM entries WHERE photo_filename IN ({marks})
+            UNION
+            SELECT filename FROM blobs WHERE filename IN ({marks})
+        """, (*filenames, *filenames)) as cursor:
+            return {row[0] for row in await cursor.fetchall()}
 
 
-async def restore_all_mc_votes_by_voter(voter_id: str) -> int:
-    """Restore all MC votes from a specific voter"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("UPDATE mc_votes SET deleted = 0 WHERE voter_id = ?", (voter_id,))
+async def purge_deleted_entries(deleted_before: str, limit: int) -> Tuple[int, List[str]]:
+    """Permanently remove up to `limit` entries soft-deleted before a timestamp
+
+    Their votes are kept. Each purged entry drops its reference on its photo;
+    photos nobody references any more lose their blob row (perceptual hash
+    and placeholder) too. Returns (entries purged, photo files to delete).
+    """
+    async with _connect() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        async with db.execute("""
+            SELECT id, photo_filename, photo_hash
+            FROM entries
+            WHERE deleted = 1 AND deleted_at < ?
+            ORDER BY deleted_at
+            LIMIT ?
+        """, (deleted_before, limit)) as cursor:
+            purged = await cursor.fetchall()
+        if not purged:
+            await db.rollback()
+            return 0, []
+
+        entry_ids = [entry_id for entry_id, _, _ in purged]
+        marks = ", ".join("?" * len(entry_ids))
+        await db.execute(f"DELETE FROM entries WHERE id IN ({marks})", entry_ids)
+        photo_hashes = [photo_hash for _, _, photo_hash in purged if photo_hash]
+        await db.executemany("UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = ?",
+                             [(photo_hash,) for photo_hash in photo_hashes])
+        unused_blobs = []
+        if photo_hashes:
+            hash_marks = ", ".join("?" * len(photo_hashes))
+            async with db.execute(f"""
+                SELECT hash, filename FROM blobs WHERE hash IN ({hash_marks}) AND ref_count <= 0
+            """, photo_hashes) as cursor:
+                unused_blobs = await cursor.fetchall()
+            await db.executemany("DELETE FROM blobs WHERE hash = ?", [(photo_hash,) for photo_hash, _ in unused_blobs])
+
+        # A file can only go once no entry (not even a legacy one without a blob) uses its name
+        candidates = {filename for _, filename in unused_blobs}
+        candidates.update(filename for _, filename, photo_hash in purged if not photo_hash)
+        unused_files = []
+        for filename in sorted(candidates):
+            async with db.execute("SELECT 1 FROM entries WHERE photo_filename = ? LIMIT 1", (filename,)) as cursor:
+                if not await cursor.fetchone():
+                    unused_files.append(filename)
+
+        await _audit(db, [("entry_purged", entry_id, None) for entry_id in entry_ids])
         await db.commit()
-        return cursor.rowcount
+
+    engine = _engines.get(events.current().db_path)
+    if engine:
+        engine.entry_ids.difference_update(entry_ids)
+    return len(entry_ids), unused_files
+
+
+# Databases bigger than this are not converted to incremental auto-vacuum,
+# since the conversion (a full VACUUM) would hold the write lock too long
+CONVERT_MAX_BYTES = 64 * 1024 * 1024
+
+
+async def compact_database(max_pages: int) -> int:
+    """Hand up to max_pages free pages back to the file system, returning how many
+
+    Databases created before incremental auto-vacuum was enabled are
+    converted first, with one full VACUUM, if they are small enough.
+    """
+    async with _connect() as db:
+        async with db.execute("PRAGMA auto_vacuum") as cursor:
+            (auto_vacuum,) = await cursor.fetchone()
+        if auto_vacuum != 2:  # INCREMENTAL
+            async with db.execute("PRAGMA page_count") as cursor:
+                (page_count,) = await cursor.fetchone()
+            async with db.execute("PRAGMA page_size") as cursor:
+                (page_size,) = await cursor.fetchone()
+            if page_count * page_size > CONVERT_MAX_BYTES:
+                return 0
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+
+        async with db.execute("PRAGMA freelist_count") as cursor:
+            (free_pages,) = await cursor.fetchone()
+        if not free_pages:
+            return 0
+        # The pragma frees one page per step, and only executescript() steps it to the end
+        await db.executescript(f"PRAGMA incremental_vacuum({int(max_pages)})")
+        async with db.execute("PRAGMA freelist_count") as cursor:
+            (still_free,) = await cursor.fetchone()
+        return free_pages - still_free
+
+
+async def optimize_database() -> None:
+    """Let SQLite refresh the statistics its query planner relies on, where they are stale"""
+    async with _connect() as db:
+        await db.execute("PRAGMA optimize")
@@ -0,0 +1,219 @@
+"""
+Event registry: several parties can run side by side, each isolated in its
+own SQLite database and uploads directory
+"""
+import asyncio
+import re
+from collections import OrderedDict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiosqlite
+from config import (
+    DATABASE_PATH,
+    UPLOAD_DIR,
+    DEFAULT_EVENT_ID,
+    EVENTS_DATABASE_PATH,
+    EVENTS_DIR,
+    EVENT_CACHE_SIZE,
+)
+import passwords
+
+EVENT_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,39}$")
+
+
+class EventContext:
+    """Everything scoped to one event: database file, uploads, password hashes and caches
+
+    The default event has no password hashes: its passwords are the configured ones.
+    """
+
+    def __init__(
+        self,
+        event_id: str,
+        name: str,
+        db_path: str,
+        upload_dir: str,
+        results_password_hash: Optional[str],
+        admin_password_hash: Optional[str],
+    ):
+        self.id = event_id
+        self.name = name
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+        self.results_password_hash = results_password_hash
+        self.admin_password_hash = admin_password_hash
+        # In-memory caches for this event, dropped on reset or eviction
+        self.caches: Dict[str, object] = {}
+        # Tasks scoped to this event with use(); a handle in use is never evicted,
+        # so its writes and the caches later requests read stay the same ones
+        self.users = 0
+        self.initialized = False
+        self.init_lock = asyncio.Lock()
+        # Serializes category/question changes so snapshots are swapped in order
+        self.catalog_lock = asyncio.Lock()
+
+    @property
+    def is_default(self) -> bool:
+        return self.id == DEFAULT_EVENT_ID
+
+    @property
+    def api_prefix(self) -> str:
+        """Prefix clients use to reach this event's API"""
+        return "/api" if self.is_default else f"/api/events/{self.id}"
+
+
+# The default event keeps the original single-party layout and config passwords
+_default_event = EventContext(
+    DEFAULT_EVENT_ID,
+    "Default",
+    DATABASE_PATH,
+    UPLOAD_DIR,
+    None,
+    None,
+)
+
+# Loaded events, least recently used first
+_loaded: "OrderedDict[str, EventContext]" = OrderedDict()
+_current: ContextVar[Optional[EventContext]] = ContextVar("current_event", default=None)
+
+
+def current() -> EventContext:
+    """Get the event the current request is scoped to"""
+    return _current.get() or _default_event
+
+
+def use(event: EventContext):
+    """Scope the current task to an event, returning a token for reset()"""
+    event.users += 1
+    return _current.set(event)
+
+
+def reset(token) -> None:
+    """Undo a previous use()"""
+    current().users -= 1
+    _current.reset(token)
+
+
+def default_event() -> EventContext:
+    """Get the default event"""
+    return _default_event
+
+
+def loaded_events() -> List[EventContext]:
+    """Get the default event and the other events currently loaded"""
+    return [_default_event, *_loaded.values()]
+
+
+def _event_paths(event_id: str):
+    event_dir = Path(EVENTS_DIR) / event_id
+    return str(event_dir / "halloween.db"), str(event_dir / "uploads")
+
+
+async def init_registry():
+    """Create the event registry table"""
+    async with aiosqlite.connect(EVENTS_DATABASE_PATH) as db:
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                results_password TEXT NOT NULL,
+                admin_password TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Registries from before password hashing kept the passwords in plaintext
+        async with db.execute("SELECT id, results_password, admin_password FROM events") as cursor:
+            rows = await cursor.fetchall()
+        for event_id, results_password, admin_password in rows:
+            if passwords.is_hash(results_password) and passwords.is_hash(admin_password):
+                continue
+            if not passwords.is_hash(results_password):
+                results_password = await asyncio.to_thread(passwords.hash_password, results_password)
+            if not passwords.is_hash(admin_password):
+                admin_password = await asyncio.to_thread(passwords.hash_password, admin_password)
+            await db.execute("""
+                UPDATE events SET results_password = ?, admin_password = ? WHERE id = ?
+            """, (results_password, admin_password, event_id))
+            print(f"🔒 Hashed the passwords of event {event_id}")
+        await db.commit()
+
+
+async def create_event(event_id: str, name: str, results_password: str, admin_password: str) -> EventContext:
+    """Register a new event and create its directories (only password hashes are stored)"""
+    if not EVENT_ID_PATTERN.match(event_id) or event_id == DEFAULT_EVENT_ID:
+        raise ValueError("Event ID must be lowercase letters, digits and dashes")
+
+    results_password = await asyncio.to_thread(passwords.hash_password, results_password)
+    admin_password = await asyncio.to_thread(passwords.hash_password, admin_password)
+
+    async with aiosqlite.connect(EVENTS_DATABASE_PATH) as db:
+        try:
+            await db.execute("""
+                INSERT INTO events (id, name, results_password, admin_password)
+                VALUES (?, ?, ?, ?)
+            """, (event_id, name, results_password, admin_password))
+        except aiosqlite.IntegrityError:
+            raise ValueError("Event already exists")
+        await db.commit()
+
+    db_path, upload_dir = _event_paths(event_id)
+    Path(upload_dir).mkdir(parents=True, exist_ok=True)
+
+    return await get_event(event_id)
+
+
+async def list_events() -> List[Dict]:
+    """Get all registered events (without passwords)"""
+    async with aiosqlite.connect(EVENTS_DATABASE_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute("""
+            SELECT id, name, created_at
+            FROM events
+            ORDER BY created_at
+        """) as cursor:
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+
+
+async def get_event(event_id: str) -> Optional[EventContext]:
+    """Get an event handle, loading it lazily and evicting the least recently used idle ones"""
+    if event_id == DEFAULT_EVENT_ID:
+        return _default_event
+
+    event = _loaded.get(event_id)
+    if event:
+        _loaded.move_to_end(event_id)
+        return event
+
+    async with aiosqlite.connect(EVENTS_DATABASE_PATH) as db:
+        async with db.execute("""
+            SELECT id, name, results_password, admin_password
+            FROM events
+            WHERE id = ?
+        """, (event_id,)) as cursor:
+            row = await cursor.fetchone()
+
+    if not row:
+        return None
+
+    # Another request may have loaded it while we were reading the registry
+    event = _loaded.get(event_id)
+    if event:
+        _loaded.move_to_end(event_id)
+        return event
+
+    db_path, upload_dir = _event_paths(event_id)
+    event = EventContext(row[0], row[1], db_path, upload_dir, row[2], row[3])
+    Path(upload_dir).mkdir(parents=True, exist_ok=True)
+
+    _loaded[event_id] = event
+    # Handles still in use stay loaded (the cache may briefly grow past its size):
+    # a replacement would start with fresh caches their writes never reach
+    idle = [loaded_id for loaded_id, loaded in _loaded.items() if not loaded.users and loaded_id != event_id]
+    for loaded_id in idle[:max(len(_loaded) - EVENT_CACHE_SIZE, 0)]:
+        del _loaded[loaded_id]
+
+    return event
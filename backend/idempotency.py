@@ -0,0 +1,223 @@
+"""
+Idempotency-Key support for write requests
+
+A client that may retry a POST/PUT/PATCH/DELETE sends a random
+Idempotency-Key header. The first request with a key runs normally and its
+response is remembered; repeats get that response replayed without running
+the handler again (no database or image work), and repeats that arrive
+while the first one is still running wait for its result.
+
+Keys are scoped to the caller's credentials, so a response is only replayed
+to a request with the same Authorization header, and answers that a retry
+may well change (missing auth, conflicts, rate limits) are never stored.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_MAX_BODY_BYTES
+import events
+
+HEADER = b"idempotency-key"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+MAX_KEY_LENGTH = 255
+# Not final: the same request may succeed once the caller logs in or retries later
+UNSTORED_STATUSES = {401, 403, 408, 409, 429}
+
+
+class _Record:
+    """A request seen with a key: in flight until its response is stored"""
+
+    __slots__ = ("fingerprint", "expires_at", "done", "response")
+
+    def __init__(self, fingerprint: Optional[str], expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.done = asyncio.Event()
+        # (status, headers, body) once finished; None if it must not be replayed
+        self.response: Optional[Tuple[int, List[Tuple[bytes, bytes]], bytes]] = None
+
+
+class IdempotencyStore:
+    """Bounded, expiring map of idempotency keys to responses, oldest first"""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._records: "OrderedDict[Tuple[str, str, str, str], _Record]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _prune(self) -> None:
+        # Every record lives for the same TTL, so expired ones are at the front
+        now = time.monotonic()
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record.expires_at > now and len(self._records) <= self.max_keys:
+                break
+            self._records.popitem(last=False)
+
+    def get(self, key) -> Optional[_Record]:
+        self._prune()
+        return self._records.get(key)
+
+    def start(self, key, fingerprint: Optional[str]) -> _Record:
+        record = _Record(fingerprint, time.monotonic() + self.ttl)
+        self._records[key] = record
+        self._prune()
+        return record
+
+    def discard(self, key, record: _Record) -> None:
+        if self._records.get(key) is record:
+            del self._records[key]
+
+
+def _store() -> IdempotencyStore:
+    """The current event's store (dropped with its other caches on reset)"""
+    caches = events.current().caches
+    store = caches.get("idempotency")
+    if store is None:
+        store = caches["idempotency"] = IdempotencyStore()
+    return store
+
+
+async def _read_body(receive) -> Tuple[bytes, List[Dict]]:
+    """Read the whole request body, keeping the messages to hand on unchanged"""
+    messages = []
+    chunks = []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks), messages
+
+
+def _replay(messages: List[Dict], receive):
+    """A receive() that yields already-read messages, then defers to the real one"""
+    pending = list(messages)
+
+    async def replay_receive():
+        if pending:
+            return pending.pop(0)
+        return await receive()
+
+    return replay_receive
+
+
+def _credentials(authorization: bytes) -> str:
+    """Digest of the Authorization header (tokens are never kept in the store)"""
+    return hashlib.sha256(authorization).hexdigest() if authorization else ""
+
+
+def _fingerprint(body: bytes, content_type: bytes) -> str:
+    """Digest of a request body, ignoring the random multipart boundary"""
+    _, _, boundary = content_type.partition(b"boundary=")
+    boundary = boundary.split(b";")[0].strip(b' "')
+    if boundary:
+        body = body.replace(boundary, b"")
+    return hashlib.sha256(body).hexdigest()
+
+
+async def _send_stored(response, send) -> None:
+    status, headers, body = response
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers + [(b"idempotent-replayed", b"true")],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Deduplicate write requests that carry an Idempotency-Key header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        raw_key = request_headers.get(HEADER)
+        if raw_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not raw_key or len(raw_key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": "Invalid Idempotency-Key"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        # The same key may be reused for a different endpoint or request body
+        # only by mistake; the body fingerprint catches that
+        body, messages = await _read_body(receive)
+        fingerprint = _fingerprint(body, request_headers.get(b"content-type", b""))
+        key = (
+            scope["method"],
+            scope["path"],
+            raw_key.decode("latin-1"),
+            _credentials(request_headers.get(b"authorization", b"")),
+        )
+        store = _store()
+
+        while True:
+            record = store.get(key)
+            if record is None:
+                break
+
+            if record.fingerprint != fingerprint:
+                response = JSONResponse(
+                    {"detail": "Idempotency-Key was already used for a different request"},
+                    status_code=422,
+                )
+                await response(scope, receive, send)
+                return
+
+            await record.done.wait()
+            if record.response is not None:
+                await _send_stored(record.response, send)
+                return
+            # The first attempt failed without a replayable response: run it again
+
+        record = store.start(key, fingerprint)
+        status = None
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        size = 0
+
+        async def capture_send(message):
+            nonlocal status, headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body" and size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                chunks.append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, _replay(messages, receive), capture_send)
+        finally:
+            # Server errors and UNSTORED_STATUSES are worth retrying for real; everything else is final
+            if (
+                status is not None
+                and status < 500
+                and status not in UNSTORED_STATUSES
+                and size <= IDEMPOTENCY_MAX_BODY_BYTES
+            ):
+                record.response = (status, headers, b"".join(chunks))
+            else:
+                store.discard(key, record)
+            record.done.set()
@@ -0,0 +1,246 @@
+"""
+Background janitor: tidies uploads and the database while the server is idle
+
+Each pass over an event
+  1. reconciles uploads/ with the entries and blobs tables, one directory
+     (at most JANITOR_BATCH_SIZE files) at a time, moving files nothing
+     refers to into quarantine/ next to uploads/ (e.g. the photo of an upload
+     whose entry failed to save, or a temporary file left by a crash),
+  2. purges entries deleted more than JANITOR_PURGE_AFTER_DAYS ago, with
+     photos no other entry uses (off by default),
+  3. hands free database pages back to the file system and runs PRAGMA optimize.
+
+A pass is an async generator that yields after every bounded step. The
+janitor runs at most one step per tick, and only while no request is in
+flight and none has come in for JANITOR_IDLE_SECONDS, so it never holds up
+voting.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+import database
+import events
+import storage
+from config import (
+    JANITOR_TICK_SECONDS,
+    JANITOR_IDLE_SECONDS,
+    JANITOR_PASS_SECONDS,
+    JANITOR_BATCH_SIZE,
+    JANITOR_GRACE_SECONDS,
+    JANITOR_VACUUM_PAGES,
+    JANITOR_PURGE_AFTER_DAYS,
+    QUARANTINE_DIR,
+)
+
+
+class _Activity:
+    """Requests in flight and when the last one arrived"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.last_request = 0.0
+
+    def idle_for(self) -> float:
+        """Seconds without any request (0 while one is in flight)"""
+        return 0.0 if self.in_flight else time.monotonic() - self.last_request
+
+
+_activity = _Activity()
+
+
+class ActivityMiddleware:
+    """Tells the janitor when the server is busy"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        _activity.in_flight += 1
+        _activity.last_request = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _activity.in_flight -= 1
+
+
+def _upload_dirs(upload_dir: Path) -> List[str]:
+    """The upload directory itself (legacy flat names) and its shard directories"""
+    if not upload_dir.is_dir():
+        return []
+    return [""] + sorted(entry.name for entry in os.scandir(upload_dir) if entry.is_dir())
+
+
+def _list_files(upload_dir: Path, directory: str) -> List[str]:
+    """Files in one upload directory, as names relative to the upload directory
+
+    Hidden files are skipped (.gitkeep), except temporary files from
+    storage.write_blob().
+    """
+    try:
+        found = list(os.scandir(upload_dir / directory))
+    except FileNotFoundError:
+        return []
+    return sorted(
+        f"{directory}/{entry.name}" if directory else entry.name
+        for entry in found
+        if entry.is_file() and (not entry.name.startswith(".") or entry.name.endswith(".tmp"))
+    )
+
+
+def _quarantine(upload_dir: Path, quarantine_dir: Path, filenames: List[str], modified_before: float) -> int:
+    """Move files last modified before a time into quarantine, returning how many moved"""
+    moved = 0
+    for filename in filenames:
+        path = upload_dir / filename
+        try:
+            if path.stat().st_mtime >= modified_before:
+                continue  # Maybe an upload whose entry is still being saved
+        except FileNotFoundError:
+            continue
+
+        target = quarantine_dir / filename
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists():
+            target = target.with_name(f"{target.stem}-{int(time.time())}{target.suffix}")
+        os.replace(path, target)
+        moved += 1
+    return moved
+
+
+# Per event: the pass in progress, and what the janitor has done so far
+_passes: Dict[str, AsyncIterator[None]] = {}
+_status: Dict[str, Dict] = {}
+_task: Optional[asyncio.Task] = None
+
+
+def _event_status(event_id: str) -> Dict:
+    return _status.setdefault(event_id, {
+        "passes": 0,
+        "last_pass_finished_at": None,
+        "next_pass_at": 0.0,  # time.monotonic()
+        "quarantined_files": 0,
+        "purged_entries": 0,
+        "deleted_files": 0,
+        "freed_pages": 0,
+        "last_error": None,
+    })
+
+
+async def _sweep(event: events.EventContext) -> AsyncIterator[None]:
+    """One pass over an event, yielding after every bounded step"""
+    status = _event_status(event.id)
+    upload_dir = Path(event.upload_dir)
+    quarantine_dir = upload_dir.parent / QUARANTINE_DIR
+
+    for directory in await asyncio.to_thread(_upload_dirs, upload_dir):
+        filenames = await asyncio.to_thread(_list_files, upload_dir, directory)
+        for start in range(0, len(filenames), JANITOR_BATCH_SIZE):
+            batch = filenames[start:start + JANITOR_BATCH_SIZE]
+            referenced = await database.referenced_uploads(batch)
+            orphans = [filename for filename in batch if filename not in referenced]
+            if orphans:
+                status["quarantined_files"] += await asyncio.to_thread(
+                    _quarantine, upload_dir, quarantine_dir, orphans, time.time() - JANITOR_GRACE_SECONDS
+                )
+            yield
+
+    if JANITOR_PURGE_AFTER_DAYS > 0:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=JANITOR_PURGE_AFTER_DAYS)
+        while True:
+            purged, unused_files = await database.purge_deleted_entries(
+                cutoff.strftime("%Y-%m-%d %H:%M:%S"), JANITOR_BATCH_SIZE
+            )
+            await asyncio.to_thread(storage.remove_files, event.upload_dir, unused_files)
+            status["purged_entries"] += purged
+            status["deleted_files"] += len(unused_files)
+            yield
+            if purged < JANITOR_BATCH_SIZE:
+                break
+
+    while True:
+        freed = await database.compact_database(JANITOR_VACUUM_PAGES)
+        status["freed_pages"] += freed
+        yield
+        if freed < JANITOR_VACUUM_PAGES:
+            break
+
+    await database.optimize_database()
+
+
+async def _step(event: events.EventContext) -> None:
+    """Advance an event's pass by one step, starting a new pass if needed"""
+    status = _event_status(event.id)
+    token = events.use(event)
+    try:
+        await database.ensure_initialized()
+        sweep = _passes.get(event.id)
+        if sweep is None:
+            sweep = _passes[event.id] = _sweep(event)
+        await anext(sweep)
+        return
+    except StopAsyncIteration:
+        status["passes"] += 1
+        status["last_pass_finished_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        status["last_error"] = None
+    except Exception as error:
+        print(f"⚠️  Janitor pass over event {event.id} failed: {error}")
+        status["last_error"] = str(error)
+    finally:
+        events.reset(token)
+
+    # The pass is over (done or failed, maybe before it was registered): the next one starts after a pause
+    _passes.pop(event.id, None)
+    status["next_pass_at"] = time.monotonic() + JANITOR_PASS_SECONDS
+
+
+async def _run() -> None:
+    while True:
+        await asyncio.sleep(JANITOR_TICK_SECONDS)
+        if _activity.idle_for() < JANITOR_IDLE_SECONDS:
+            continue
+
+        # Events with a pass under way first, then ones that are due
+        now = time.monotonic()
+        due = [
+            event for event in events.loaded_events()
+            if event.id in _passes or _event_status(event.id)["next_pass_at"] <= now
+        ]
+        if not due:
+            continue
+
+        # A step that fails unexpectedly must not end the janitor until the next restart
+        try:
+            await _step(min(due, key=lambda event: event.id not in _passes))
+        except Exception as error:
+            print(f"⚠️  Janitor step failed: {error}")
+
+
+def start() -> None:
+    """Start the janitor in the background"""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+def stop() -> None:
+    global _task
+    if _task:
+        _task.cancel()
+        _task = None
+
+
+def get_status(event_id: str) -> Dict:
+    """What the janitor has done for an event since the server started"""
+    status = dict(_event_status(event_id))
+    status["pass_in_progress"] = event_id in _passes
+    status["idle_seconds"] = round(_activity.idle_for(), 1)
+    del status["next_pass_at"]
+    return status
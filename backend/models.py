@@ -18,9 +18,42 @@ class Entry(BaseModel):
     name: str
     costume_name: str
     photo_url: str
+    placeholder: Optional[str] = None  # Tiny blurred preview (data URI) to show while the photo loads
     created_at: datetime
 
 
+class SimilarEntry(BaseModel):
+    """Model for an entry whose photo looks like another one"""
+    id: str
+    name: str
+    costume_name: str
+    photo_url: str
+    distance: int  # Differing bits between the perceptual hashes (0-64)
+
+
+class EntrySearchResult(BaseModel):
+    """Model for an entry found by search"""
+    id: str
+    name: str
+    costume_name: str
+    photo_url: str
+    score: float  # Higher is a closer match
+
+
+class EntrySearchResponse(BaseModel):
+    """Model for one page of entry search results"""
+    query: str
+    total: int
+    offset: int
+    limit: int
+    results: list[EntrySearchResult]
+
+
+class EntryCreated(Entry):
+    """Model for a newly created entry, with look-alike entries to warn about"""
+    possible_duplicates: list[SimilarEntry] = []
+
+
 class VoteCreate(BaseModel):
     """Model for creating a vote"""
     category: str = Field(..., min_length=1)
@@ -38,25 +71,49 @@ class Vote(BaseModel):
 
 
 class CategoryResult(BaseModel):
-    """Model for vote results in a category"""
+    """Model for vote results in a category
+
+    For ranked categories vote_count is the entry's votes in the last
+    instant-runoff round it took part in; for Borda categories it counts
+    first choices, and points decide the order.
+    """
     entry_id: str
     name: str
     costume_name: str
     photo_url: str
     vote_count: int
+    points: Optional[int] = None  # Borda categories only
+
+
+class RunoffRound(BaseModel):
+    """Model for one instant-runoff round"""
+    round: int
+    counts: dict[str, int]  # entry_id -> votes, most first
+    exhausted: int  # Ballots with none of their choices left in the race
+    elected: Optional[str] = None
+    eliminated: list[str]
+    transfers: dict[str, int]  # entry_id -> votes it gained from the eliminated entries
 
 
 class ResultsResponse(BaseModel):
     """Model for results by category"""
     category: str
+    mode: str = "single"
     results: list[CategoryResult]
+    rounds: list[RunoffRound] = []  # Ranked categories only
 
 
 class Category(BaseModel):
-    """Model for a category"""
+    """Model for a category
+
+    mode is "single" (pick one entry), "ranked" (instant runoff) or "borda";
+    the latter two take a ranking of up to max_choices entries.
+    """
     id: str
     name: str
     order: int
+    mode: str = "single"
+    max_choices: int = 1
 
 
 class ResultsRequest(BaseModel):
@@ -85,6 +142,27 @@ class MCVoteCreate(BaseModel):
     voter_id: Optional[str] = None
 
 
+class BallotCreate(BaseModel):
+    """Model for submitting a whole ballot at once
+
+    ballot_id is generated by the client and reused for every retry, so the
+    server applies each ballot only once.
+    """
+    ballot_id: str = Field(..., min_length=8, max_length=64)
+    voter_id: Optional[str] = None
+    votes: dict[str, str] = {}  # category -> entry_id
+    mc_votes: dict[str, str] = {}  # question_id -> option_id
+    rankings: dict[str, list[str]] = {}  # category -> entry_ids, first choice first
+
+
+class VoterBallot(BaseModel):
+    """Model for a voter's current choices"""
+    voter_id: str
+    votes: dict[str, str]  # category -> entry_id
+    mc_votes: dict[str, str]  # question_id -> option_id
+    rankings: dict[str, list[str]] = {}  # category -> entry_ids, first choice first
+
+
 class MCOptionResult(BaseModel):
     """Model for multiple choice option results"""
     option_id: str
@@ -106,6 +184,90 @@ class AdminAuthRequest(BaseModel):
     password: str
 
 
+class AdminResetRequest(BaseModel):
+    """Model for an in-place data reset"""
+    archive_uploads: bool = True  # Move uploads aside instead of leaving them in place
+
+
+class AdminProfileRequest(BaseModel):
+    """Model for starting the sampling profiler"""
+    seconds: float = 10  # Up to PROFILER_MAX_SECONDS
+
+
+class EventCategory(BaseModel):
+    """Model for a category when creating an event"""
+    id: str = Field(..., min_length=1)
+    name: str = Field(..., min_length=1)
+    order: int
+    mode: str = Field("single", pattern="^(single|ranked|borda)$")
+
+
+class EventMCOption(BaseModel):
+    """Model for a multiple choice option when creating an event"""
+    id: str = Field(..., min_length=1)
+    text: str = Field(..., min_length=1)
+
+
+class EventMCQuestion(BaseModel):
+    """Model for a multiple choice question when creating an event"""
+    id: str = Field(..., min_length=1)
+    question: str = Field(..., min_length=1)
+    order: int
+    options: list[EventMCOption]
+
+
+class EventCreateRequest(BaseModel):
+    """Model for creating an event (categories default to the ones in config)"""
+    id: str = Field(..., min_length=1, max_length=40)
+    name: str = Field(..., min_length=1, max_length=100)
+    results_password: str = Field(..., min_length=1)
+    admin_password: str = Field(..., min_length=1)
+    categories: Optional[list[EventCategory]] = None
+    mc_questions: Optional[list[EventMCQuestion]] = None
+
+
+class CatalogCategoryCreate(BaseModel):
+    """Model for adding a voting category at runtime"""
+    id: str = Field(..., min_length=1, max_length=40)
+    name: str = Field(..., min_length=1, max_length=100)
+    display_order: Optional[int] = None  # Appended after the others if omitted
+    voting_mode: str = "single"  # "single", "ranked" or "borda"
+
+
+class CatalogCategoryUpdate(BaseModel):
+    """Model for renaming, moving, retiring or changing the voting mode of a category (omitted fields are unchanged)"""
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    display_order: Optional[int] = None
+    retired: Optional[bool] = None
+    voting_mode: Optional[str] = None
+
+
+class CatalogMCQuestionCreate(BaseModel):
+    """Model for adding a multiple choice question at runtime"""
+    id: str = Field(..., min_length=1, max_length=40)
+    question: str = Field(..., min_length=1, max_length=200)
+    display_order: Optional[int] = None  # Appended after the others if omitted
+    options: list[EventMCOption] = Field(..., min_length=1)
+
+
+class CatalogMCQuestionUpdate(BaseModel):
+    """Model for rewording, moving or retiring a question (omitted fields are unchanged)"""
+    question: Optional[str] = Field(None, min_length=1, max_length=200)
+    display_order: Optional[int] = None
+    retired: Optional[bool] = None
+
+
+class CatalogMCOptionUpdate(BaseModel):
+    """Model for rewording or retiring an option (omitted fields are unchanged)"""
+    text: Optional[str] = Field(None, min_length=1, max_length=200)
+    retired: Optional[bool] = None
+
+
+class CatalogOrder(BaseModel):
+    """Model for reordering categories or questions"""
+    ids: list[str] = Field(..., min_length=1)
+
+
 class AdminEntry(BaseModel):
     """Model for admin entry view (includes deleted flag)"""
     id: str
@@ -116,6 +278,13 @@ class AdminEntry(BaseModel):
     created_at: datetime
 
 
+class AdminDuplicatePair(BaseModel):
+    """Model for two active entries with near-identical photos"""
+    entry: SimilarEntry
+    duplicate: SimilarEntry
+    distance: int
+
+
 class AdminVote(BaseModel):
     """Model for admin vote view (includes deleted flag and entry details)"""
     id: str
@@ -0,0 +1,38 @@
+"""
+Salted password hashes for the event registry
+
+Event passwords are stored as "pbkdf2_sha256$<iterations>$<salt>$<digest>",
+never in plaintext. Hashing is deliberately slow, so callers on the event
+loop should run it in a thread.
+"""
+import hashlib
+import hmac
+import secrets
+
+SCHEME = "pbkdf2_sha256"
+ITERATIONS = 200_000
+
+
+def _digest(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations).hex()
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with a random salt, for storing"""
+    salt = secrets.token_hex(16)
+    return f"{SCHEME}${ITERATIONS}${salt}${_digest(password, salt, ITERATIONS)}"
+
+
+def is_hash(value: str) -> bool:
+    """Whether a stored value is a hash_password() hash (older registries kept plaintext)"""
+    return value.startswith(f"{SCHEME}$")
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    """Check a password against a hash_password() hash in constant time"""
+    scheme, _, rest = password_hash.partition("$")
+    iterations, _, rest = rest.partition("$")
+    salt, _, expected = rest.partition("$")
+    if scheme != SCHEME or not iterations.isdigit() or not expected:
+        return False
+    return hmac.compare_digest(_digest(password, salt, int(iterations)), expected)
@@ -0,0 +1,131 @@
+"""
+Perceptual hashing and near-duplicate lookup for costume photos
+
+Each photo gets a 64-bit difference hash (dHash): re-taken or re-encoded
+shots of the same costume land within a few bits of each other. Hashes are
+kept in a BK-tree so "which entries are within N bits of this photo" only
+visits a small part of the tree instead of every entry.
+"""
+from io import BytesIO
+from typing import Dict, List, Optional, Set, Tuple
+
+HASH_BITS = 64
+_SIGN_BIT = 1 << (HASH_BITS - 1)
+_MASK = (1 << HASH_BITS) - 1
+
+
+def dhash(contents: bytes) -> int:
+    """64-bit difference hash of an image's contents"""
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(contents)) as img:
+        img = ImageOps.exif_transpose(img)
+        small = img.convert("L").resize((9, 8), Image.LANCZOS)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def to_db(value: int) -> int:
+    """Store an unsigned 64-bit hash in SQLite's signed INTEGER"""
+    return value - (1 << HASH_BITS) if value & _SIGN_BIT else value
+
+
+def from_db(value: int) -> int:
+    """Read a hash stored with to_db()"""
+    return value & _MASK
+
+
+def distance(a: int, b: int) -> int:
+    """Hamming distance between two hashes"""
+    return bin(a ^ b).count("1")
+
+
+class _Node:
+    __slots__ = ("hash", "entry_ids", "children")
+
+    def __init__(self, value: int):
+        self.hash = value
+        self.entry_ids: Set[str] = set()
+        self.children: Dict[int, "_Node"] = {}
+
+
+class BKTree:
+    """BK-tree over Hamming distance mapping hashes to entry IDs
+
+    Removing an entry only drops its ID from the node, so the tree shape
+    stays valid; nodes without IDs are skipped in results.
+    """
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._hash_of: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._hash_of)
+
+    def add(self, entry_id: str, value: int) -> None:
+        """Index an entry's hash"""
+        self.remove(entry_id)
+        self._hash_of[entry_id] = value
+
+        if self._root is None:
+            self._root = _Node(value)
+            self._root.entry_ids.add(entry_id)
+            return
+
+        node = self._root
+        while True:
+            d = distance(value, node.hash)
+            if d == 0:
+                node.entry_ids.add(entry_id)
+                return
+            child = node.children.get(d)
+            if child is None:
+                child = node.children[d] = _Node(value)
+                child.entry_ids.add(entry_id)
+                return
+            node = child
+
+    def remove(self, entry_id: str) -> None:
+        """Stop returning an entry from searches"""
+        value = self._hash_of.pop(entry_id, None)
+        if value is None:
+            return
+
+        node = self._root
+        while node is not None:
+            d = distance(value, node.hash)
+            if d == 0:
+                node.entry_ids.discard(entry_id)
+                return
+            node = node.children.get(d)
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[str, int]]:
+        """All (entry_id, distance) within max_distance bits, closest first"""
+        matches = []
+        stack = [self._root] if self._root else []
+
+        while stack:
+            node = stack.pop()
+            d = distance(value, node.hash)
+            if d <= max_distance:
+                matches.extend((entry_id, d) for entry_id in node.entry_ids)
+
+            # Triangle inequality: only children in [d - r, d + r] can match
+            for child_distance, child in node.children.items():
+                if d - max_distance <= child_distance <= d + max_distance:
+                    stack.append(child)
+
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def items(self):
+        """All indexed (entry_id, hash) pairs"""
+        return self._hash_of.items()
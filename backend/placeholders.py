@@ -0,0 +1,37 @@
+"""
+Tiny blurred previews of costume photos
+
+Each photo gets a thumbnail a few pixels wide, sent inline as a data URI with
+the entry list. The vote page stretches and blurs it in the photo's place
+until the real image has loaded (or while it is scrolled far away), so the
+grid has the right colours without downloading every photo.
+"""
+import base64
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+PLACEHOLDER_SIZE = 16  # Longest side in pixels
+PLACEHOLDER_QUALITY = 40
+
+
+def make_placeholder(contents: bytes) -> str:
+    """JPEG data URI of a tiny thumbnail of an image (a few hundred bytes)"""
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(contents)) as img:
+        img.draft("RGB", (PLACEHOLDER_SIZE * 8, PLACEHOLDER_SIZE * 8))  # Cheap JPEG downscale on decode
+        small = ImageOps.exif_transpose(img).convert("RGB")
+        small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+
+    buffer = BytesIO()
+    small.save(buffer, "JPEG", quality=PLACEHOLDER_QUALITY, optimize=True)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def placeholder_for_file(upload_dir: str, filename: str) -> Optional[str]:
+    """Placeholder for a stored photo, or None if it is missing or unreadable"""
+    try:
+        return make_placeholder((Path(upload_dir) / filename).read_bytes())
+    except Exception:
+        return None
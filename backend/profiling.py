@@ -0,0 +1,529 @@
+"""
+On-demand profiling: a sampling profiler and a slow-request log
+
+The sampling profiler is a background thread that, while switched on, reads
+every thread's stack every PROFILER_INTERVAL_SECONDS and counts identical
+stacks. A finished profile is served as collapsed stacks ("thread;outer;inner
+count" per line), which flamegraph.pl, speedscope and inferno read as is.
+
+RequestTimingMiddleware times every request. Database connections opened
+through connect(), blocks wrapped in phase() and routes declared with
+TimedRoute add to the request's breakdown; a request slower than
+SLOW_REQUEST_MS is kept along with the query plans of its slowest
+statements. Only the last SLOW_REQUEST_LOG_SIZE requests and PROFILER_KEEP
+profiles are kept.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+import aiosqlite
+from fastapi.routing import APIRoute
+
+import events
+from config import (
+    SLOW_REQUEST_MS,
+    SLOW_REQUEST_LOG_SIZE,
+    SLOW_REQUEST_PLANS,
+    PROFILER_INTERVAL_SECONDS,
+    PROFILER_MAX_SECONDS,
+    PROFILER_KEEP,
+)
+
+# Timing breakdown of a request, in this order; the rest of its time is "other"
+PHASES = ("db_connect", "db_query", "db_commit", "image", "serialize")
+MAX_STATEMENTS = 200  # Distinct statements remembered per request
+SQL_DISPLAY_CHARS = 1000
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+# Slow-request log
+
+class RequestTrace:
+    """Where the time of one request went"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        # SQL -> {"sql", "db_path", "parameters" (values blanked out), "calls", "seconds"}
+        self.statements: Dict[str, Dict] = {}
+        self.route: Optional[str] = None
+        self.event_id: Optional[str] = None
+        self.handler_done: Optional[float] = None  # time.perf_counter() when the endpoint returned
+        self.finished = False
+
+    def add(self, phase: str, seconds: float) -> None:
+        if not self.finished:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def statement(self, db_path: str, sql: str, parameters) -> Optional[Dict]:
+        """The record of a statement run during the request (None once too many were seen)"""
+        statement = self.statements.get(sql)
+        if statement is None and not self.finished and len(self.statements) < MAX_STATEMENTS:
+            statement = self.statements[sql] = {
+                "sql": sql, "db_path": db_path, "parameters": parameters, "calls": 0, "seconds": 0.0,
+            }
+        return statement
+
+
+_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+_slow_requests: Deque[Dict] = deque(maxlen=SLOW_REQUEST_LOG_SIZE)
+
+
+@contextmanager
+def phase(name: str):
+    """Count the time spent in a block towards a phase of the current request"""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def _placeholders(parameters):
+    """Statement parameters with their values blanked out
+
+    Enough for EXPLAIN QUERY PLAN, without keeping voter IDs or passwords.
+    """
+    if isinstance(parameters, dict):
+        return dict.fromkeys(parameters)
+    if isinstance(parameters, (list, tuple)):
+        return (None,) * len(parameters)
+    return ()
+
+
+class _TimedCursor:
+    """aiosqlite cursor whose fetches count towards its statement"""
+
+    def __init__(self, cursor: aiosqlite.Cursor, connection: "_TimedConnection", statement: Optional[Dict]):
+        self._cursor = cursor
+        self._connection = connection
+        self._statement = statement
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def fetchone(self):
+        with self._connection.timed("db_query", self._statement):
+            return await self._cursor.fetchone()
+
+    async def fetchmany(self, *args):
+        with self._connection.timed("db_query", self._statement):
+            return await self._cursor.fetchmany(*args)
+
+    async def fetchall(self):
+        with self._connection.timed("db_query", self._statement):
+            return await self._cursor.fetchall()
+
+    async def __aiter__(self):
+        rows = self._cursor.__aiter__()
+        while True:
+            with self._connection.timed("db_query", self._statement):
+                try:
+                    row = await rows.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield row
+
+    async def __aenter__(self) -> "_TimedCursor":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._cursor.close()
+
+
+class _CursorCall:
+    """What execute() returns: await it for the cursor, or use it as `async with ... as cursor`"""
+
+    def __init__(self, opening):
+        self._opening = opening
+        self._cursor: Optional[_TimedCursor] = None
+
+    def __await__(self):
+        return self._opening.__await__()
+
+    async def __aenter__(self) -> _TimedCursor:
+        self._cursor = await self._opening
+        return self._cursor
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._cursor.close()
+
+
+class _TimedConnection:
+    """aiosqlite connection that adds its time and statements to a request trace
+
+    Wraps aiosqlite's public API only: connecting, closing, statements,
+    cursor fetches and commits are timed, anything else is passed through.
+    """
+
+    def __init__(self, db_path: str, trace: RequestTrace):
+        self._connection = aiosqlite.connect(db_path)
+        self._db_path = db_path
+        self._trace = trace
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    @property
+    def row_factory(self):
+        return self._connection.row_factory
+
+    @row_factory.setter
+    def row_factory(self, factory) -> None:
+        self._connection.row_factory = factory
+
+    @contextmanager
+    def timed(self, phase_name: str, statement: Optional[Dict] = None):
+        """Count the time spent in a block towards a phase (and a statement)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self._trace.add(phase_name, seconds)
+            if statement is not None:
+                statement["seconds"] += seconds
+
+    async def _open(self) -> "_TimedConnection":
+        with self.timed("db_connect"):
+            await self._connection
+        return self
+
+    def __await__(self):
+        return self._open().__await__()
+
+    async def __aenter__(self) -> "_TimedConnection":
+        return await self._open()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        with self.timed("db_connect"):
+            await self._connection.close()
+
+    async def commit(self) -> None:
+        with self.timed("db_commit"):
+            await self._connection.commit()
+
+    async def rollback(self) -> None:
+        with self.timed("db_commit"):
+            await self._connection.rollback()
+
+    async def _run(self, running, statement: Optional[Dict]) -> _TimedCursor:
+        with self.timed("db_query", statement):
+            cursor = await running
+        return _TimedCursor(cursor, self, statement)
+
+    def _statement(self, sql: str, parameters) -> Optional[Dict]:
+        statement = self._trace.statement(self._db_path, sql, _placeholders(parameters))
+        if statement is not None:
+            statement["calls"] += 1
+        return statement
+
+    def execute(self, sql: str, parameters=None) -> _CursorCall:
+        statement = self._statement(sql, parameters)
+        return _CursorCall(self._run(self._connection.execute(sql, parameters), statement))
+
+    def executemany(self, sql: str, parameters) -> _CursorCall:
+        # The first row's shape stands in for all of them (iterators are not consumed)
+        first = parameters[0] if isinstance(parameters, (list, tuple)) and parameters else None
+        statement = self._statement(sql, first)
+        return _CursorCall(self._run(self._connection.executemany(sql, parameters), statement))
+
+    def executescript(self, sql_script: str) -> _CursorCall:
+        return _CursorCall(self._run(self._connection.executescript(sql_script), None))
+
+
+def connect(db_path: str):
+    """aiosqlite.connect(), timed when called while serving a request"""
+    trace = _trace.get()
+    if trace is None or trace.finished:
+        return aiosqlite.connect(db_path)
+    return _TimedConnection(db_path, trace)
+
+
+def _timed_endpoint(path: str, endpoint):
+    """Wrap an endpoint to note its route and when it returned (the rest until the response starts is serialization)"""
+    endpoint = getattr(endpoint, "__wrapped_endpoint__", endpoint)
+
+    def note_start() -> Optional[RequestTrace]:
+        trace = _trace.get()
+        if trace is not None:
+            trace.route = path
+            trace.event_id = events.current().id
+        return trace
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            trace = note_start()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if trace is not None:
+                    trace.handler_done = time.perf_counter()
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            trace = note_start()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                if trace is not None:
+                    trace.handler_done = time.perf_counter()
+
+    timed.__wrapped_endpoint__ = endpoint
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """API route whose endpoint reports to the request's trace (use as route_class)"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(path, endpoint), **kwargs)
+
+
+def _query_plan(db_path: str, sql: str, parameters) -> List[str]:
+    """EXPLAIN QUERY PLAN of a statement, one indented line per step"""
+    verb = sql.split(None, 1)[0].upper() if sql.strip() else ""
+    if verb not in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE"):
+        return []
+
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters or ()).fetchall()
+    except (sqlite3.Error, ValueError) as error:
+        return [f"(no plan: {error})"]
+    finally:
+        conn.close()
+
+    depth = {0: -1}
+    lines = []
+    for step_id, parent, _, detail in rows:
+        depth[step_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[step_id] + detail)
+    return lines
+
+
+def _statement_report(statements: List[Dict]) -> List[Dict]:
+    return [
+        {
+            "sql": " ".join(statement["sql"].split())[:SQL_DISPLAY_CHARS],
+            "calls": statement["calls"],
+            "ms": round(statement["seconds"] * 1000, 2),
+            "plan": _query_plan(statement["db_path"], statement["sql"], statement["parameters"]),
+        }
+        for statement in statements
+    ]
+
+
+async def _log_slow_request(scope, status: int, duration: float, trace: RequestTrace) -> None:
+    slowest = sorted(trace.statements.values(), key=lambda statement: -statement["seconds"])
+    breakdown = {name: round(trace.phases.get(name, 0.0) * 1000, 2) for name in PHASES}
+    breakdown["other"] = round(max(duration * 1000 - sum(breakdown.values()), 0.0), 2)
+
+    _slow_requests.append({
+        "at": _now(),
+        "method": scope.get("method"),
+        "path": scope.get("path"),
+        "route": trace.route,
+        "event_id": trace.event_id,
+        "status": status,
+        "duration_ms": round(duration * 1000, 1),
+        "breakdown_ms": breakdown,
+        "statement_calls": sum(statement["calls"] for statement in slowest),
+        "statements": await asyncio.to_thread(_statement_report, slowest[:SLOW_REQUEST_PLANS]),
+    })
+
+
+class RequestTimingMiddleware:
+    """Times every request and keeps the slow ones in the slow-request log"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or SLOW_REQUEST_MS <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _trace.set(trace)
+        status = 500  # Unless a response starts
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace.handler_done is not None:
+                    trace.add("serialize", time.perf_counter() - trace.handler_done)
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            duration = time.perf_counter() - started
+            trace.finished = True
+            _trace.reset(token)
+            if duration * 1000 >= SLOW_REQUEST_MS:
+                try:
+                    await _log_slow_request(scope, status, duration, trace)
+                except Exception as error:
+                    print(f"⚠️  Could not log slow request {scope.get('path')}: {error}")
+
+
+def get_slow_requests() -> List[Dict]:
+    """Slow requests kept in the log, newest first"""
+    return list(reversed(_slow_requests))
+
+
+def clear_slow_requests() -> int:
+    count = len(_slow_requests)
+    _slow_requests.clear()
+    return count
+
+
+# Sampling profiler
+
+# Both are only touched on the event loop; the sampler thread writes to its own profile only
+_profiles: Deque[Dict] = deque(maxlen=PROFILER_KEEP)  # Finished profiles, oldest first
+_running: Optional[Dict] = None
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _sample(profile: Dict) -> None:
+    """Count every other thread's stack until the profile's time is up or it is stopped
+
+    Runs in the sampler thread and only writes to its own profile; the event
+    loop moves it to the finished profiles once "done" is set (see _settle).
+    """
+    me = threading.get_ident()
+    names: Dict[int, str] = {}
+    stacks: Counter = profile["stacks"]
+    deadline = time.monotonic() + profile["seconds"]
+
+    try:
+        while time.monotonic() < deadline and not profile["stop"].wait(PROFILER_INTERVAL_SECONDS):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names.update((thread.ident, thread.name) for thread in threading.enumerate())
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append("event loop" if ident == profile["loop_thread"] else names.get(ident, f"thread {ident}"))
+                stacks[";".join(reversed(stack))] += 1
+            profile["samples"] += 1
+    finally:
+        profile["finished_at"] = _now()
+        profile["done"].set()
+
+
+def _settle() -> Optional[Dict]:
+    """The profile being recorded, after filing it with the finished ones if its thread is done"""
+    global _running
+    if _running is not None and _running["done"].is_set():
+        _profiles.append(_running)
+        _running = None
+    return _running
+
+
+def _profile_status(profile: Dict) -> Dict:
+    """Public view of a profile; finished ones list where the event loop spent its samples"""
+    status = {
+        "profile_id": profile["profile_id"],
+        "state": "done" if profile["finished_at"] else "running",
+        "started_at": profile["started_at"],
+        "finished_at": profile["finished_at"],
+        "seconds": profile["seconds"],
+        "samples": profile["samples"],
+    }
+    if profile["finished_at"]:
+        leaves: Counter = Counter()
+        for stack, count in profile["stacks"].items():
+            thread, _, frames = stack.partition(";")
+            if thread == "event loop":
+                leaves[frames.rpartition(";")[2]] += count
+        status["stacks"] = len(profile["stacks"])
+        status["event_loop_top"] = [
+            {"frame": frame, "samples": count, "share": round(count / max(profile["samples"], 1), 3)}
+            for frame, count in leaves.most_common(10)
+        ]
+    return status
+
+
+def start_profile(seconds: float) -> Dict:
+    """Start sampling every thread for a number of seconds (call from the event loop)"""
+    global _running
+    if not 0 < seconds <= PROFILER_MAX_SECONDS:
+        raise ValueError(f"Profile for more than 0 and at most {PROFILER_MAX_SECONDS} seconds")
+    if _settle() is not None:
+        raise ValueError("A profile is already being recorded")
+
+    profile = _running = {
+        "profile_id": uuid.uuid4().hex[:12],
+        "started_at": _now(),
+        "finished_at": None,
+        "seconds": seconds,
+        "samples": 0,
+        "stacks": Counter(),
+        "loop_thread": threading.get_ident(),
+        "stop": threading.Event(),
+        "done": threading.Event(),
+    }
+    threading.Thread(target=_sample, args=(profile,), name="profiler", daemon=True).start()
+    return _profile_status(profile)
+
+
+def stop_profile() -> Optional[Dict]:
+    """Stop the profile being recorded early, if any"""
+    profile = _settle()
+    if profile is None:
+        return None
+    profile["stop"].set()
+    return _profile_status(profile)
+
+
+def get_profiles() -> Dict:
+    """The profile being recorded (if any) and the finished ones, newest first"""
+    running = _settle()
+    return {
+        "running": _profile_status(running) if running else None,
+        "profiles": [_profile_status(profile) for profile in reversed(_profiles)],
+    }
+
+
+def collapsed_stacks(profile_id: str) -> Optional[str]:
+    """A finished profile in the collapsed-stack format, or None if unknown"""
+    _settle()
+    for profile in _profiles:
+        if profile["profile_id"] == profile_id:
+            return "".join(f"{stack} {count}\n" for stack, count in sorted(profile["stacks"].items()))
+    return None
@@ -0,0 +1,117 @@
+"""
+Counting ranked ballots: instant runoff and Borda count
+
+Both take the ballots of a category grouped by identical ranking, as
+{(first choice, second choice, ...): number of ballots}, so the work grows
+with the number of distinct rankings, not the number of voters. Choices that
+are not candidates (e.g. deleted entries) are skipped, and the choices after
+them move up.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Groups = Dict[Tuple[str, ...], int]
+
+
+def instant_runoff(groups: Groups, candidates: Iterable[str]) -> Dict:
+    """Count an instant-runoff election
+
+    Every round each ballot counts for its highest-ranked candidate still in
+    the race. A candidate with more than half of those ballots wins;
+    otherwise the candidate with the fewest is eliminated (every candidate
+    without a ballot at once) and only the groups counting for them move on
+    to their next choice. A tie for last place eliminates the candidate with
+    fewer first-round votes, then the one whose ID sorts first.
+
+    Returns {"winner", "rounds", "finish"}: rounds are
+    {"round", "counts", "exhausted", "elected", "eliminated", "transfers"},
+    where exhausted counts ballots with no candidate left, and finish lists
+    (candidate, votes in the last round they took part in), winner first.
+    """
+    continuing = set(candidates)
+    rankings = list(groups.items())
+    position = [0] * len(rankings)
+    piles: Dict[str, List[int]] = {candidate: [] for candidate in continuing}
+    counts = dict.fromkeys(continuing, 0)
+    exhausted = 0
+
+    def advance(index: int) -> Optional[str]:
+        """Move a group to its next choice still in the race, returning it (None if exhausted)"""
+        ranking, ballots = rankings[index]
+        place = position[index]
+        while place < len(ranking) and ranking[place] not in continuing:
+            place += 1
+        position[index] = place
+        if place == len(ranking):
+            return None
+        candidate = ranking[place]
+        piles[candidate].append(index)
+        counts[candidate] += ballots
+        return candidate
+
+    for index, (_, ballots) in enumerate(rankings):
+        if advance(index) is None:
+            exhausted += ballots
+
+    first_round = dict(counts)
+    rounds = []
+    out = []  # (candidate, final votes) in elimination order
+    winner = None
+    while continuing:
+        active = sum(counts[candidate] for candidate in continuing)
+        standing = sorted(continuing, key=lambda candidate: (-counts[candidate], candidate))
+        result = {
+            "round": len(rounds) + 1,
+            "counts": {candidate: counts[candidate] for candidate in standing},
+            "exhausted": exhausted,
+            "elected": None,
+            "eliminated": [],
+            "transfers": {},
+        }
+        rounds.append(result)
+
+        leader = standing[0]
+        if active == 0:
+            break  # No ballots at all: nobody wins
+        if counts[leader] * 2 > active or len(continuing) == 1:
+            winner = result["elected"] = leader
+            break
+
+        if counts[standing[-1]] == 0:
+            losers = [candidate for candidate in standing if counts[candidate] == 0]
+        else:
+            losers = [min(continuing, key=lambda candidate: (counts[candidate], first_round[candidate], candidate))]
+        result["eliminated"] = losers
+
+        for loser in losers:
+            continuing.discard(loser)
+            out.append((loser, counts[loser]))
+        transfers = result["transfers"]
+        for loser in losers:
+            for index in piles.pop(loser):
+                ballots = rankings[index][1]
+                candidate = advance(index)
+                if candidate is None:
+                    exhausted += ballots
+                else:
+                    transfers[candidate] = transfers.get(candidate, 0) + ballots
+
+    remaining = sorted(continuing, key=lambda candidate: (candidate != winner, -counts[candidate], candidate))
+    finish = [(candidate, counts[candidate]) for candidate in remaining] + out[::-1]
+    return {"winner": winner, "rounds": rounds, "finish": finish}
+
+
+def borda(groups: Groups, candidates: Iterable[str], max_choices: int) -> Dict[str, Tuple[int, int]]:
+    """Borda count: a ballot gives max_choices points to its first choice, one less to the next, ...
+
+    Returns {candidate: (points, ballots ranking them first)}.
+    """
+    continuing = set(candidates)
+    points = dict.fromkeys(continuing, 0)
+    first = dict.fromkeys(continuing, 0)
+    for ranking, ballots in groups.items():
+        ranked = [candidate for candidate in ranking if candidate in continuing][:max_choices]
+        for place, candidate in enumerate(ranked):
+            points[candidate] += (max_choices - place) * ballots
+        if ranked:
+            first[ranked[0]] += ballots
+    return {candidate: (points[candidate], first[candidate]) for candidate in continuing}
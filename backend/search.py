@@ -0,0 +1,202 @@
+"""
+In-memory search over entry names and costume names
+
+Names are split into normalized words. Every distinct word is kept in a
+sorted vocabulary, so a prefix ("gho" -> "ghost", "ghostface") is a binary
+search plus a short scan, and in a trigram index, so a misspelled word
+("ghots") only has to be compared with words that share enough trigrams
+with it. Entries are added and removed one at a time as they change.
+"""
+import heapq
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Relevance of each kind of word match (a query's score is the sum over its words)
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.75
+FUZZY_SCORE = 0.5
+
+# Shortest query word matched fuzzily, and the typos allowed per word length
+FUZZY_MIN_LENGTH = 4
+LONG_WORD_LENGTH = 8  # Words this long may have two typos, shorter ones one
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and turn punctuation into spaces"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(
+        char if char.isalnum() else " "
+        for char in decomposed
+        if not unicodedata.combining(char)
+    )
+
+
+def words(text: str) -> List[str]:
+    """Normalized words of a name or query"""
+    return normalize(text).split()
+
+
+def _trigrams(word: str) -> Set[str]:
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_typos(word: str) -> int:
+    return 2 if len(word) >= LONG_WORD_LENGTH else 1
+
+
+def _within_distance(a: str, b: str, limit: int) -> bool:
+    """Whether a and b are at most limit typos apart
+
+    A typo is an inserted, deleted or changed letter, or two neighbouring
+    letters swapped (optimal string alignment distance).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            )
+            if before and i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        # Later rows build on this one, or on the one before plus a swap
+        if min(current) > limit and min(previous) >= limit:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= limit
+
+
+class EntryIndex:
+    """Word index over active entries, returning entry records by relevance
+
+    add() replaces an entry already in the index and remove() ignores unknown
+    IDs, so applying the same change twice is harmless.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict] = {}
+        self._words_of: Dict[str, Set[str]] = {}
+        self._sort_keys: Dict[str, Tuple[str, str]] = {}  # Ties are listed by name
+        self._postings: Dict[str, Set[str]] = {}  # word -> entry IDs
+        self._vocabulary: List[str] = []  # Sorted distinct words
+        self._trigram_words: Dict[str, Set[str]] = {}  # trigram -> words
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry: Dict) -> None:
+        """Index an entry (a dict with at least id, name and costume_name)"""
+        entry_id = entry["id"]
+        self.remove(entry_id)
+        self._entries[entry_id] = entry
+        self._sort_keys[entry_id] = (entry["name"].casefold(), entry_id)
+
+        entry_words = set(words(entry["name"])) | set(words(entry["costume_name"]))
+        self._words_of[entry_id] = entry_words
+        for word in entry_words:
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = set()
+                insort(self._vocabulary, word)
+                for trigram in _trigrams(word):
+                    self._trigram_words.setdefault(trigram, set()).add(word)
+            posting.add(entry_id)
+
+    def remove(self, entry_id: str) -> None:
+        """Stop returning an entry from searches"""
+        if self._entries.pop(entry_id, None) is None:
+            return
+        del self._sort_keys[entry_id]
+
+        for word in self._words_of.pop(entry_id):
+            posting = self._postings[word]
+            posting.discard(entry_id)
+            if posting:
+                continue
+
+            # Last entry using this word: drop it from the vocabulary too
+            del self._postings[word]
+            del self._vocabulary[bisect_left(self._vocabulary, word)]
+            for trigram in _trigrams(word):
+                trigram_words = self._trigram_words[trigram]
+                trigram_words.discard(word)
+                if not trigram_words:
+                    del self._trigram_words[trigram]
+
+    def _prefixed(self, prefix: str) -> Iterable[str]:
+        start = bisect_left(self._vocabulary, prefix)
+        for word in self._vocabulary[start:]:
+            if not word.startswith(prefix):
+                break
+            yield word
+
+    def _similar(self, word: str) -> Iterable[str]:
+        # Each typo changes at most four trigrams (a swap touches four), so a
+        # close word shares all but 4 * typos of the query word's trigrams
+        typos = _max_typos(word)
+        query_trigrams = _trigrams(word)
+        needed = len(query_trigrams) - 4 * typos
+        shared: Dict[str, int] = {}
+        for trigram in query_trigrams:
+            for candidate in self._trigram_words.get(trigram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        for candidate, count in shared.items():
+            if count >= needed and candidate != word and _within_distance(word, candidate, typos):
+                yield candidate
+
+    def _match_word(self, word: str) -> Dict[str, float]:
+        """Best score per entry for one query word"""
+        scores: Dict[str, float] = {}
+
+        # Weakest kind of match first, so a better one simply overwrites it
+        def credit(matched_words: Iterable[str], score: float):
+            for matched in matched_words:
+                scores.update(dict.fromkeys(self._postings[matched], score))
+
+        if len(word) >= FUZZY_MIN_LENGTH:
+            credit(self._similar(word), FUZZY_SCORE)
+        credit((matched for matched in self._prefixed(word) if matched != word), PREFIX_SCORE)
+        if word in self._postings:
+            credit([word], EXACT_SCORE)
+        return scores
+
+    def search(self, query: str, offset: int = 0, limit: int = 20) -> Tuple[int, List[Tuple[Dict, float]]]:
+        """Entries matching every word of the query, best first
+
+        Each query word matches an entry's word exactly, as a prefix, or with
+        a typo or two. Returns (total matches, [(entry, score)] for the page).
+        """
+        query_words = sorted(set(words(query)), key=len, reverse=True)
+        if not query_words:
+            return 0, []
+
+        # Start from the most selective (longest) word and narrow down
+        scores = self._match_word(query_words[0])
+        for word in query_words[1:]:
+            if not scores:
+                break
+            word_scores = self._match_word(word)
+            scores = {
+                entry_id: score + word_scores[entry_id]
+                for entry_id, score in scores.items()
+                if entry_id in word_scores
+            }
+
+        sort_keys = self._sort_keys
+        ranked = heapq.nsmallest(
+            offset + limit,
+            scores.items(),
+            key=lambda item: (-item[1], sort_keys[item[0]]),
+        )
+        page = ranked[offset:]
+        return len(scores), [(self._entries[entry_id], score) for entry_id, score in page]
@@ -0,0 +1,127 @@
+"""
+Same-origin mode: serve the frontend from the API server itself
+
+With the pages on GitHub Pages and the API behind ngrok, every API call is
+cross-origin and (because of the ngrok-skip-browser-warning header) needs a
+CORS preflight, one more round-trip through the tunnel. Serving frontend/
+from this server makes page and API share an origin, so there are no
+preflights at all.
+
+Scripts and stylesheets are served under content-hashed names
+(js/vote.3f9a1c2b7d.js) with a one-year immutable cache lifetime, and the
+HTML pages are rewritten to point at them; pages, sw.js and the unhashed
+names are revalidated on every load (ETag). Everything is read, hashed and
+gzipped once when the server starts.
+"""
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+# Folders whose files get content-hashed names
+HASHED_DIRS = ("js", "css")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+MIN_GZIP_SIZE = 512  # Smaller files are not worth compressing
+
+# src="js/vote.js?v=5" or href="css/styles.css" in a page
+ASSET_REFERENCE = re.compile(r'(src|href)="((?:js|css)/[^"?]+)(?:\?[^"]*)?"')
+# Tells config.js to call the API on the page's own origin
+API_BASE_META = '<meta name="api-base" content="">'
+
+
+class _Asset:
+    """A file ready to send, with its gzipped variant and validators"""
+
+    __slots__ = ("body", "gzipped", "content_type", "etag", "cache_control")
+
+    def __init__(self, body: bytes, content_type: str, cache_control: str):
+        self.body = body
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        compressed = gzip.compress(body, compresslevel=9, mtime=0) if len(body) >= MIN_GZIP_SIZE else None
+        self.gzipped = compressed if compressed and len(compressed) < len(body) else None
+
+
+def _content_type(name: str) -> str:
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def _hashed_name(name: str, body: bytes) -> str:
+    """js/vote.js -> js/vote.3f9a1c2b7d.js"""
+    stem, dot, extension = name.rpartition(".")
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:10]}{dot}{extension}"
+
+
+class StaticSite:
+    """In-memory copy of frontend/, served as an ASGI app"""
+
+    def __init__(self, root: Path):
+        self.assets: Dict[str, _Asset] = {}
+        self.hashed_names: Dict[str, str] = {}
+
+        for directory in HASHED_DIRS:
+            for path in sorted((root / directory).glob("*")):
+                if path.suffix not in (".js", ".css"):
+                    continue  # Backups and other leftovers
+                name = f"{directory}/{path.name}"
+                body = path.read_bytes()
+                hashed = _hashed_name(name, body)
+                self.hashed_names[name] = hashed
+                self.assets[hashed] = _Asset(body, _content_type(name), IMMUTABLE)
+                # Old names keep working (the service worker precaches them)
+                self.assets[name] = _Asset(body, _content_type(name), REVALIDATE)
+
+        for path in sorted(root.glob("*")):
+            if path.suffix == ".html":
+                body = self._rewrite_page(path.read_text(encoding="utf-8")).encode("utf-8")
+            elif path.suffix == ".js":
+                body = path.read_bytes()  # sw.js: its URL is its identity, so never renamed
+            else:
+                continue
+            self.assets[path.name] = _Asset(body, _content_type(path.name), REVALIDATE)
+
+    def _rewrite_page(self, html: str) -> str:
+        def hashed(match):
+            attribute, name = match.groups()
+            return f'{attribute}="{self.hashed_names.get(name, name)}"'
+
+        html = ASSET_REFERENCE.sub(hashed, html)
+        return html.replace("<head>", f"<head>\n    {API_BASE_META}", 1)
+
+    def response(self, path: str, headers) -> Optional[Response]:
+        """Response for a site path (e.g. "vote.html"), or None if there is no such file"""
+        asset = self.assets.get(path or "index.html")
+        if asset is None:
+            return None
+
+        response_headers = {
+            "Cache-Control": asset.cache_control,
+            "ETag": asset.etag,
+            "Vary": "Accept-Encoding",
+        }
+        if asset.etag in headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=response_headers)
+
+        body = asset.body
+        if asset.gzipped and "gzip" in headers.get("accept-encoding", ""):
+            body = asset.gzipped
+            response_headers["Content-Encoding"] = "gzip"
+        return Response(body, media_type=asset.content_type, headers=response_headers)
+
+    async def __call__(self, scope, receive, send):
+        response = None
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            response = self.response(scope["path"].lstrip("/"), Headers(scope=scope))
+        if response is None:
+            response = Response('{"detail":"Not Found"}', status_code=404, media_type="application/json")
+        await response(scope, receive, send)
@@ -0,0 +1,62 @@
+"""
+Content-addressed photo storage
+
+Photos are stored once per distinct content under their SHA-256 digest,
+sharded into subdirectories by the first two hex digits, e.g.
+uploads/3f/3fa9...c1.jpg. The stored name (relative to the upload
+directory) is what entries keep in photo_filename.
+"""
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Tuple
+
+
+def content_hash(contents: bytes) -> str:
+    """SHA-256 hex digest of file contents"""
+    return hashlib.sha256(contents).hexdigest()
+
+
+def blob_filename(digest: str, extension: str) -> str:
+    """Sharded storage name for a digest, relative to the upload directory"""
+    return f"{digest[:2]}/{digest}{extension}"
+
+
+def write_blob(upload_dir: str, filename: str, contents: bytes) -> None:
+    """Write a blob atomically so readers never see a partial file"""
+    path = Path(upload_dir) / filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    temp_path = path.with_name(f".{uuid.uuid4()}.tmp")
+    with open(temp_path, "wb") as f:
+        f.write(contents)
+    os.replace(temp_path, path)
+
+
+def adopt_file(upload_dir: str, old_filename: str) -> Tuple[str, str, int]:
+    """Link a legacy flat upload into sharded storage
+
+    Returns (digest, new filename, size). The legacy file is left in place
+    so it can be removed once the database points at the new name.
+    """
+    old_path = Path(upload_dir) / old_filename
+    contents = old_path.read_bytes()
+    digest = content_hash(contents)
+    filename = blob_filename(digest, old_path.suffix.lower())
+
+    new_path = Path(upload_dir) / filename
+    if not new_path.exists():
+        new_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(old_path, new_path)
+        except OSError:
+            write_blob(upload_dir, filename, contents)
+
+    return digest, filename, len(contents)
+
+
+def remove_files(upload_dir: str, filenames) -> None:
+    """Delete files from the upload directory, ignoring ones already gone"""
+    for filename in filenames:
+        (Path(upload_dir) / filename).unlink(missing_ok=True)
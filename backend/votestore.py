@@ -0,0 +1,350 @@
+"""
+Memory-resident votes for VOTE_ENGINE = "memory"
+
+An event's votes, ballot IDs and live tallies are kept in compact structures:
+voter, category, entry, question and option IDs are interned to small
+integers, each vote is a __slots__ record and the tallies are an array of
+counters. Every change is appended to a journal file before it is applied;
+database.py copies changed votes into SQLite in the background
+(checkpointing) and replays newer journal files after a crash.
+
+Journals are numbered: a checkpoint closes the current file, opens the next
+one, and records the closed file's number in the database's meta table in
+the same transaction as the copied votes, so a journal is either fully in
+the database or replayed, never both.
+"""
+import asyncio
+import json
+import os
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+JOURNAL_SUFFIX = ".journal."  # halloween.db.journal.7
+
+
+def now() -> str:
+    """Current UTC time in SQLite's CURRENT_TIMESTAMP format"""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+
+def journal_files(db_path: str) -> List[Tuple[int, Path]]:
+    """Journal files of a database as (number, path), oldest first"""
+    db_file = Path(db_path)
+    files = []
+    for path in db_file.parent.glob(db_file.name + JOURNAL_SUFFIX + "*"):
+        number = path.name[len(db_file.name + JOURNAL_SUFFIX):]
+        if number.isdigit():
+            files.append((int(number), path))
+    return sorted(files)
+
+
+def read_journal(path: Path) -> Iterator[Dict]:
+    """Operations recorded in a journal file
+
+    Stops at a line cut short by a crash; it was never applied.
+    """
+    with open(path, "rb") as journal:
+        for line in journal:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+class Interner:
+    """Maps IDs to small integers and back"""
+
+    __slots__ = ("_numbers", "values")
+
+    def __init__(self):
+        self._numbers: Dict[Optional[str], int] = {}
+        self.values: List[Optional[str]] = []
+
+    def number(self, value: Optional[str]) -> int:
+        number = self._numbers.get(value)
+        if number is None:
+            number = self._numbers[value] = len(self.values)
+            self.values.append(value)
+        return number
+
+    def get(self, value: Optional[str]) -> Optional[int]:
+        """Number of an ID seen before, or None"""
+        return self._numbers.get(value)
+
+
+class VoteRecord:
+    """One row of a vote table, with interned voter, key and choice"""
+
+    __slots__ = ("id", "voter", "key", "choice", "deleted", "created_at", "updated_at", "change_count")
+
+    def __init__(self, vote_id, voter, key, choice, deleted, created_at, updated_at, change_count):
+        self.id = vote_id
+        self.voter = voter
+        self.key = key
+        self.choice = choice
+        self.deleted = deleted
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.change_count = change_count
+
+
+class VoteTable:
+    """Votes of one table (votes, mc_votes or rankings), indexed by voter, with live tallies
+
+    count(), groups() and version() answer like database._Tallies, so
+    results read either one.
+    """
+
+    def __init__(self, names: Interner):
+        self.names = names
+        self.records: Dict[str, VoteRecord] = {}
+        self._by_voter: Dict[int, Dict[int, VoteRecord]] = {}  # Named voters only
+        self._slots: Dict[int, Dict[int, int]] = {}  # key -> choice -> index into _counts
+        self._counts = array("l")
+        self._versions: Dict[int, int] = {}  # key -> changes so far
+
+    def count(self, key: str, choice: str) -> int:
+        slot = self._slots.get(self.names.get(key), {}).get(self.names.get(choice))
+        return self._counts[slot] if slot is not None else 0
+
+    def groups(self, key: str) -> Dict[str, int]:
+        """Active votes per choice for one key, like database._Tallies.groups()"""
+        values = self.names.values
+        counts = self._counts
+        return {
+            values[choice]: counts[slot]
+            for choice, slot in self._slots.get(self.names.get(key), {}).items()
+            if counts[slot]
+        }
+
+    def version(self, key: str) -> int:
+        return self._versions.get(self.names.get(key), 0)
+
+    def _tally(self, record: VoteRecord, delta: int) -> None:
+        slots = self._slots.setdefault(record.key, {})
+        slot = slots.get(record.choice)
+        if slot is None:
+            slot = slots[record.choice] = len(self._counts)
+            self._counts.append(0)
+        self._counts[slot] += delta
+        self._versions[record.key] = self._versions.get(record.key, 0) + 1
+
+    def load(self, vote_id, voter_id, key, choice, deleted, created_at, updated_at, change_count) -> None:
+        """Add a vote row read from the database"""
+        names = self.names
+        record = VoteRecord(
+            vote_id, names.number(voter_id), names.number(key), names.number(choice),
+            bool(deleted), created_at, updated_at, change_count,
+        )
+        self.records[vote_id] = record
+        if voter_id is not None:
+            self._by_voter.setdefault(record.voter, {})[record.key] = record
+        if not record.deleted:
+            self._tally(record, 1)
+
+    def set_choice(self, vote_id: str, voter_id: Optional[str], key: str, choice: str, at: str) -> None:
+        """Cast a vote, or change the choice of an existing one"""
+        record = self.records.get(vote_id)
+        if record is None:
+            self.load(vote_id, voter_id, key, choice, False, at, at, 0)
+            return
+
+        choice = self.names.number(choice)
+        if record.choice == choice:
+            return
+        if not record.deleted:
+            self._tally(record, -1)
+        record.choice = choice
+        record.updated_at = at
+        record.change_count += 1
+        if not record.deleted:
+            self._tally(record, 1)
+
+    def set_deleted(self, vote_id: str, deleted: bool) -> None:
+        record = self.records.get(vote_id)
+        if record is None or record.deleted == deleted:
+            return
+        record.deleted = deleted
+        self._tally(record, -1 if deleted else 1)
+
+    def previous(self, voter_id: Optional[str], keys) -> Dict[str, Tuple[str, str, bool]]:
+        """A voter's existing votes for some keys: key -> (vote ID, choice, deleted)
+
+        Anonymous votes never match, as in the database (NULLs are distinct in UNIQUE).
+        """
+        votes = self._by_voter.get(self.names.get(voter_id)) if voter_id is not None else None
+        if not votes:
+            return {}
+        values = self.names.values
+        found = {}
+        for key in keys:
+            record = votes.get(self.names.get(key))
+            if record is not None:
+                found[key] = (record.id, values[record.choice], record.deleted)
+        return found
+
+    def choices(self, voter_id: str) -> Dict[str, str]:
+        """A voter's active votes: key -> choice"""
+        values = self.names.values
+        votes = self._by_voter.get(self.names.get(voter_id), {})
+        return {values[record.key]: values[record.choice] for record in votes.values() if not record.deleted}
+
+    def matching(self, column: str, value: str) -> List[VoteRecord]:
+        """Votes with the given id or voter_id"""
+        if column == "id":
+            record = self.records.get(value)
+            return [record] if record else []
+        return list(self._by_voter.get(self.names.get(value), {}).values())
+
+    def row(self, vote_id: str) -> tuple:
+        """A vote as a database row: (id, voter_id, key, choice, deleted, created_at, updated_at, change_count)"""
+        record = self.records[vote_id]
+        values = self.names.values
+        return (
+            record.id, values[record.voter], values[record.key], values[record.choice],
+            int(record.deleted), record.created_at, record.updated_at, record.change_count,
+        )
+
+
+class Checkpoint:
+    """Changes recorded in journals up to (and including) number `journal`"""
+
+    __slots__ = ("journal", "rows", "ballots", "audit")
+
+    def __init__(self, journal: int, rows: Dict[str, List[tuple]], ballots: List[tuple], audit: List[tuple]):
+        self.journal = journal
+        self.rows = rows  # table -> vote rows
+        self.ballots = ballots  # (id, voter_id, vote_count, mc_vote_count, created_at)
+        self.audit = audit  # (at, type, subject_id, data as JSON)
+
+
+class VoteStore:
+    """An event's votes in memory, journaled to files next to its database
+
+    Changes go through commit(), one operation at a time:
+        {"at": timestamp,
+         "set": [[table, vote_id, voter_id, key, choice], ...],
+         "deleted": [[table, vote_id, deleted], ...],
+         "ballot": [ballot_id, voter_id, vote_count, mc_vote_count],
+         "audit": [[type, subject_id, data], ...]}
+    """
+
+    def __init__(self, db_path: str, tables, fsync: bool = False):
+        self.db_path = db_path
+        self.fsync = fsync
+        self.names = Interner()
+        self.tables: Dict[str, VoteTable] = {table: VoteTable(self.names) for table in tables}
+        self.entry_ids: Set[str] = set()  # Entries known to exist (a cache; misses are looked up)
+        self.ballots: Dict[str, Tuple[int, int]] = {}  # ballot ID -> (vote_count, mc_vote_count)
+
+        # Held by writers, and by a reset for its whole length
+        self.lock = asyncio.Lock()
+        # Checkpoints run one at a time
+        self.checkpoint_lock = asyncio.Lock()
+        self.checkpoint_task: Optional[asyncio.Task] = None
+
+        self.journal = 0
+        self._journal_fd: Optional[int] = None
+        self._closed_journals: List[int] = []  # Closed, not yet in the database
+        self._dirty: Dict[str, Set[str]] = {table: set() for table in tables}
+        self._ballots: List[tuple] = []
+        self._audit: List[tuple] = []
+
+    def _journal_path(self, number: int) -> str:
+        return f"{self.db_path}{JOURNAL_SUFFIX}{number}"
+
+    def open(self, last_journal: int) -> None:
+        """Start writing the journal after last_journal"""
+        self.journal = last_journal + 1
+        self._journal_fd = os.open(self._journal_path(self.journal), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def close(self) -> None:
+        """Close the journal, removing it if nothing was written since the last checkpoint"""
+        if self._journal_fd is None:
+            return
+        os.close(self._journal_fd)
+        self._journal_fd = None
+        if not self.has_changes():
+            Path(self._journal_path(self.journal)).unlink(missing_ok=True)
+
+    def commit(self, operation: Dict) -> Dict:
+        """Journal an operation, then apply it; returns it as journaled (with its "at")"""
+        operation = {"at": now(), **operation}
+        os.write(self._journal_fd, json.dumps(operation, separators=(",", ":")).encode() + b"\n")
+        if self.fsync:
+            os.fsync(self._journal_fd)
+        self.apply(operation)
+        return operation
+
+    def apply(self, operation: Dict) -> None:
+        """Apply a journaled operation (also used to replay journals after a crash)"""
+        at = operation["at"]
+        for table, vote_id, voter_id, key, choice in operation.get("set", ()):
+            self.tables[table].set_choice(vote_id, voter_id, key, choice, at)
+            self._dirty[table].add(vote_id)
+        for table, vote_id, deleted in operation.get("deleted", ()):
+            self.tables[table].set_deleted(vote_id, deleted)
+            self._dirty[table].add(vote_id)
+
+        ballot = operation.get("ballot")
+        if ballot:
+            ballot_id, voter_id, vote_count, mc_vote_count = ballot
+            self.ballots[ballot_id] = (vote_count, mc_vote_count)
+            self._ballots.append((ballot_id, voter_id, vote_count, mc_vote_count, at))
+        for event_type, subject_id, data in operation.get("audit", ()):
+            self._audit.append((at, event_type, subject_id, json.dumps(data, separators=(",", ":")) if data else None))
+
+    def replay(self, number: int, path: Path) -> None:
+        """Apply a journal left behind by a previous run; it is removed at the next checkpoint"""
+        for operation in read_journal(path):
+            self.apply(operation)
+        self._closed_journals.append(number)
+
+    def has_changes(self) -> bool:
+        return bool(self._ballots or self._audit or any(self._dirty.values()))
+
+    def start_checkpoint(self) -> Optional[Checkpoint]:
+        """Switch to the next journal and take the changes recorded so far, or None if there are none"""
+        if not self.has_changes() and not self._closed_journals:
+            return None
+
+        checkpoint = Checkpoint(
+            self.journal,
+            {table: [self.tables[table].row(vote_id) for vote_id in dirty] for table, dirty in self._dirty.items()},
+            self._ballots,
+            self._audit,
+        )
+        self._dirty = {table: set() for table in self._dirty}
+        self._ballots = []
+        self._audit = []
+
+        os.close(self._journal_fd)
+        self._closed_journals.append(self.journal)
+        self.open(self.journal)
+        return checkpoint
+
+    def finish_checkpoint(self, checkpoint: Checkpoint) -> None:
+        """The checkpoint is in the database: remove the journals it covers"""
+        covered = [number for number in self._closed_journals if number <= checkpoint.journal]
+        self._closed_journals = [number for number in self._closed_journals if number > checkpoint.journal]
+        for number in covered:
+            Path(self._journal_path(number)).unlink(missing_ok=True)
+
+    def abort_checkpoint(self, checkpoint: Checkpoint) -> None:
+        """The checkpoint failed: keep its changes for the next one"""
+        for table, rows in checkpoint.rows.items():
+            self._dirty[table].update(row[0] for row in rows)
+        self._ballots[:0] = checkpoint.ballots
+        self._audit[:0] = checkpoint.audit
+
+    def clear(self) -> None:
+        """Forget all votes and ballots (after the database tables were emptied)"""
+        self.names = Interner()
+        self.tables = {table: VoteTable(self.names) for table in self.tables}
+        self.entry_ids.clear()
+        self.ballots.clear()
+        self._dirty = {table: set() for table in self._dirty}
+        self._ballots = []
+        self._audit = []
@@ -1,9 +1,14 @@
 // Admin panel logic
 
-let adminPassword = '';
+let adminToken = sessionStorage.getItem(storageKey('halloween_admin_token')) || '';
 let entries = [];
 let votes = [];
 let mcVotes = [];
+// Grouped votes come one page of voters at a time, most recently active first
+const VOTER_PAGE_SIZE = 50;
+let votesPage = { total: 0, offset: 0, vote_count: 0, voters_with_deleted: 0 };
+let mcVotesPage = { total: 0, offset: 0, vote_count: 0, voters_with_deleted: 0 };
+let duplicates = [];
 let refreshInterval = null;
 
 // Password form submission
@@ -15,7 +20,7 @@ document.getElementById('passwordForm').addEventListener('submit', async functio
 
     try {
         // Verify admin password
-        const response = await fetch(`${API_BASE_URL}/api/admin/auth`, {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/auth`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -28,18 +33,12 @@ document.getElementById('passwordForm').addEventListener('submit', async functio
             throw new Error('Invalid admin password');
         }
 
-        // Password is correct
-        adminPassword = password;
+        // Password is correct: keep the session token, not the password
+        const session = await response.json();
+        adminToken = session.token;
+        sessionStorage.setItem(storageKey('halloween_admin_token'), adminToken);
 
-        // Hide password prompt, show admin panel
-        document.getElementById('passwordPrompt').style.display = 'none';
-        document.getElementById('adminDisplay').style.display = 'block';
-
-        // Load admin data
-        await loadAdminData();
-
-        // Set up auto-refresh every 30 seconds
-        refreshInterval = setInterval(loadAdminData, 30000);
+        await showAdminPanel();
 
     } catch (error) {
         console.error('Authentication error:', error);
@@ -48,62 +47,274 @@ document.getElementById('passwordForm').addEventListener('submit', async functio
     }
 });
 
+// Headers for admin API calls
+function adminHeaders(extra = {}) {
+    return {
+        'ngrok-skip-browser-warning': 'true',
+        'Authorization': `Bearer ${adminToken}`,
+        ...extra
+    };
+}
+
+// Hide password prompt, show admin panel and keep it fresh
+async function showAdminPanel() {
+    document.getElementById('passwordPrompt').style.display = 'none';
+    document.getElementById('adminDisplay').style.display = 'block';
+
+    // Load admin data
+    await loadAdminData();
+
+    // Set up auto-refresh every 30 seconds
+    refreshInterval = setInterval(loadAdminData, 30000);
+}
+
+// Session expired (or server restarted): ask for the password again
+function handleExpiredSession() {
+    adminToken = '';
+    sessionStorage.removeItem(storageKey('halloween_admin_token'));
+    if (refreshInterval) {
+        clearInterval(refreshInterval);
+        refreshInterval = null;
+    }
+    document.getElementById('adminDisplay').style.display = 'none';
+    document.getElementById('passwordPrompt').style.display = 'block';
+}
+
 // Load all admin data
 async function loadAdminData() {
     try {
         // Load entries
-        const entriesResponse = await fetch(`${API_BASE_URL}/api/admin/entries?password=${encodeURIComponent(adminPassword)}`, {
-            headers: {
-                'ngrok-skip-browser-warning': 'true'
-            }
+        const entriesResponse = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/entries`, {
+            headers: adminHeaders()
         });
+        if (entriesResponse.status === 401) {
+            handleExpiredSession();
+            return;
+        }
         entries = await entriesResponse.json();
 
-        // Load votes (grouped by voter)
-        const votesResponse = await fetch(`${API_BASE_URL}/api/admin/votes-grouped?password=${encodeURIComponent(adminPassword)}`, {
-            headers: {
-                'ngrok-skip-browser-warning': 'true'
-            }
+        // Load votes (grouped by voter, current page only)
+        const votesResponse = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/votes-grouped?offset=${votesPage.offset}&limit=${VOTER_PAGE_SIZE}`, {
+            headers: adminHeaders()
         });
-        votes = await votesResponse.json();
+        votesPage = await votesResponse.json();
+        votes = votesPage.voters;
 
-        // Load MC votes (grouped by voter)
-        const mcVotesResponse = await fetch(`${API_BASE_URL}/api/admin/mc-votes-grouped?password=${encodeURIComponent(adminPassword)}`, {
-            headers: {
-                'ngrok-skip-browser-warning': 'true'
-            }
+        // Load MC votes (grouped by voter, current page only)
+        const mcVotesResponse = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/mc-votes-grouped?offset=${mcVotesPage.offset}&limit=${VOTER_PAGE_SIZE}`, {
+            headers: adminHeaders()
+        });
+        mcVotesPage = await mcVotesResponse.json();
+        mcVotes = mcVotesPage.voters;
+
+        // Load likely duplicate entries
+        const duplicatesResponse = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/duplicates`, {
+            headers: adminHeaders()
         });
-        mcVotes = await mcVotesResponse.json();
+        duplicates = await duplicatesResponse.json();
 
         // Update statistics
         updateStatistics();
 
         // Render tables
         renderEntries();
+        renderDuplicates();
         renderVotes();
         renderMcVotes();
 
+        await loadProfiling();
+
     } catch (error) {
         console.error('Error loading admin data:', error);
         showError('Failed to load admin data: ' + error.message);
     }
 }
 
+// Load slow requests and profiles (only the default event's admins see them)
+async function loadProfiling() {
+    const section = document.getElementById('profilingSection');
+    const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/profiling`, {
+        headers: adminHeaders()
+    });
+    if (!response.ok) {
+        section.style.display = 'none';
+        return null;
+    }
+
+    const profilingData = await response.json();
+    section.style.display = 'block';
+    renderProfiles(profilingData);
+    renderSlowRequests(profilingData);
+    return profilingData;
+}
+
+// Render recorded profiles with their hottest event loop frames
+function renderProfiles(profilingData) {
+    const container = document.getElementById('profilesContainer');
+    document.getElementById('profilingStatus').textContent = profilingData.running
+        ? `Recording a ${profilingData.running.seconds}s profile...`
+        : '';
+
+    if (profilingData.profiles.length === 0) {
+        container.innerHTML = '';
+        return;
+    }
+
+    let html = '<table><thead><tr>';
+    html += '<th>Profile</th>';
+    html += '<th>Samples</th>';
+    html += '<th>Busiest on the event loop</th>';
+    html += '<th>Actions</th>';
+    html += '</tr></thead><tbody>';
+
+    profilingData.profiles.forEach(profile => {
+        const top = profile.event_loop_top
+            .slice(0, 3)
+            .map(frame => `${escapeHtml(frame.frame)} (${Math.round(frame.share * 100)}%)`)
+            .join('<br>');
+
+        html += '<tr>';
+        html += `<td>${escapeHtml(profile.started_at)}<br>${profile.seconds}s</td>`;
+        html += `<td>${profile.samples}</td>`;
+        html += `<td>${top || '-'}</td>`;
+        html += `<td><button class="btn btn-secondary btn-small" onclick="downloadProfile('${escapeHtml(profile.profile_id)}')">Download</button></td>`;
+        html += '</tr>';
+    });
+
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+// Render the slow-request log, with each request's slowest statements and their query plans
+function renderSlowRequests(profilingData) {
+    const container = document.getElementById('slowRequestsContainer');
+
+    if (profilingData.slow_requests.length === 0) {
+        container.innerHTML = `<p style="padding: 1rem; text-align: center;">No requests slower than ${profilingData.slow_request_ms} ms</p>`;
+        return;
+    }
+
+    let html = '<table><thead><tr>';
+    html += '<th>Time</th>';
+    html += '<th>Request</th>';
+    html += '<th>Status</th>';
+    html += '<th>Total</th>';
+    html += '<th>Breakdown (ms)</th>';
+    html += '</tr></thead><tbody>';
+
+    profilingData.slow_requests.forEach(request => {
+        const breakdown = Object.entries(request.breakdown_ms)
+            .filter(([, ms]) => ms > 0)
+            .map(([phase, ms]) => `${escapeHtml(phase)} ${ms}`)
+            .join(', ');
+        const statements = request.statements.map(statement =>
+            `<div class="query-plan">${statement.ms} ms, ${statement.calls}x: ${escapeHtml(statement.sql)}` +
+            (statement.plan.length ? '\n' + escapeHtml(statement.plan.join('\n')) : '') + '</div>'
+        ).join('');
+
+        html += '<tr>';
+        html += `<td>${escapeHtml(request.at)}</td>`;
+        html += `<td>${escapeHtml(request.method)} ${escapeHtml(request.path)}`;
+        if (statements) {
+            html += `<details><summary>${request.statement_calls} statements</summary>${statements}</details>`;
+        }
+        html += '</td>';
+        html += `<td>${request.status}</td>`;
+        html += `<td>${request.duration_ms} ms</td>`;
+        html += `<td>${breakdown}</td>`;
+        html += '</tr>';
+    });
+
+    html += '</tbody></table>';
+    container.innerHTML = html;
+}
+
+// Record a profile and poll until it is ready
+async function startProfile() {
+    const seconds = parseFloat(document.getElementById('profileSeconds').value) || 10;
+
+    try {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/profiling/profiles`, {
+            method: 'POST',
+            headers: adminHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify({ seconds })
+        });
+
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'Failed to start profile');
+        }
+
+        let profilingData = await loadProfiling();
+        while (profilingData && profilingData.running) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            profilingData = await loadProfiling();
+        }
+
+    } catch (error) {
+        console.error('Error profiling:', error);
+        alert('Failed to record profile: ' + error.message);
+    }
+}
+
+// Download a profile as collapsed stacks (open it in speedscope or flamegraph.pl)
+async function downloadProfile(profileId) {
+    try {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/profiling/profiles/${profileId}/collapsed`, {
+            headers: adminHeaders()
+        });
+
+        if (!response.ok) {
+            throw new Error('Failed to download profile');
+        }
+
+        const blob = await response.blob();
+        const link = document.createElement('a');
+        link.href = URL.createObjectURL(blob);
+        link.download = `profile-${profileId}.collapsed`;
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        URL.revokeObjectURL(link.href);
+
+    } catch (error) {
+        console.error('Error downloading profile:', error);
+        alert('Failed to download profile: ' + error.message);
+    }
+}
+
+// Empty the slow-request log
+async function clearSlowRequests() {
+    try {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/profiling/slow-requests`, {
+            method: 'DELETE',
+            headers: adminHeaders()
+        });
+
+        if (!response.ok) {
+            throw new Error('Failed to clear slow requests');
+        }
+
+        await loadProfiling();
+
+    } catch (error) {
+        console.error('Error clearing slow requests:', error);
+        alert('Failed to clear slow requests: ' + error.message);
+    }
+}
+
 // Update statistics
 function updateStatistics() {
     document.getElementById('totalEntries').textContent = entries.length;
 
-    // Sum up vote counts from grouped data
-    const totalVotes = votes.reduce((sum, v) => sum + v.vote_count, 0);
-    const totalMcVotes = mcVotes.reduce((sum, v) => sum + v.vote_count, 0);
-
-    document.getElementById('totalVotes').textContent = totalVotes;
-    document.getElementById('totalMcVotes').textContent = totalMcVotes;
+    // Totals cover all voters, not just the page shown
+    document.getElementById('totalVotes').textContent = votesPage.vote_count;
+    document.getElementById('totalMcVotes').textContent = mcVotesPage.vote_count;
 
     const deletedCount =
         entries.filter(e => e.deleted).length +
-        votes.filter(v => v.has_deleted).length +
-        mcVotes.filter(v => v.has_deleted).length;
+        votesPage.voters_with_deleted +
+        mcVotesPage.voters_with_deleted;
 
     document.getElementById('deletedItems').textContent = deletedCount;
 }
@@ -166,6 +377,51 @@ function renderEntries() {
     });
 }
 
+// Render likely duplicate entries
+function renderDuplicates() {
+    const container = document.getElementById('duplicatesContainer');
+
+    if (duplicates.length === 0) {
+        container.innerHTML = '<p style="padding: 1rem; text-align: center;">No look-alike photos found</p>';
+        return;
+    }
+
+    let html = '<table><thead><tr>';
+    html += '<th>Entry</th>';
+    html += '<th>Looks Like</th>';
+    html += '<th>Similarity</th>';
+    html += '<th>Actions</th>';
+    html += '</tr></thead><tbody>';
+
+    duplicates.forEach((pair, index) => {
+        const similarity = Math.round((1 - pair.distance / 64) * 100);
+
+        html += '<tr>';
+        html += `<td><img id="dup-img-${index}-a" alt="${escapeHtml(pair.entry.costume_name)}"><br>${escapeHtml(pair.entry.name)} – ${escapeHtml(pair.entry.costume_name)}</td>`;
+        html += `<td><img id="dup-img-${index}-b" alt="${escapeHtml(pair.duplicate.costume_name)}"><br>${escapeHtml(pair.duplicate.name)} – ${escapeHtml(pair.duplicate.costume_name)}</td>`;
+        html += `<td>${similarity}%</td>`;
+        html += '<td><div class="admin-actions">';
+        html += `<button class="btn btn-delete btn-small" onclick="deleteEntry('${pair.duplicate.id}')">Delete Second</button>`;
+        html += '</div></td>';
+        html += '</tr>';
+    });
+
+    html += '</tbody></table>';
+    container.innerHTML = html;
+
+    // Load images with headers
+    duplicates.forEach((pair, index) => {
+        [['a', pair.entry], ['b', pair.duplicate]].forEach(([side, entry]) => {
+            const imgElement = document.getElementById(`dup-img-${index}-${side}`);
+            loadImageWithHeaders(`${API_BASE_URL}${entry.photo_url}`).then(blobUrl => {
+                imgElement.src = blobUrl;
+            }).catch(err => {
+                console.error('Failed to load image:', err);
+            });
+        });
+    });
+}
+
 // Render votes table
 function renderVotes() {
     const container = document.getElementById('votesContainer');
@@ -220,6 +476,7 @@ function renderVotes() {
     });
 
     html += '</tbody></table>';
+    html += voterPager(votesPage, 'changeVotesPage');
     container.innerHTML = html;
 }
 
@@ -277,9 +534,37 @@ function renderMcVotes() {
     });
 
     html += '</tbody></table>';
+    html += voterPager(mcVotesPage, 'changeMcVotesPage');
     container.innerHTML = html;
 }
 
+// Newer/older buttons under a grouped votes table
+function voterPager(page, changePage) {
+    if (page.total <= VOTER_PAGE_SIZE) {
+        return '';
+    }
+
+    const first = page.offset + 1;
+    const last = Math.min(page.offset + VOTER_PAGE_SIZE, page.total);
+    let html = '<div class="voter-pager">';
+    html += `<button class="btn btn-small" onclick="${changePage}(-1)" ${page.offset === 0 ? 'disabled' : ''}>← Newer</button>`;
+    html += `<span>Voters ${first}–${last} of ${page.total}</span>`;
+    html += `<button class="btn btn-small" onclick="${changePage}(1)" ${last >= page.total ? 'disabled' : ''}>Older →</button>`;
+    html += '</div>';
+    return html;
+}
+
+// Show the next (1) or previous (-1) page of voters
+async function changeVotesPage(direction) {
+    votesPage.offset = Math.max(votesPage.offset + direction * VOTER_PAGE_SIZE, 0);
+    await loadAdminData();
+}
+
+async function changeMcVotesPage(direction) {
+    mcVotesPage.offset = Math.max(mcVotesPage.offset + direction * VOTER_PAGE_SIZE, 0);
+    await loadAdminData();
+}
+
 // Delete entry
 async function deleteEntry(entryId) {
     if (!confirm('Are you sure you want to delete this entry? It will be hidden from all views.')) {
@@ -287,13 +572,9 @@ async function deleteEntry(entryId) {
     }
 
     try {
-        const response = await fetch(`${API_BASE_URL}/api/admin/entries/${entryId}/delete`, {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/entries/${entryId}/delete`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'ngrok-skip-browser-warning': 'true'
-            },
-            body: JSON.stringify({ password: adminPassword })
+            headers: adminHeaders()
         });
 
         if (!response.ok) {
@@ -312,13 +593,9 @@ async function deleteEntry(entryId) {
 // Restore entry
 async function restoreEntry(entryId) {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/admin/entries/${entryId}/restore`, {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/entries/${entryId}/restore`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'ngrok-skip-browser-warning': 'true'
-            },
-            body: JSON.stringify({ password: adminPassword })
+            headers: adminHeaders()
         });
 
         if (!response.ok) {
@@ -341,13 +618,9 @@ async function deleteVotesByVoter(voterId) {
     }
 
     try {
-        const response = await fetch(`${API_BASE_URL}/api/admin/votes/voter/${encodeURIComponent(voterId)}/delete`, {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/votes/voter/${encodeURIComponent(voterId)}/delete`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'ngrok-skip-browser-warning': 'true'
-            },
-            body: JSON.stringify({ password: adminPassword })
+            headers: adminHeaders()
         });
 
         if (!response.ok) {
@@ -366,13 +639,9 @@ async function deleteVotesByVoter(voterId) {
 // Restore all votes by voter
 async function restoreVotesByVoter(voterId) {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/admin/votes/voter/${encodeURIComponent(voterId)}/restore`, {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/votes/voter/${encodeURIComponent(voterId)}/restore`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'ngrok-skip-browser-warning': 'true'
-            },
-            body: JSON.stringify({ password: adminPassword })
+            headers: adminHeaders()
         });
 
         if (!response.ok) {
@@ -395,13 +664,9 @@ async function deleteMcVotesByVoter(voterId) {
     }
 
     try {
-        const response = await fetch(`${API_BASE_URL}/api/admin/mc-votes/voter/${encodeURIComponent(voterId)}/delete`, {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/mc-votes/voter/${encodeURIComponent(voterId)}/delete`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'ngrok-skip-browser-warning': 'true'
-            },
-            body: JSON.stringify({ password: adminPassword })
+            headers: adminHeaders()
         });
 
         if (!response.ok) {
@@ -420,13 +685,9 @@ async function deleteMcVotesByVoter(voterId) {
 // Restore all MC votes by voter
 async function restoreMcVotesByVoter(voterId) {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/admin/mc-votes/voter/${encodeURIComponent(voterId)}/restore`, {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/mc-votes/voter/${encodeURIComponent(voterId)}/restore`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'ngrok-skip-browser-warning': 'true'
-            },
-            body: JSON.stringify({ password: adminPassword })
+            headers: adminHeaders()
         });
 
         if (!response.ok) {
@@ -442,6 +703,100 @@ async function restoreMcVotesByVoter(voterId) {
     }
 }
 
+// Download an export file (streamed by the backend)
+async function downloadExport(dataset, format) {
+    try {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/export/${dataset}?format=${format}`, {
+            headers: adminHeaders()
+        });
+
+        if (!response.ok) {
+            throw new Error('Failed to export data');
+        }
+
+        const blob = await response.blob();
+        const link = document.createElement('a');
+        link.href = URL.createObjectURL(blob);
+        link.download = `halloween-${dataset}.${format}`;
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        URL.revokeObjectURL(link.href);
+
+    } catch (error) {
+        console.error('Error exporting data:', error);
+        alert('Failed to export data: ' + error.message);
+    }
+}
+
+// Start an online backup and poll until it finishes
+async function startBackup() {
+    const statusEl = document.getElementById('maintenanceStatus');
+
+    try {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/backup`, {
+            method: 'POST',
+            headers: adminHeaders()
+        });
+
+        if (!response.ok) {
+            throw new Error('Failed to start backup');
+        }
+
+        let job = await response.json();
+        while (job.state === 'running') {
+            statusEl.textContent = `Backing up... ${Math.round(job.progress * 100)}%`;
+            await new Promise(resolve => setTimeout(resolve, 500));
+
+            const statusResponse = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/backup/${job.job_id}`, {
+                headers: adminHeaders()
+            });
+            job = await statusResponse.json();
+        }
+
+        if (job.state !== 'done') {
+            throw new Error(job.error || 'Backup failed');
+        }
+
+        statusEl.textContent = `✅ Backup ${job.filename} saved (${(job.size_bytes / 1024 / 1024).toFixed(1)} MB in ${job.duration_seconds}s)`;
+
+    } catch (error) {
+        console.error('Error backing up:', error);
+        statusEl.textContent = '';
+        alert('Failed to back up: ' + error.message);
+    }
+}
+
+// Clear all entries and votes without restarting the server
+async function resetAllData() {
+    if (!confirm('Delete ALL entries and votes? Photos will be moved to the archive folder.')) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/admin/reset`, {
+            method: 'POST',
+            headers: adminHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify({ archive_uploads: true })
+        });
+
+        if (!response.ok) {
+            throw new Error('Failed to reset data');
+        }
+
+        const result = await response.json();
+        document.getElementById('maintenanceStatus').textContent =
+            `✅ Reset complete in ${result.duration_seconds}s`;
+
+        // Reload data
+        await loadAdminData();
+
+    } catch (error) {
+        console.error('Error resetting data:', error);
+        alert('Failed to reset data: ' + error.message);
+    }
+}
+
 // Utility function to escape HTML
 function escapeHtml(text) {
     const div = document.createElement('div');
@@ -454,6 +809,11 @@ function showError(message) {
     alert(message);
 }
 
+// Resume an existing session after a page reload
+if (adminToken) {
+    showAdminPanel();
+}
+
 // Cleanup on page unload
 window.addEventListener('beforeunload', () => {
     if (refreshInterval) {
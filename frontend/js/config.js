@@ -8,9 +8,41 @@ const LOCAL_API_URL = 'http://localhost:8000';
 // Example: const PRODUCTION_API_URL = 'https://highflying-camren-reserved.ngrok-free.dev';
 const PRODUCTION_API_URL = 'https://highflying-camren-reserved.ngrok-free.dev';
 
+// Pages served by the backend itself (SERVE_FRONTEND) call the API on their own
+// origin, which saves a CORS preflight round-trip on every request
+const apiBaseMeta = document.querySelector('meta[name="api-base"]');
+
 // Automatically detect environment
-const API_BASE_URL = window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1'
-    ? LOCAL_API_URL
-    : PRODUCTION_API_URL;
+const API_BASE_URL = apiBaseMeta
+    ? apiBaseMeta.content
+    : window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1'
+        ? LOCAL_API_URL
+        : PRODUCTION_API_URL;
 
 console.log('Using API URL:', API_BASE_URL);
+
+// Events: open any page with ?event=<id> to join that party (?event= goes back to the default)
+const urlEventId = new URLSearchParams(window.location.search).get('event');
+if (urlEventId !== null) {
+    if (urlEventId) {
+        localStorage.setItem('halloween_event', urlEventId);
+    } else {
+        localStorage.removeItem('halloween_event');
+    }
+}
+const EVENT_ID = localStorage.getItem('halloween_event') || '';
+const API_PREFIX = EVENT_ID ? `/api/events/${encodeURIComponent(EVENT_ID)}` : '/api';
+
+// Keep each event's votes and voter ID apart in localStorage
+function storageKey(name) {
+    return EVENT_ID ? `${name}_${EVENT_ID}` : name;
+}
+
+// Offline support: cache the pages and ballot, and replay queued votes
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register('sw.js').catch(err => {
+            console.warn('Service worker registration failed:', err);
+        });
+    });
+}
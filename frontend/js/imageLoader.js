@@ -1,20 +1,48 @@
 // Image Loader Utility
 // Fetches images with proper headers to bypass ngrok warning page
 
-// Cache for blob URLs to avoid re-fetching images
+// Most object URLs kept alive at once; older ones are revoked to free their
+// memory (the service worker still has the files, so a reload is cheap)
+const MAX_CACHED_IMAGES = 60;
+
+// LRU cache of blob URLs to avoid re-fetching images (a Map iterates oldest first)
 const imageCache = new Map();
 
+// Downloads in progress, shared by everyone asking for the same image
+const pendingImages = new Map();
+
+function cacheImage(url, blobUrl) {
+    imageCache.set(url, blobUrl);
+    while (imageCache.size > MAX_CACHED_IMAGES) {
+        const [oldestUrl, oldestBlobUrl] = imageCache.entries().next().value;
+        imageCache.delete(oldestUrl);
+        if (oldestBlobUrl.startsWith('blob:')) {
+            URL.revokeObjectURL(oldestBlobUrl);
+        }
+    }
+}
+
 /**
  * Load an image from the API with proper headers (with caching)
  * @param {string} url - The image URL (should include API_BASE_URL)
  * @returns {Promise<string>} - Object URL that can be used in img src
  */
 async function loadImageWithHeaders(url) {
-    // Check if image is already cached
+    // Check if image is already cached (and mark it as recently used)
     if (imageCache.has(url)) {
-        return imageCache.get(url);
+        const blobUrl = imageCache.get(url);
+        imageCache.delete(url);
+        imageCache.set(url, blobUrl);
+        return blobUrl;
     }
 
+    if (!pendingImages.has(url)) {
+        pendingImages.set(url, fetchImage(url).finally(() => pendingImages.delete(url)));
+    }
+    return pendingImages.get(url);
+}
+
+async function fetchImage(url) {
     try {
         const response = await fetch(url, {
             headers: {
@@ -30,14 +58,14 @@ async function loadImageWithHeaders(url) {
         const blobUrl = URL.createObjectURL(blob);
 
         // Cache the blob URL for future use
-        imageCache.set(url, blobUrl);
+        cacheImage(url, blobUrl);
 
         return blobUrl;
     } catch (error) {
         console.error('Error loading image:', error);
         // Return a placeholder or empty data URL
         const errorUrl = 'data:image/svg+xml,%3Csvg xmlns="http://www.w3.org/2000/svg" width="100" height="100"%3E%3Crect fill="%23333" width="100" height="100"/%3E%3Ctext x="50" y="50" text-anchor="middle" fill="%23999" font-size="12"%3EImage Error%3C/text%3E%3C/svg%3E';
-        imageCache.set(url, errorUrl); // Cache error state too
+        cacheImage(url, errorUrl); // Cache error state too
         return errorUrl;
     }
 }
@@ -104,3 +132,57 @@ function clearImageCache() {
     });
     imageCache.clear();
 }
+
+// Lazy loading: an image is only fetched while it is on or near the screen,
+// and gives its photo back (showing its placeholder again) once it is far away
+const LAZY_MARGIN = '300px 0px';
+let lazyObserver = null;
+
+function onLazyIntersection(changes) {
+    changes.forEach(change => {
+        const img = change.target;
+        img.dataset.near = change.isIntersecting ? 'true' : '';
+        if (change.isIntersecting) {
+            showLazyImage(img);
+        } else if (img.dataset.placeholder) {
+            img.src = img.dataset.placeholder;
+            img.classList.add('placeholder');
+        }
+    });
+}
+
+async function showLazyImage(img) {
+    const url = img.dataset.src;
+    const blobUrl = await loadImageWithHeaders(url);
+
+    // Scrolled away or reused for another photo while downloading
+    if (img.dataset.near !== 'true' || img.dataset.src !== url) {
+        return;
+    }
+    img.src = blobUrl;
+    img.classList.remove('placeholder');
+}
+
+/**
+ * Show a placeholder in an img element and load the real image when it nears the screen
+ * @param {HTMLImageElement} img - The image element
+ * @param {string} url - The image URL
+ * @param {string} placeholder - Image to show meanwhile (e.g. a tiny blurred data URI)
+ */
+function lazyLoadImage(img, url, placeholder) {
+    img.dataset.src = url;
+    img.dataset.placeholder = placeholder;
+    img.src = placeholder;
+    img.classList.add('placeholder');
+
+    if (!('IntersectionObserver' in window)) {
+        img.dataset.near = 'true';
+        showLazyImage(img);
+        return;
+    }
+
+    if (!lazyObserver) {
+        lazyObserver = new IntersectionObserver(onLazyIntersection, { rootMargin: LAZY_MARGIN });
+    }
+    lazyObserver.observe(img);
+}
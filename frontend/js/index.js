@@ -24,7 +24,7 @@ function getCategoryIcon(categoryId) {
 // Load categories from API
 async function loadCategories() {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/categories`, {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/categories`, {
             headers: {
                 'ngrok-skip-browser-warning': 'true'
             }
@@ -61,5 +61,6 @@ function displayCategories(categories) {
     });
 }
 
-// Load categories when page loads
+// Load categories when page loads, and send any votes still waiting for a connection
 document.addEventListener('DOMContentLoaded', loadCategories);
+document.addEventListener('DOMContentLoaded', () => BallotOutbox.start());
@@ -0,0 +1,212 @@
+// Ballot Outbox
+// Keeps submitted ballots in IndexedDB until the server has them, so votes
+// cast while the Wi-Fi or tunnel is down are sent once it comes back.
+// Works both in pages and in the service worker (no DOM access).
+
+const BallotOutbox = (function() {
+    const DB_NAME = 'halloween_outbox';
+    const STORE = 'ballots';
+    const SYNC_TAG = 'ballot-outbox';
+    const BASE_DELAY_MS = 1000;
+    const MAX_DELAY_MS = 60000;
+    const SEND_TIMEOUT_MS = 15000; // A dying tunnel can hang requests for minutes
+
+    let dbPromise = null;
+    let memoryStore = null; // Fallback when IndexedDB is unavailable (e.g. private browsing)
+    let flushing = null;
+    let retryTimer = null;
+    const listeners = [];
+
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const request = indexedDB.open(DB_NAME, 1);
+                request.onupgradeneeded = () => {
+                    request.result.createObjectStore(STORE, { keyPath: 'ballot_id' });
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            }).catch(err => {
+                console.warn('Outbox falling back to memory:', err);
+                memoryStore = memoryStore || new Map();
+                return null;
+            });
+        }
+        return dbPromise;
+    }
+
+    // Run one request against the store, or against the in-memory fallback
+    async function withStore(mode, action, fallback) {
+        const db = await openDb();
+        if (!db) {
+            return fallback(memoryStore);
+        }
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(STORE, mode);
+            const request = action(tx.objectStore(STORE));
+            tx.oncomplete = () => resolve(request.result);
+            tx.onerror = () => reject(tx.error);
+        });
+    }
+
+    async function getAll() {
+        const items = await withStore('readonly', store => store.getAll(), store => [...store.values()]);
+        return items.sort((a, b) => a.queued_at - b.queued_at);
+    }
+
+    function put(item) {
+        return withStore('readwrite', store => store.put(item), store => store.set(item.ballot_id, item));
+    }
+
+    function remove(ballotId) {
+        return withStore('readwrite', store => store.delete(ballotId), store => store.delete(ballotId));
+    }
+
+    function notify(event) {
+        listeners.forEach(listener => {
+            try {
+                listener(event);
+            } catch (err) {
+                console.error('Outbox listener failed:', err);
+            }
+        });
+    }
+
+    function backoffDelay(attempts) {
+        // Exponential backoff with jitter so phones don't all retry at once
+        const delay = Math.min(MAX_DELAY_MS, BASE_DELAY_MS * Math.pow(2, attempts));
+        return delay / 2 + Math.random() * delay / 2;
+    }
+
+    function scheduleRetry(delay) {
+        clearTimeout(retryTimer);
+        retryTimer = setTimeout(() => flush(), delay);
+    }
+
+    async function send(item) {
+        const controller = new AbortController();
+        const timer = setTimeout(() => controller.abort(), SEND_TIMEOUT_MS);
+        try {
+            return await fetch(item.url, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'ngrok-skip-browser-warning': 'true',
+                    // Lets the server answer a resend from memory
+                    'Idempotency-Key': item.ballot_id
+                },
+                body: JSON.stringify(item.ballot),
+                signal: controller.signal
+            });
+        } finally {
+            clearTimeout(timer);
+        }
+    }
+
+    // Send queued ballots oldest first; stop at the first one that can't be
+    // delivered yet, so an older ballot never overwrites a newer one.
+    // Resolves to true once the outbox is empty.
+    async function flushOnce() {
+        const items = await getAll();
+        const now = Date.now();
+
+        for (const item of items) {
+            if (item.next_attempt_at > now) {
+                scheduleRetry(item.next_attempt_at - now);
+                return false;
+            }
+
+            let response = null;
+            try {
+                response = await send(item);
+            } catch (err) {
+                // Network error: keep it queued
+            }
+
+            if (response && response.ok) {
+                await remove(item.ballot_id);
+                notify({ type: 'delivered', ballot_id: item.ballot_id, result: await response.json() });
+            } else if (response && response.status >= 400 && response.status < 500 && response.status !== 408 && response.status !== 429) {
+                // The server will never accept this ballot as it is
+                await remove(item.ballot_id);
+                let detail = `HTTP ${response.status}`;
+                try {
+                    detail = (await response.json()).detail || detail;
+                } catch (err) {
+                    // Not JSON
+                }
+                notify({ type: 'rejected', ballot_id: item.ballot_id, detail });
+            } else {
+                item.attempts += 1;
+                const delay = backoffDelay(item.attempts);
+                item.next_attempt_at = Date.now() + delay;
+                await put(item);
+                notify({ type: 'retrying', ballot_id: item.ballot_id, attempts: item.attempts, delay });
+                scheduleRetry(delay);
+                return false;
+            }
+        }
+        return true;
+    }
+
+    function flush() {
+        if (!flushing) {
+            flushing = flushOnce().finally(() => {
+                flushing = null;
+            });
+        }
+        return flushing;
+    }
+
+    // Queue a ballot, folding in any undelivered ballot from the same voter
+    // (a ballot may carry only the choices that changed, so older queued
+    // choices are kept unless the new ballot changes them again)
+    async function enqueue(url, ballot) {
+        const items = await getAll();
+        for (const item of items) {
+            if (item.url === url && item.ballot.voter_id === ballot.voter_id) {
+                ballot = {
+                    ...ballot,
+                    votes: { ...item.ballot.votes, ...ballot.votes },
+                    mc_votes: { ...item.ballot.mc_votes, ...ballot.mc_votes },
+                    rankings: { ...item.ballot.rankings, ...ballot.rankings }
+                };
+                await remove(item.ballot_id);
+            }
+        }
+
+        await put({
+            ballot_id: ballot.ballot_id,
+            url,
+            ballot,
+            attempts: 0,
+            queued_at: Date.now(),
+            next_attempt_at: 0
+        });
+
+        // Let the browser retry even if the page is closed, where supported
+        if (typeof navigator !== 'undefined' && navigator.serviceWorker) {
+            navigator.serviceWorker.ready
+                .then(registration => registration.sync && registration.sync.register(SYNC_TAG))
+                .catch(() => {});
+        }
+    }
+
+    async function pendingCount() {
+        return (await getAll()).length;
+    }
+
+    function onChange(listener) {
+        listeners.push(listener);
+    }
+
+    // Retry as soon as the connection comes back, and on every page load
+    function start() {
+        if (typeof window !== 'undefined') {
+            window.addEventListener('online', () => flush());
+        }
+        return flush();
+    }
+
+    return { SYNC_TAG, enqueue, flush, start, pendingCount, onChange };
+})();
@@ -1,22 +1,63 @@
 // Results page logic
 
-let currentPassword = null;
+let resultsToken = sessionStorage.getItem(storageKey('halloween_results_token'));
 let refreshInterval = null;
 
-// Helper function to calculate ranks with tie support
-function calculateRanksWithTies(items) {
+// Helper function to calculate ranks with tie support (items sorted by score, highest first)
+function calculateRanksWithTies(items, score = item => item.vote_count) {
     let currentRank = 1;
-    let previousVotes = null;
+    let previousScore = null;
 
     return items.map((item, index) => {
-        if (previousVotes !== null && item.vote_count < previousVotes) {
+        const itemScore = score(item, index);
+        if (previousScore !== null && itemScore < previousScore) {
             currentRank = index + 1;
         }
-        previousVotes = item.vote_count;
+        previousScore = itemScore;
         return { ...item, rank: currentRank };
     });
 }
 
+// How a category's results are ordered: votes, Borda points, or the runoff's finishing order
+function resultScore(mode) {
+    if (mode === 'borda') return item => item.points;
+    if (mode === 'ranked') return (item, index) => -index;
+    return item => item.vote_count;
+}
+
+// Round by round account of an instant runoff, folded away below the podium
+function renderRunoffRounds(categoryData) {
+    const names = {};
+    categoryData.results.forEach(result => {
+        names[result.entry_id] = result.name;
+    });
+
+    const details = document.createElement('details');
+    details.className = 'runoff-rounds';
+    const summary = document.createElement('summary');
+    summary.textContent = `How the runoff went (${categoryData.rounds.length} round${categoryData.rounds.length !== 1 ? 's' : ''})`;
+    details.appendChild(summary);
+
+    const list = document.createElement('ol');
+    categoryData.rounds.forEach(round => {
+        const item = document.createElement('li');
+        const counts = Object.entries(round.counts)
+            .map(([entryId, count]) => `${names[entryId] || entryId} ${count}`)
+            .join(', ');
+        let outcome = '';
+        if (round.elected) {
+            outcome = ` → ${names[round.elected] || round.elected} wins`;
+        } else if (round.eliminated.length > 0) {
+            outcome = ` → out: ${round.eliminated.map(entryId => names[entryId] || entryId).join(', ')}`;
+        }
+        const exhausted = round.exhausted > 0 ? ` (${round.exhausted} ballot${round.exhausted !== 1 ? 's' : ''} with no choice left)` : '';
+        item.textContent = `${counts}${exhausted}${outcome}`;
+        list.appendChild(item);
+    });
+    details.appendChild(list);
+    return details;
+}
+
 // Helper function to filter to only top 3 ranks
 function filterTopThreeRanks(rankedItems) {
     return rankedItems.filter(item => item.rank <= 3);
@@ -29,43 +70,78 @@ document.getElementById('passwordForm').addEventListener('submit', async functio
     const password = document.getElementById('password').value;
 
     try {
-        await loadResults(password);
+        // Exchange the password for a session token
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/results/auth`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'ngrok-skip-browser-warning': 'true'
+            },
+            body: JSON.stringify({ password })
+        });
+
+        if (!response.ok) {
+            if (response.status === 403) {
+                throw new Error('Incorrect password');
+            }
+            throw new Error('Failed to load results');
+        }
 
-        // Success! Save password and show results
-        currentPassword = password;
-        document.getElementById('passwordPrompt').style.display = 'none';
-        document.getElementById('resultsDisplay').style.display = 'block';
+        const session = await response.json();
+        resultsToken = session.token;
+        sessionStorage.setItem(storageKey('halloween_results_token'), resultsToken);
 
-        // Auto-refresh every 10 seconds
-        refreshInterval = setInterval(() => loadResults(currentPassword), 10000);
+        await showResults();
 
     } catch (error) {
         showError(error.message);
     }
 });
 
+// Show results and keep them fresh
+async function showResults() {
+    await loadResults();
+
+    document.getElementById('passwordPrompt').style.display = 'none';
+    document.getElementById('resultsDisplay').style.display = 'block';
+
+    // Auto-refresh every 10 seconds
+    refreshInterval = setInterval(() => loadResults().catch(() => {}), 10000);
+}
+
+// Session expired (or server restarted): ask for the password again
+function handleExpiredSession() {
+    resultsToken = null;
+    sessionStorage.removeItem(storageKey('halloween_results_token'));
+    if (refreshInterval) {
+        clearInterval(refreshInterval);
+        refreshInterval = null;
+    }
+    document.getElementById('resultsDisplay').style.display = 'none';
+    document.getElementById('passwordPrompt').style.display = 'block';
+}
+
 // Manual refresh button
 document.getElementById('refreshBtn').addEventListener('click', function() {
-    if (currentPassword) {
-        loadResults(currentPassword);
+    if (resultsToken) {
+        loadResults().catch(() => {});
     }
 });
 
 // Load results from API
-async function loadResults(password) {
+async function loadResults() {
     try {
-        const response = await fetch(`${API_BASE_URL}/api/results`, {
-            method: 'POST',
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/results`, {
             headers: {
-                'Content-Type': 'application/json',
-                'ngrok-skip-browser-warning': 'true'
-            },
-            body: JSON.stringify({ password })
+                'ngrok-skip-browser-warning': 'true',
+                'Authorization': `Bearer ${resultsToken}`
+            }
         });
 
         if (!response.ok) {
-            if (response.status === 403) {
-                throw new Error('Incorrect password');
+            if (response.status === 401) {
+                handleExpiredSession();
+                throw new Error('Session expired, please enter the password again');
             }
             throw new Error('Failed to load results');
         }
@@ -97,11 +173,13 @@ function renderResults(results) {
             const resultsList = document.createElement('div');
             resultsList.className = 'results-list';
 
-            // Sort by votes, calculate ranks, and filter to top 3
-            const sortedResults = categoryData.results
-                .sort((a, b) => b.vote_count - a.vote_count);
+            // Sort by votes (or points; runoff results come in finishing order), calculate ranks, and filter to top 3
+            const score = resultScore(categoryData.mode);
+            const sortedResults = categoryData.mode === 'ranked'
+                ? categoryData.results
+                : [...categoryData.results].sort((a, b) => score(b) - score(a));
 
-            const rankedResults = calculateRanksWithTies(sortedResults);
+            const rankedResults = calculateRanksWithTies(sortedResults, score);
             const topThreeResults = filterTopThreeRanks(rankedResults);
 
             topThreeResults.forEach(async (result) => {
@@ -146,7 +224,9 @@ function renderResults(results) {
                 // Create votes element
                 const votesDiv = document.createElement('div');
                 votesDiv.className = 'result-votes';
-                votesDiv.textContent = `${result.vote_count} vote${result.vote_count !== 1 ? 's' : ''}`;
+                votesDiv.textContent = categoryData.mode === 'borda'
+                    ? `${result.points} pts (${result.vote_count} first choice${result.vote_count !== 1 ? 's' : ''})`
+                    : `${result.vote_count} vote${result.vote_count !== 1 ? 's' : ''}`;
 
                 // Append all elements
                 resultItem.appendChild(rankDiv);
@@ -158,6 +238,9 @@ function renderResults(results) {
             });
 
             categoryDiv.appendChild(resultsList);
+            if (categoryData.mode === 'ranked' && categoryData.rounds.length > 0) {
+                categoryDiv.appendChild(renderRunoffRounds(categoryData));
+            }
             container.appendChild(categoryDiv);
         });
     }
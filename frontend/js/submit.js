@@ -9,6 +9,21 @@ const errorMessage = document.getElementById('errorMessage');
 const successMessage = document.getElementById('successMessage');
 const uploadProgress = document.getElementById('uploadProgress');
 
+// Idempotency key for the entry being submitted: tapping submit again after a
+// dropped connection reuses it, so the server creates the entry only once
+let pendingSubmission = null; // { signature, key }
+
+function submissionKey(name, costumeName, photo) {
+    const signature = [name, costumeName, photo.name, photo.size, photo.lastModified].join('|');
+    if (!pendingSubmission || pendingSubmission.signature !== signature) {
+        const key = self.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : 'entry_' + Math.random().toString(36).substr(2, 12) + '_' + Date.now();
+        pendingSubmission = { signature, key };
+    }
+    return pendingSubmission.key;
+}
+
 // Preview image when selected
 photoInput.addEventListener('change', function(e) {
     const file = e.target.files[0];
@@ -72,10 +87,11 @@ form.addEventListener('submit', async function(e) {
         formData.append('photo', photo);
 
         // Submit to API
-        const response = await fetch(`${API_BASE_URL}/api/entries`, {
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/entries`, {
             method: 'POST',
             headers: {
-                'ngrok-skip-browser-warning': 'true'
+                'ngrok-skip-browser-warning': 'true',
+                'Idempotency-Key': submissionKey(name, costumeName, photo)
             },
             body: formData
         });
@@ -88,8 +104,20 @@ form.addEventListener('submit', async function(e) {
         const data = await response.json();
 
         // Success!
+        pendingSubmission = null;
         uploadProgress.style.display = 'none';
-        showSuccess(`🎉 Entry submitted successfully! Your costume "${costumeName}" has been added to the contest.`);
+        let message = `🎉 Entry submitted successfully! Your costume "${costumeName}" has been added to the contest.`;
+
+        // Warn if the photo looks like an existing entry (votes would be split)
+        if (data.possible_duplicates && data.possible_duplicates.length > 0) {
+            const names = data.possible_duplicates
+                .map(match => `"${match.costume_name}" by ${match.name}`)
+                .join(', ');
+            message += ` ⚠️ Heads up: this photo looks a lot like ${names}. ` +
+                'If that was you, ask the host to remove the extra entry so your votes aren\'t split.';
+        }
+
+        showSuccess(message);
 
         // Reset form
         form.reset();
@@ -4,33 +4,94 @@ let categories = [];
 let entries = [];
 let mcQuestions = [];
 let currentCategoryIndex = 0;
-let votes = {}; // { categoryId: entryId }
+let votes = {}; // { categoryId: entryId }, or { categoryId: [entryId, ...] } in ranked categories
 let mcVotes = {}; // { questionId: optionId }
+// Choices the server already has for this voter (null if unknown, e.g. offline)
+let submittedVotes = null;
+let submittedMcVotes = null;
+let searchQuery = '';
+let searchMatches = null; // Entries matching the search box, best first (null = show all)
+let searchTotal = 0;
+let searchSeq = 0;
+let searchTimer = null;
+
+// One card (and one photo) per entry, shared by every category
+const entryCards = new Map(); // { entryId: element }
+const placeholders = new Map(); // { entryId: blurred preview data URI }
+const LOADING_IMAGE = 'data:image/svg+xml,%3Csvg xmlns="http://www.w3.org/2000/svg" width="250" height="250"%3E%3Crect fill="%232a2a2a" width="250" height="250"/%3E%3Ctext x="125" y="125" text-anchor="middle" fill="%23999" font-size="14"%3ELoading...%3C/text%3E%3C/svg%3E';
+
+const SEARCH_PAGE_SIZE = 50;
+const SEARCH_DELAY_MS = 150;
 
 // Load saved votes from localStorage
 function loadSavedVotes() {
-    const saved = localStorage.getItem('halloween_votes');
+    const saved = localStorage.getItem(storageKey('halloween_votes'));
     if (saved) {
         votes = JSON.parse(saved);
     }
-    const savedMc = localStorage.getItem('halloween_mc_votes');
+    const savedMc = localStorage.getItem(storageKey('halloween_mc_votes'));
     if (savedMc) {
         mcVotes = JSON.parse(savedMc);
     }
 }
 
+// Ranked and Borda categories take a ranking of entries instead of one pick
+function isRanked(category) {
+    return category.mode && category.mode !== 'single';
+}
+
+// Fit saved picks to each category's current mode (an admin may have changed it)
+function normalizeVotes() {
+    categories.forEach(category => {
+        const picked = votes[category.id];
+        if (picked === undefined) return;
+        if (isRanked(category)) {
+            votes[category.id] = (Array.isArray(picked) ? picked : [picked]).slice(0, category.max_choices);
+        } else if (Array.isArray(picked)) {
+            votes[category.id] = picked[0];
+        }
+        if (!votes[category.id] || votes[category.id].length === 0) {
+            delete votes[category.id];
+        }
+    });
+}
+
 // Save votes to localStorage
 function saveVotes() {
-    localStorage.setItem('halloween_votes', JSON.stringify(votes));
-    localStorage.setItem('halloween_mc_votes', JSON.stringify(mcVotes));
+    localStorage.setItem(storageKey('halloween_votes'), JSON.stringify(votes));
+    localStorage.setItem(storageKey('halloween_mc_votes'), JSON.stringify(mcVotes));
+}
+
+// Fetch what this voter already submitted and pre-fill the ballot with it
+async function loadSubmittedBallot() {
+    try {
+        const voterId = encodeURIComponent(getVoterId());
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/voters/${voterId}/ballot`, {
+            headers: {
+                'ngrok-skip-browser-warning': 'true'
+            }
+        });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const ballot = await response.json();
+
+        submittedVotes = { ...ballot.votes, ...ballot.rankings };
+        submittedMcVotes = ballot.mc_votes;
+        // Picks made on this phone since then win over what was submitted
+        votes = { ...submittedVotes, ...votes };
+        mcVotes = { ...ballot.mc_votes, ...mcVotes };
+        saveVotes();
+    } catch (error) {
+        // The whole ballot will be sent instead
+        console.warn('Could not load your earlier votes:', error);
+    }
 }
 
 // Generate voter ID (simple fingerprint)
 function getVoterId() {
-    let voterId = localStorage.getItem('halloween_voter_id');
+    let voterId = localStorage.getItem(storageKey('halloween_voter_id'));
     if (!voterId) {
         voterId = 'voter_' + Math.random().toString(36).substr(2, 9) + '_' + Date.now();
-        localStorage.setItem('halloween_voter_id', voterId);
+        localStorage.setItem(storageKey('halloween_voter_id'), voterId);
     }
     return voterId;
 }
@@ -39,7 +100,7 @@ function getVoterId() {
 async function init() {
     try {
         // Load categories
-        const categoriesResponse = await fetch(`${API_BASE_URL}/api/categories`, {
+        const categoriesResponse = await fetch(`${API_BASE_URL}${API_PREFIX}/categories`, {
             headers: {
                 'ngrok-skip-browser-warning': 'true'
             }
@@ -48,7 +109,7 @@ async function init() {
         categories = await categoriesResponse.json();
 
         // Load entries
-        const entriesResponse = await fetch(`${API_BASE_URL}/api/entries`, {
+        const entriesResponse = await fetch(`${API_BASE_URL}${API_PREFIX}/entries`, {
             headers: {
                 'ngrok-skip-browser-warning': 'true'
             }
@@ -57,7 +118,7 @@ async function init() {
         entries = await entriesResponse.json();
 
         // Load multiple choice questions
-        const mcResponse = await fetch(`${API_BASE_URL}/api/mc-questions`, {
+        const mcResponse = await fetch(`${API_BASE_URL}${API_PREFIX}/mc-questions`, {
             headers: {
                 'ngrok-skip-browser-warning': 'true'
             }
@@ -65,15 +126,16 @@ async function init() {
         if (!mcResponse.ok) throw new Error('Failed to load questions');
         mcQuestions = await mcResponse.json();
 
-        // Load saved votes
+        // Load saved votes, then what was already submitted
         loadSavedVotes();
+        await loadSubmittedBallot();
+        normalizeVotes();
 
-        // Preload all images in the background for instant navigation
-        const imageUrls = entries.map(entry => `${API_BASE_URL}${entry.photo_url}`);
-        preloadImages(imageUrls).then(() => {
-            console.log('All images preloaded and cached');
-        }).catch(err => {
-            console.warn('Some images failed to preload:', err);
+        // Photos are loaded as they scroll into view; until then show their blurred preview
+        entries.forEach(entry => {
+            if (entry.placeholder) {
+                placeholders.set(entry.id, entry.placeholder);
+            }
         });
 
         // Hide loading, show interface
@@ -159,12 +221,17 @@ function renderCategory() {
     const statusText = `You've voted in ${votedCount} of ${totalCategories} categories`;
     document.getElementById('votingStatus').textContent = statusText;
 
-    // Show/hide instructions based on question type
+    // Show/hide instructions and search based on question type
     if (isMcQuestion) {
         instructionsDiv.style.display = 'none';
     } else {
         instructionsDiv.style.display = 'block';
+        const category = categories[currentCategoryIndex];
+        document.getElementById('votingHint').textContent = isRanked(category)
+            ? `👉 Tap up to ${category.max_choices} costumes in order of preference: your favorite first. Tap again to take one out`
+            : '👉 Click on a costume to select it as your vote for the current category';
     }
+    document.getElementById('entrySearch').style.display = isMcQuestion ? 'none' : 'block';
 
     // Render appropriate content
     gallery.innerHTML = '';
@@ -210,53 +277,151 @@ function renderCategory() {
         categoryHeader.innerHTML = `<h2 class="mc-question-title">${currentCategory.name}</h2>`;
         gallery.appendChild(categoryHeader);
 
-        entries.forEach(async entry => {
-            const card = document.createElement('div');
-            card.className = 'costume-card';
-
-            if (votes[currentCategory.id] === entry.id) {
-                card.classList.add('selected');
+        const ranking = isRanked(currentCategory) ? (votes[currentCategory.id] || []) : null;
+        visibleEntries().forEach(entry => {
+            const card = getEntryCard(entry);
+            if (ranking) {
+                const rank = ranking.indexOf(entry.id) + 1;
+                card.classList.toggle('selected', rank > 0);
+                if (rank > 0) {
+                    card.dataset.rank = rank;
+                } else {
+                    delete card.dataset.rank;
+                }
+            } else {
+                card.classList.toggle('selected', votes[currentCategory.id] === entry.id);
+                delete card.dataset.rank;
             }
-
-            // Create image element with loading state
-            const img = document.createElement('img');
-            img.alt = entry.costume_name;
-            img.style.opacity = '0.5';
-            img.src = 'data:image/svg+xml,%3Csvg xmlns="http://www.w3.org/2000/svg" width="250" height="250"%3E%3Crect fill="%232a2a2a" width="250" height="250"/%3E%3Ctext x="125" y="125" text-anchor="middle" fill="%23999" font-size="14"%3ELoading...%3C/text%3E%3C/svg%3E';
-
-            // Load image with proper headers
-            const imageUrl = `${API_BASE_URL}${entry.photo_url}`;
-            loadImageWithHeaders(imageUrl).then(blobUrl => {
-                img.src = blobUrl;
-                img.style.opacity = '1';
-            }).catch(err => {
-                console.error('Failed to load image:', err);
-                img.style.opacity = '1';
-            });
-
-            const infoDiv = document.createElement('div');
-            infoDiv.className = 'costume-card-info';
-            infoDiv.innerHTML = `
-                <h3>${entry.name}</h3>
-                <p>${entry.costume_name}</p>
-            `;
-
-            card.appendChild(img);
-            card.appendChild(infoDiv);
-            card.onclick = () => selectEntry(entry.id);
-
             gallery.appendChild(card);
         });
+
+        renderSearchStatus(gallery);
     }
 
     // Update navigation buttons
     updateNavButtons();
 }
 
-// Select an entry for the current category
+// The card for an entry, built once and moved between categories
+function getEntryCard(entry) {
+    let card = entryCards.get(entry.id);
+    if (card) {
+        return card;
+    }
+
+    card = document.createElement('div');
+    card.className = 'costume-card';
+
+    const img = document.createElement('img');
+    img.alt = entry.costume_name;
+    img.decoding = 'async';
+    lazyLoadImage(img, `${API_BASE_URL}${entry.photo_url}`, placeholders.get(entry.id) || LOADING_IMAGE);
+
+    const infoDiv = document.createElement('div');
+    infoDiv.className = 'costume-card-info';
+    const nameHeading = document.createElement('h3');
+    nameHeading.textContent = entry.name;
+    const costumeText = document.createElement('p');
+    costumeText.textContent = entry.costume_name;
+    infoDiv.appendChild(nameHeading);
+    infoDiv.appendChild(costumeText);
+
+    card.appendChild(img);
+    card.appendChild(infoDiv);
+    card.onclick = () => selectEntry(entry.id);
+
+    entryCards.set(entry.id, card);
+    return card;
+}
+
+// Entries to show in the gallery: all of them, or the search matches so far
+function visibleEntries() {
+    return searchMatches || entries;
+}
+
+// Fetch a page of search results; offset > 0 appends to the current matches
+async function runSearch(offset) {
+    const seq = ++searchSeq;
+    const query = searchQuery;
+    let page;
+
+    try {
+        const params = new URLSearchParams({ q: query, offset, limit: SEARCH_PAGE_SIZE });
+        const response = await fetch(`${API_BASE_URL}${API_PREFIX}/entries/search?${params}`, {
+            headers: {
+                'ngrok-skip-browser-warning': 'true'
+            }
+        });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        page = await response.json();
+    } catch (error) {
+        // Offline: plain substring match over the entries already loaded
+        const needle = query.toLowerCase();
+        const matches = entries.filter(entry =>
+            `${entry.name} ${entry.costume_name}`.toLowerCase().includes(needle)
+        );
+        page = { total: matches.length, results: matches.slice(offset, offset + SEARCH_PAGE_SIZE) };
+    }
+
+    if (seq !== searchSeq) return; // The search box changed meanwhile
+    searchMatches = offset === 0 ? page.results : searchMatches.concat(page.results);
+    searchTotal = page.total;
+    renderCategory();
+}
+
+// Match count and a "Show more" button below the search results
+function renderSearchStatus(gallery) {
+    const status = document.getElementById('entrySearchStatus');
+    if (!searchMatches) {
+        status.textContent = '';
+        return;
+    }
+
+    status.textContent = searchTotal === 0
+        ? 'No costumes match your search'
+        : `Showing ${searchMatches.length} of ${searchTotal} matches`;
+
+    if (searchMatches.length < searchTotal) {
+        const moreBtn = document.createElement('button');
+        moreBtn.className = 'btn btn-secondary';
+        moreBtn.textContent = 'Show more';
+        moreBtn.onclick = () => runSearch(searchMatches.length);
+        gallery.appendChild(moreBtn);
+    }
+}
+
+document.getElementById('entrySearchInput').addEventListener('input', function() {
+    clearTimeout(searchTimer);
+    searchQuery = this.value.trim();
+    if (!searchQuery) {
+        searchSeq++;
+        searchMatches = null;
+        renderCategory();
+        return;
+    }
+    searchTimer = setTimeout(() => runSearch(0), SEARCH_DELAY_MS);
+});
+
+// Select an entry for the current category (in ranked ones: add it to the ranking, or take it out)
 function selectEntry(entryId) {
     const currentCategory = categories[currentCategoryIndex];
-    votes[currentCategory.id] = entryId;
+    if (isRanked(currentCategory)) {
+        const ranking = votes[currentCategory.id] || [];
+        if (ranking.includes(entryId)) {
+            votes[currentCategory.id] = ranking.filter(id => id !== entryId);
+        } else if (ranking.length < currentCategory.max_choices) {
+            votes[currentCategory.id] = [...ranking, entryId];
+        } else {
+            showError(`You can rank up to ${currentCategory.max_choices} costumes. Tap one to take it out first.`);
+            return;
+        }
+        if (votes[currentCategory.id].length === 0) {
+            delete votes[currentCategory.id];
+        }
+    } else {
+        votes[currentCategory.id] = entryId;
+    }
+    document.getElementById('errorMessage').style.display = 'none';
     saveVotes();
     renderCategory();
 }
@@ -296,8 +461,79 @@ function updateNavButtons() {
     }
 }
 
-// Submit all votes
+// Random ID for a ballot, reused for every retry so the server applies it once
+function newBallotId() {
+    if (self.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return 'ballot_' + Math.random().toString(36).substr(2, 12) + '_' + Date.now();
+}
+
+let submittedBallotId = null;
+
+function resetSubmitButton() {
+    const submitBtn = document.getElementById('submitVotes');
+    submitBtn.disabled = false;
+    submitBtn.textContent = 'Submit All Votes';
+}
+
+// Follow the outbox: delivered, rejected, or waiting for the connection
+BallotOutbox.onChange(event => {
+    if (event.type === 'delivered') {
+        document.getElementById('errorMessage').style.display = 'none';
+        if (event.ballot_id !== submittedBallotId) {
+            showSuccess('✅ Your saved votes have been sent.');
+            return;
+        }
+
+        // Success!
+        showSuccess('🎉 Your votes have been submitted successfully! Thank you for participating!');
+
+        // Scroll to success message
+        document.getElementById('successMessage').scrollIntoView({ behavior: 'smooth' });
+
+        // Disable further voting
+        setTimeout(() => {
+            window.location.href = 'index.html';
+        }, 3000);
+    } else if (event.type === 'rejected') {
+        showError(`Failed to submit votes: ${event.detail}`);
+        resetSubmitButton();
+    } else if (event.type === 'retrying') {
+        showSuccess(
+            '📶 Connection trouble: your votes are saved on this phone and will be sent ' +
+            'automatically as soon as the connection is back. You can close this page.'
+        );
+        resetSubmitButton();
+    }
+});
+
+// Choices that differ from what the server already has, as { id: choice }
+function changedChoices(items, picked, submitted) {
+    const changed = {};
+    items.filter(item => picked[item.id]).forEach(item => {
+        // Rankings are arrays, compared by value
+        if (!submitted || JSON.stringify(submitted[item.id]) !== JSON.stringify(picked[item.id])) {
+            changed[item.id] = picked[item.id];
+        }
+    });
+    return changed;
+}
+
+// Submit the changed votes as one ballot
 document.getElementById('submitVotes').addEventListener('click', async function() {
+    // Only send choices for categories and questions still on the ballot,
+    // and only the ones that changed since the last submission
+    const ballotVotes = changedChoices(categories.filter(category => !isRanked(category)), votes, submittedVotes);
+    const ballotRankings = changedChoices(categories.filter(isRanked), votes, submittedVotes);
+    const ballotMcVotes = changedChoices(mcQuestions, mcVotes, submittedMcVotes);
+    const changedCount = Object.keys(ballotVotes).length + Object.keys(ballotRankings).length +
+        Object.keys(ballotMcVotes).length;
+    if (submittedVotes && changedCount === 0) {
+        showSuccess('✅ Your votes are already in. Change a pick and submit again to update it.');
+        return;
+    }
+
     // Check if all categories have votes
     const totalItems = categories.length + mcQuestions.length;
     const votedCount = Object.keys(votes).length + Object.keys(mcVotes).length;
@@ -315,58 +551,22 @@ document.getElementById('submitVotes').addEventListener('click', async function(
     submitBtn.textContent = 'Submitting...';
 
     try {
-        const voterId = getVoterId();
-
-        // Submit costume votes
-        const costumePromises = Object.entries(votes).map(([categoryId, entryId]) => {
-            return fetch(`${API_BASE_URL}/api/votes`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'ngrok-skip-browser-warning': 'true'
-                },
-                body: JSON.stringify({
-                    category: categoryId,
-                    entry_id: entryId,
-                    voter_id: voterId
-                })
-            });
-        });
-
-        // Submit MC votes
-        const mcPromises = Object.entries(mcVotes).map(([questionId, optionId]) => {
-            return fetch(`${API_BASE_URL}/api/mc-votes`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'ngrok-skip-browser-warning': 'true'
-                },
-                body: JSON.stringify({
-                    question_id: questionId,
-                    option_id: optionId,
-                    voter_id: voterId
-                })
-            });
-        });
-
-        await Promise.all([...costumePromises, ...mcPromises]);
-
-        // Success!
-        showSuccess('🎉 Your votes have been submitted successfully! Thank you for participating!');
-
-        // Scroll to success message
-        document.getElementById('successMessage').scrollIntoView({ behavior: 'smooth' });
-
-        // Disable further voting
-        setTimeout(() => {
-            window.location.href = 'index.html';
-        }, 3000);
+        // Queue first, so the ballot survives a dropped connection or a closed tab
+        const ballot = {
+            ballot_id: newBallotId(),
+            voter_id: getVoterId(),
+            votes: ballotVotes,
+            mc_votes: ballotMcVotes,
+            rankings: ballotRankings
+        };
+        submittedBallotId = ballot.ballot_id;
+        await BallotOutbox.enqueue(`${API_BASE_URL}${API_PREFIX}/ballots`, ballot);
+        await BallotOutbox.flush();
 
     } catch (error) {
         console.error('Error submitting votes:', error);
         showError(`Failed to submit votes: ${error.message}`);
-        submitBtn.disabled = false;
-        submitBtn.textContent = 'Submit All Votes';
+        resetSubmitButton();
     }
 });
 
@@ -383,5 +583,6 @@ function showSuccess(message) {
     successDiv.style.display = 'block';
 }
 
-// Initialize on page load
+// Initialize on page load, and send any ballot left over from last time
 init();
+BallotOutbox.start();
@@ -0,0 +1,138 @@
+// Service Worker
+// Keeps the voting pages and the ballot (categories, questions, entries and
+// photos) available when the connection drops, and replays queued ballots.
+
+importScripts('js/outbox.js');
+
+// Bump to drop everything cached by older versions
+const CACHE_VERSION = 'v3';
+const STATIC_CACHE = `halloween-static-${CACHE_VERSION}`;
+const API_CACHE = `halloween-api-${CACHE_VERSION}`;
+const PHOTO_CACHE = `halloween-photos-${CACHE_VERSION}`;
+
+const STATIC_ASSETS = [
+    './',
+    'index.html',
+    'submit.html',
+    'vote.html',
+    'results.html',
+    'css/styles.css',
+    'js/config.js',
+    'js/imageLoader.js',
+    'js/outbox.js',
+    'js/index.js',
+    'js/submit.js',
+    'js/vote.js',
+    'js/results.js'
+];
+
+// Ballot definition: fresh when online, cached when not
+const BALLOT_PATHS = /\/api\/(events\/[^/]+\/)?(categories|mc-questions|entries|footer-text|header-text)$/;
+// Photos are stored under their content hash, so a cached copy never goes stale
+const PHOTO_PATHS = /\/api\/(events\/[^/]+\/)?uploads\//;
+const NETWORK_TIMEOUT_MS = 4000;
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(STATIC_CACHE)
+            .then(cache => cache.addAll(STATIC_ASSETS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    const current = [STATIC_CACHE, API_CACHE, PHOTO_CACHE];
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => name.startsWith('halloween-') && !current.includes(name))
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+// Network first, falling back to the cache if offline or too slow
+async function networkFirst(request, cacheName) {
+    const cache = await caches.open(cacheName);
+    const network = fetch(request).then(response => {
+        if (response.ok) {
+            cache.put(request, response.clone());
+        }
+        return response;
+    });
+
+    const timeout = new Promise(resolve => setTimeout(resolve, NETWORK_TIMEOUT_MS));
+    try {
+        const response = await Promise.race([network, timeout]);
+        if (response) {
+            return response;
+        }
+    } catch (err) {
+        // Offline: fall through to the cache
+    }
+
+    const cached = await cache.match(request);
+    return cached || network;
+}
+
+// Serve from the cache right away and refresh it in the background
+async function staleWhileRevalidate(request, cacheName, options) {
+    const cache = await caches.open(cacheName);
+    const cached = await cache.match(request, options);
+    const network = fetch(request).then(response => {
+        if (response.ok) {
+            cache.put(request, response.clone());
+        }
+        return response;
+    });
+
+    if (cached) {
+        network.catch(() => {});
+        return cached;
+    }
+    return network;
+}
+
+// Cache first, fetching (and caching) on a miss
+async function cacheFirst(request, cacheName, options) {
+    const cache = await caches.open(cacheName);
+    const cached = await cache.match(request, options);
+    if (cached) {
+        return cached;
+    }
+
+    const response = await fetch(request);
+    if (response.ok) {
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    const url = new URL(request.url);
+    if (BALLOT_PATHS.test(url.pathname)) {
+        event.respondWith(networkFirst(request, API_CACHE));
+    } else if (PHOTO_PATHS.test(url.pathname)) {
+        event.respondWith(cacheFirst(request, PHOTO_CACHE));
+    } else if (url.origin === self.location.origin && !url.pathname.endsWith('admin.html')) {
+        // Static pages and scripts (ignore ?v= cache busters)
+        event.respondWith(staleWhileRevalidate(request, STATIC_CACHE, { ignoreSearch: true }));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === BallotOutbox.SYNC_TAG) {
+        // Rejecting makes the browser try the sync again later
+        event.waitUntil(BallotOutbox.flush().then(done => {
+            if (!done) {
+                throw new Error('Ballots still queued');
+            }
+        }));
+    }
+});
@@ -54,14 +54,17 @@ if [ "$SOFT_REFRESH" = false ]; then
     else
         echo "ℹ️  No database to delete"
     fi
+    # Vote journals (VOTE_ENGINE=memory) would otherwise be replayed into the new database
+    rm -f backend/halloween.db.journal.*
 
     echo ""
 
     # Clear uploads
-    UPLOAD_COUNT=$(ls -1 backend/uploads/ 2>/dev/null | grep -v ".gitkeep" | wc -l)
+    UPLOAD_COUNT=$(find backend/uploads/ -type f ! -name ".gitkeep" 2>/dev/null | wc -l)
     if [ $UPLOAD_COUNT -gt 0 ]; then
         echo "🗑️  Deleting $UPLOAD_COUNT uploaded file(s)..."
         find backend/uploads/ -type f ! -name ".gitkeep" -delete
+        find backend/uploads/ -mindepth 1 -type d -empty -delete
         echo "   ✅ Uploads cleared"
     else
         echo "ℹ️  No uploads to delete"
@@ -76,7 +79,7 @@ else
         echo "   📊 Database: $DB_SIZE"
     fi
 
-    UPLOAD_COUNT=$(ls -1 backend/uploads/ 2>/dev/null | grep -v ".gitkeep" | wc -l)
+    UPLOAD_COUNT=$(find backend/uploads/ -type f ! -name ".gitkeep" 2>/dev/null | wc -l)
     echo "   📸 Photos: $UPLOAD_COUNT file(s)"
     echo ""
 fi